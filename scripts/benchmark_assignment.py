@@ -0,0 +1,136 @@
+""" benchmark_assignment.py
+
+Micro-benchmark of the assignment solver backends (see trackeval/_assignment.py) on score matrices captured from real
+data. For each dataset the per-timestep matrices of all trackers and sequences are captured, both as raw similarity
+scores (as matched in HOTA and VACE) and thresholded at 0.5 (as matched in CLEAR and in preprocessing). Each backend
+then solves all captured matrices, and its total time and whether its assignments agree with 'hungarian' are printed.
+
+Run example:
+benchmark_assignment.py --DATASETS MOT17 TAO --TRACKERS_TO_EVAL MPNTrack --CAPTURE_FOLDER data/assignment_benchmark
+
+Command Line Arguments: Defaults, # Comments
+    'DATASETS': ['MOT17', 'MOT20', 'TAO'],  # Valid: 'MOT17', 'MOT20', 'TAO'
+    'SOLVERS': ['hungarian', 'components', 'sparse'],  # Solver backends to compare
+    'TRACKERS_TO_EVAL': None,  # Filenames of trackers to capture (if None, all in folder)
+    'MAX_SEQS': None,  # If not None, only the first MAX_SEQS sequences (of each dataset) are captured
+    'REPEATS': 3,  # Number of times each backend solves all matrices (the fastest time is reported)
+    'CAPTURE_FOLDER': None,  # If not None, captured matrices are saved here (and loaded from here if already saved)
+    'MOT_GT_FOLDER': os.path.join(code_path, 'data/gt/mot_challenge/'),  # Location of MOT17 and MOT20 GT data
+    'MOT_TRACKERS_FOLDER': os.path.join(code_path, 'data/trackers/mot_challenge/'),  # MOT17 and MOT20 trackers
+    'TAO_GT_FOLDER': os.path.join(code_path, 'data/gt/tao/tao_training'),  # Location of TAO GT data
+    'TAO_TRACKERS_FOLDER': os.path.join(code_path, 'data/trackers/tao/tao_training'),  # TAO trackers location
+"""
+
+import sys
+import os
+import pickle
+import argparse
+from time import perf_counter
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import trackeval  # noqa: E402
+from trackeval import _assignment  # noqa: E402
+
+
+def get_dataset(name, config):
+    """Creates the dataset to capture matrices from"""
+    if name in ['MOT17', 'MOT20']:
+        dataset_config = {'GT_FOLDER': config['MOT_GT_FOLDER'], 'TRACKERS_FOLDER': config['MOT_TRACKERS_FOLDER'],
+                          'BENCHMARK': name, 'TRACKERS_TO_EVAL': config['TRACKERS_TO_EVAL'], 'PRINT_CONFIG': False}
+        return trackeval.datasets.MotChallenge2DBox(dataset_config)
+    if name == 'TAO':
+        dataset_config = {'GT_FOLDER': config['TAO_GT_FOLDER'], 'TRACKERS_FOLDER': config['TAO_TRACKERS_FOLDER'],
+                          'TRACKERS_TO_EVAL': config['TRACKERS_TO_EVAL'], 'PRINT_CONFIG': False}
+        return trackeval.datasets.TAO(dataset_config)
+    raise trackeval.utils.TrackEvalException('Dataset %s is not supported by this benchmark' % name)
+
+
+def capture_matrices(dataset, max_seqs=None):
+    """Captures the non-empty per-timestep similarity matrices of all trackers, sequences and classes of a dataset"""
+    tracker_list, seq_list, class_list = dataset.get_eval_info()
+    seq_list = seq_list if max_seqs is None else seq_list[:max_seqs]
+    matrices = []
+    for tracker in tracker_list:
+        for seq in seq_list:
+            raw_data = dataset.get_raw_seq_data(tracker, seq)
+            for cls in class_list:
+                data = dataset.get_preprocessed_seq_data(raw_data, cls)
+                matrices += [s for s in data['similarity_scores'] if s.shape[0] > 0 and s.shape[1] > 0]
+    return matrices
+
+
+def time_solver(matrices, solver, repeats):
+    """Returns the fastest time over all repeats for solving all matrices, and the assignments of the last repeat"""
+    best_time = np.inf
+    for _ in range(repeats):
+        assignments = []
+        time_start = perf_counter()
+        for score_mat in matrices:
+            assignments.append(_assignment.max_score_assignment(score_mat, solver))
+        best_time = min(best_time, perf_counter() - time_start)
+    return best_time, assignments
+
+
+def run_benchmark(name, matrices, solvers, repeats):
+    """Prints the timings of all solvers on the raw and thresholded matrices of a dataset"""
+    sizes = np.array([s.size for s in matrices])
+    print('\n%s: %i matrices (mean size %.0f, max size %i)' % (name, len(matrices), np.mean(sizes), np.max(sizes)))
+    thresholded = [np.where(s >= 0.5 - np.finfo('float').eps, s, 0) for s in matrices]
+    for matrix_type, type_matrices in [('raw', matrices), ('thresholded', thresholded)]:
+        _, reference = time_solver(type_matrices, 'hungarian', 1)
+        for solver in solvers:
+            solver_time, assignments = time_solver(type_matrices, solver, repeats)
+            num_different = sum(not (np.array_equal(r, r_ref) and np.array_equal(c, c_ref))
+                                for (r, c), (r_ref, c_ref) in zip(assignments, reference))
+            print('%-12s %-12s %10.4f sec  (%i assignments differ from hungarian)'
+                  % (matrix_type, solver, solver_time, num_different))
+
+
+if __name__ == '__main__':
+    code_path = trackeval.utils.get_code_path()
+    config = {
+        'DATASETS': ['MOT17', 'MOT20', 'TAO'],
+        'SOLVERS': list(_assignment.SOLVERS.keys()),
+        'TRACKERS_TO_EVAL': None,
+        'MAX_SEQS': None,
+        'REPEATS': 3,
+        'CAPTURE_FOLDER': None,
+        'MOT_GT_FOLDER': os.path.join(code_path, 'data/gt/mot_challenge/'),
+        'MOT_TRACKERS_FOLDER': os.path.join(code_path, 'data/trackers/mot_challenge/'),
+        'TAO_GT_FOLDER': os.path.join(code_path, 'data/gt/tao/tao_training'),
+        'TAO_TRACKERS_FOLDER': os.path.join(code_path, 'data/trackers/tao/tao_training'),
+    }
+    parser = argparse.ArgumentParser()
+    for setting in config.keys():
+        if type(config[setting]) == list or type(config[setting]) == type(None):
+            parser.add_argument("--" + setting, nargs='+')
+        else:
+            parser.add_argument("--" + setting)
+    args = parser.parse_args().__dict__
+    for setting in args.keys():
+        if args[setting] is not None:
+            if type(config[setting]) == type(1):
+                x = int(args[setting])
+            elif setting == 'MAX_SEQS':
+                x = int(args[setting][0])
+            elif setting == 'CAPTURE_FOLDER':
+                x = args[setting][0]
+            else:
+                x = args[setting]
+            config[setting] = x
+
+    for dataset_name in config['DATASETS']:
+        capture_file = None
+        if config['CAPTURE_FOLDER'] is not None:
+            capture_file = os.path.join(config['CAPTURE_FOLDER'], dataset_name + '_matrices.pkl')
+        if capture_file is not None and os.path.isfile(capture_file):
+            with open(capture_file, 'rb') as f:
+                dataset_matrices = pickle.load(f)
+        else:
+            dataset_matrices = capture_matrices(get_dataset(dataset_name, config), config['MAX_SEQS'])
+            if capture_file is not None:
+                os.makedirs(config['CAPTURE_FOLDER'], exist_ok=True)
+                with open(capture_file, 'wb') as f:
+                    pickle.dump(dataset_matrices, f)
+        run_benchmark(dataset_name, dataset_matrices, config['SOLVERS'], config['REPEATS'])
@@ -16,6 +16,13 @@ Command Line Arguments: Defaults, # Comments
         'OUTPUT_SUMMARY': True,
         'OUTPUT_DETAILED': True,
         'PLOT_CURVES': True,
+        'GT_RESIDENT': False,
+        'RESULT_CACHE_FOLDER': None,
+        'TIMING_TRACE_FILE': None,
+        'TIMING_JSON_FILE': None,
+        'MEMORY_PROFILE': False,
+        'MAX_RSS_MB': None,
+        'ASSIGNMENT_SOLVER': 'hungarian',
     Dataset arguments:
         'GT_FOLDER': os.path.join(code_path, 'data/gt/mot_challenge/'),  # Location of GT data
         'TRACKERS_FOLDER': os.path.join(code_path, 'data/trackers/mot_challenge/'),  # Trackers location
@@ -31,6 +38,8 @@ Command Line Arguments: Defaults, # Comments
         'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
     Metric arguments:
         'METRICS': ['HOTA', 'CLEAR', 'Identity', 'VACE']
+        'THRESHOLD': 0.5,
+        'THRESHOLDS': None,  # If not None, CLEAR and Identity are also calculated as curves over these thresholds
 """
 
 import sys
@@ -48,11 +57,15 @@ if __name__ == '__main__':
     default_eval_config = trackeval.Evaluator.get_default_eval_config()
     default_eval_config['DISPLAY_LESS_PROGRESS'] = False
     default_dataset_config = trackeval.datasets.MotChallenge2DBox.get_default_dataset_config()
-    default_metrics_config = {'METRICS': ['HOTA', 'CLEAR', 'Identity'], 'THRESHOLD': 0.5}
+    default_metrics_config = {'METRICS': ['HOTA', 'CLEAR', 'Identity'], 'THRESHOLD': 0.5, 'THRESHOLDS': None}
     config = {**default_eval_config, **default_dataset_config, **default_metrics_config}  # Merge default configs
+    # Settings which default to None but take a single value
+    single_value_settings = ['RESULT_CACHE_FOLDER', 'MAX_RSS_MB', 'SPILL_FOLDER', 'TIMING_TRACE_FILE',
+                             'TIMING_JSON_FILE']
     parser = argparse.ArgumentParser()
     for setting in config.keys():
-        if type(config[setting]) == list or type(config[setting]) == type(None):
+        if type(config[setting]) == list or (type(config[setting]) == type(None) and
+                                             setting not in single_value_settings):
             parser.add_argument("--" + setting, nargs='+')
         else:
             parser.add_argument("--" + setting)
@@ -70,6 +83,8 @@ if __name__ == '__main__':
                 x = int(args[setting])
             elif type(args[setting]) == type(None):
                 x = None
+            elif setting == 'MAX_RSS_MB':
+                x = float(args[setting])
             elif setting == 'SEQ_INFO':
                 x = dict(zip(args[setting], [None]*len(args[setting])))
             else:
@@ -15,6 +15,9 @@ Command Line Arguments: Defaults, # Comments
         'OUTPUT_SUMMARY': True,
         'OUTPUT_DETAILED': True,
         'PLOT_CURVES': True,
+        'RESULT_CACHE_FOLDER': None,
+        'TIMING_TRACE_FILE': None,
+        'TIMING_JSON_FILE': None,
     Dataset arguments:
         'GT_FOLDER': os.path.join(code_path, 'data/gt/tao/tao_training'),  # Location of GT data
         'TRACKERS_FOLDER': os.path.join(code_path, 'data/trackers/tao/tao_training'),  # Trackers location
@@ -29,6 +32,8 @@ Command Line Arguments: Defaults, # Comments
         'MAX_DETECTIONS': 300,  # Number of maximal allowed detections per image (0 for unlimited)
     Metric arguments:
         'METRICS': ['HOTA', 'CLEAR', 'Identity', 'TrackMAP']
+        'MAX_DETECTIONS_LIST': None,  # If not None, TrackMAP is also calculated for these maximal numbers of tracks
+        # per sequence (e.g. 10 50 300)
 """
 
 import sys
@@ -48,11 +53,15 @@ if __name__ == '__main__':
     default_eval_config['PRINT_ONLY_COMBINED'] = True
     default_eval_config['DISPLAY_LESS_PROGRESS'] = True
     default_dataset_config = trackeval.datasets.TAO.get_default_dataset_config()
-    default_metrics_config = {'METRICS': ['HOTA', 'CLEAR', 'Identity', 'TrackMAP']}
+    default_metrics_config = {'METRICS': ['HOTA', 'CLEAR', 'Identity', 'TrackMAP'], 'MAX_DETECTIONS_LIST': None}
     config = {**default_eval_config, **default_dataset_config, **default_metrics_config}  # Merge default configs
+    # Settings which default to None but take a single value
+    single_value_settings = ['RESULT_CACHE_FOLDER', 'MAX_RSS_MB', 'SPILL_FOLDER', 'TIMING_TRACE_FILE',
+                             'TIMING_JSON_FILE']
     parser = argparse.ArgumentParser()
     for setting in config.keys():
-        if type(config[setting]) == list or type(config[setting]) == type(None):
+        if type(config[setting]) == list or (type(config[setting]) == type(None) and
+                                             setting not in single_value_settings):
             parser.add_argument("--" + setting, nargs='+')
         else:
             parser.add_argument("--" + setting)
@@ -70,6 +79,8 @@ if __name__ == '__main__':
                 x = int(args[setting])
             elif type(args[setting]) == type(None):
                 x = None
+            elif setting == 'MAX_RSS_MB':
+                x = float(args[setting])
             else:
                 x = args[setting]
             config[setting] = x
@@ -84,7 +95,10 @@ if __name__ == '__main__':
     for metric in [trackeval.metrics.TrackMAP, trackeval.metrics.CLEAR, trackeval.metrics.Identity,
                    trackeval.metrics.HOTA]:
         if metric.get_name() in metrics_config['METRICS']:
-            metrics_list.append(metric())
+            if metric == trackeval.metrics.TrackMAP:
+                metrics_list.append(metric({'MAX_DETECTIONS_LIST': metrics_config['MAX_DETECTIONS_LIST']}))
+            else:
+                metrics_list.append(metric())
     if len(metrics_list) == 0:
         raise Exception('No metrics selected for evaluation')
     evaluator.evaluate(dataset_list, metrics_list)
\ No newline at end of file
@@ -0,0 +1,32 @@
+import os
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def mot_folders(tmp_path):
+    """A small synthetic MOT17 train split (two sequences) with one tracker, in the MOTChallenge file formats"""
+    rng = np.random.RandomState(0)
+    gt_folder = tmp_path / 'gt'
+    trackers_folder = tmp_path / 'trackers'
+    seq_lengths = {'MOT17-02': 20, 'MOT17-04': 15}
+    os.makedirs(gt_folder / 'seqmaps')
+    (gt_folder / 'seqmaps' / 'MOT17-train.txt').write_text('name\n' + '\n'.join(seq_lengths) + '\n')
+    for seq, seq_length in seq_lengths.items():
+        os.makedirs(gt_folder / 'MOT17-train' / seq / 'gt')
+        os.makedirs(trackers_folder / 'MOT17-train' / 'trk' / 'data', exist_ok=True)
+        (gt_folder / 'MOT17-train' / seq / 'seqinfo.ini').write_text(
+            '[Sequence]\nname=%s\nseqLength=%i\n' % (seq, seq_length))
+        gt_lines, tracker_lines = [], []
+        for obj_id in range(1, 6):
+            pos = rng.rand(2) * 500
+            for t in range(1, seq_length + 1):
+                gt_lines.append('%i,%i,%.2f,%.2f,50,100,1,1,1\n' % (t, obj_id, pos[0] + 3 * t, pos[1]))
+                if rng.rand() < 0.9:
+                    jitter = rng.randn(2) * 5
+                    tracker_lines.append('%i,%i,%.2f,%.2f,50,100,1,-1,-1,-1\n'
+                                         % (t, obj_id + 10 * (t > seq_length // 2), pos[0] + 3 * t + jitter[0],
+                                            pos[1] + jitter[1]))
+        (gt_folder / 'MOT17-train' / seq / 'gt' / 'gt.txt').write_text(''.join(gt_lines))
+        (trackers_folder / 'MOT17-train' / 'trk' / 'data' / (seq + '.txt')).write_text(''.join(tracker_lines))
+    return str(gt_folder), str(trackers_folder)
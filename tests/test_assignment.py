@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+from trackeval._assignment import max_score_assignment, max_score_assignment_sparse
+
+
+@pytest.mark.parametrize('solver', ['hungarian', 'components', 'sparse'])
+@pytest.mark.parametrize('density', [0.05, 0.2, 0.6, 1.0])
+def test_max_score_assignment_matches_dense(solver, density):
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        num_rows, num_cols = rng.randint(0, 15, 2)
+        score_mat = rng.rand(num_rows, num_cols) * (rng.rand(num_rows, num_cols) < density)
+        match_rows, match_cols = linear_sum_assignment(-score_mat)
+        is_positive = score_mat[match_rows, match_cols] > 0
+        rows, cols = max_score_assignment(score_mat, solver)
+        np.testing.assert_array_equal(rows, match_rows[is_positive])
+        np.testing.assert_array_equal(cols, match_cols[is_positive])
+
+
+@pytest.mark.parametrize('solver', ['hungarian', 'components', 'sparse'])
+def test_max_score_assignment_components(solver):
+    # Two separate 1x1 components and one 2x2 component, with an all-zero row and col.
+    score_mat = np.array([[0.9, 0.0, 0.0, 0.0, 0.0],
+                          [0.0, 0.0, 0.0, 0.0, 0.0],
+                          [0.0, 0.0, 0.8, 0.7, 0.0],
+                          [0.0, 0.0, 0.9, 0.1, 0.0],
+                          [0.0, 0.6, 0.0, 0.0, 0.0]])
+    rows, cols = max_score_assignment(score_mat, solver)
+    np.testing.assert_array_equal(rows, [0, 2, 3, 4])
+    np.testing.assert_array_equal(cols, [0, 3, 2, 1])
+
+
+def test_max_score_assignment_sparse_matches_dense():
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        num_rows, num_cols = rng.randint(1, 15, 2)
+        score_mat = rng.randint(1, 10, (num_rows, num_cols)) * (rng.rand(num_rows, num_cols) < 0.3)
+        rows, cols = np.nonzero(score_mat)
+        matched = max_score_assignment_sparse(rows, cols, score_mat[rows, cols].astype(float))
+        match_rows, match_cols = linear_sum_assignment(-score_mat)
+        assert score_mat[rows[matched], cols[matched]].sum() == score_mat[match_rows, match_cols].sum()
+        assert len(np.unique(rows[matched])) == len(np.unique(cols[matched])) == len(matched)
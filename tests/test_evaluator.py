@@ -0,0 +1,149 @@
+import os
+import numpy as np
+import pytest
+
+import trackeval
+
+
+def _evaluate(mot_folders, metrics_list, **eval_config):
+    """Runs the evaluator with its default config (apart from the given values and not printing anything)"""
+    eval_config = {'USE_PARALLEL': False, 'PRINT_RESULTS': False, 'PRINT_CONFIG': False, 'TIME_PROGRESS': False,
+                   'LOG_ON_ERROR': os.path.join(mot_folders[1], 'error_log.txt'), **eval_config}
+    dataset = trackeval.datasets.MotChallenge2DBox({'GT_FOLDER': mot_folders[0], 'TRACKERS_FOLDER': mot_folders[1],
+                                                    'PRINT_CONFIG': False})
+    return trackeval.Evaluator(eval_config).evaluate([dataset], metrics_list)
+
+
+@pytest.mark.parametrize('thresholds', [None, [0.3, 0.5, 0.7]])
+def test_plot_curves_with_default_metric_configs(mot_folders, thresholds):
+    pytest.importorskip('matplotlib')
+    metrics_list = [trackeval.metrics.CLEAR({'PRINT_CONFIG': False, 'THRESHOLDS': thresholds})]
+    _, messages = _evaluate(mot_folders, metrics_list, PLOT_CURVES=True)
+    assert messages['MotChallenge2DBox']['trk'] == 'Success'
+    output_folder = os.path.join(mot_folders[1], 'MOT17-train', 'trk')
+    assert os.path.isfile(os.path.join(output_folder, 'pedestrian_clear_plot.pdf')) == (thresholds is not None)
+
+
+@pytest.mark.parametrize('thresholds', [None, [0.3, 0.5, 0.7]])
+def test_plot_identity_curves_with_default_metric_configs(mot_folders, thresholds):
+    pytest.importorskip('matplotlib')
+    metrics_list = [trackeval.metrics.Identity({'PRINT_CONFIG': False, 'THRESHOLDS': thresholds})]
+    _, messages = _evaluate(mot_folders, metrics_list, PLOT_CURVES=True)
+    assert messages['MotChallenge2DBox']['trk'] == 'Success'
+    output_folder = os.path.join(mot_folders[1], 'MOT17-train', 'trk')
+    assert os.path.isfile(os.path.join(output_folder, 'pedestrian_identity_plot.pdf')) == (thresholds is not None)
+
+
+def test_result_cache_key_includes_seqinfo(mot_folders):
+    from trackeval._result_cache import ResultCache
+    metrics_list = [trackeval.metrics.CLEAR({'PRINT_CONFIG': False})]
+
+    def get_key():
+        dataset = trackeval.datasets.MotChallenge2DBox({'GT_FOLDER': mot_folders[0],
+                                                        'TRACKERS_FOLDER': mot_folders[1], 'PRINT_CONFIG': False})
+        return ResultCache(os.path.join(mot_folders[1], 'cache')).get_key(dataset, 'trk', 'MOT17-02',
+                                                                          ['pedestrian'], metrics_list)
+
+    key = get_key()
+    assert get_key() == key
+    with open(os.path.join(mot_folders[0], 'MOT17-train', 'MOT17-02', 'seqinfo.ini'), 'w') as f:
+        f.write('[Sequence]\nname=MOT17-02\nseqLength=25\n')
+    assert get_key() != key
+
+
+def _assert_results_equal(res, expected_res):
+    for seq in expected_res:
+        for cls in expected_res[seq]:
+            for metric in expected_res[seq][cls]:
+                for field, value in expected_res[seq][cls][metric].items():
+                    np.testing.assert_array_equal(res[seq][cls][metric][field], value)
+
+
+def test_spilling_results_under_memory_budget(mot_folders, tmp_path, monkeypatch):
+    metrics_list = [trackeval.metrics.HOTA(), trackeval.metrics.CLEAR({'PRINT_CONFIG': False})]
+    expected_res, _ = _evaluate(mot_folders, metrics_list)
+
+    # Results spilled to a temporary folder are returned in memory and the folder is removed afterwards
+    temp_folder = tmp_path / 'temp'
+    os.makedirs(temp_folder)
+    monkeypatch.setattr('tempfile.tempdir', str(temp_folder))
+    res, messages = _evaluate(mot_folders, metrics_list, MAX_RSS_MB=1)
+    assert messages['MotChallenge2DBox']['trk'] == 'Success'
+    _assert_results_equal(res['MotChallenge2DBox']['trk'], expected_res['MotChallenge2DBox']['trk'])
+    assert os.listdir(temp_folder) == []
+
+    # Results are spilled at most once per sequence while evaluating and once after combining, not on every check
+    spill_folder = tmp_path / 'spill'
+    res, _ = _evaluate(mot_folders, metrics_list, MAX_RSS_MB=1, SPILL_FOLDER=str(spill_folder))
+    _assert_results_equal(res['MotChallenge2DBox']['trk'], expected_res['MotChallenge2DBox']['trk'])
+    assert len(os.listdir(spill_folder)) <= 2 * 2 + 1
+
+
+@pytest.mark.parametrize('use_parallel', [False, True])
+def test_spilled_results_combined_without_loading_all(mot_folders, monkeypatch, use_parallel):
+    metrics_list = [trackeval.metrics.HOTA(), trackeval.metrics.CLEAR({'PRINT_CONFIG': False})]
+    expected_res, _ = _evaluate(mot_folders, metrics_list)
+
+    # Spilled results are combined from the spill files (loading one sequence at a time), not loaded back all at once
+    combined_types = []
+    combine_results = trackeval.Evaluator._combine_results
+    monkeypatch.setattr(trackeval.Evaluator, '_combine_results', staticmethod(
+        lambda res, *args: combined_types.append(type(res)) or combine_results(res, *args)))
+    res, _ = _evaluate(mot_folders, metrics_list, MAX_RSS_MB=1, USE_PARALLEL=use_parallel, NUM_PARALLEL_CORES=2)
+    assert combined_types == [trackeval._memory.SpilledResults]
+    _assert_results_equal(res['MotChallenge2DBox']['trk'], expected_res['MotChallenge2DBox']['trk'])
+
+
+def test_gt_resident_results_and_cached_gt(mot_folders):
+    metrics_list = [trackeval.metrics.HOTA(), trackeval.metrics.CLEAR({'PRINT_CONFIG': False})]
+    expected_res, _ = _evaluate(mot_folders, metrics_list)
+    res, _ = _evaluate(mot_folders, metrics_list, GT_RESIDENT=True)
+    _assert_results_equal(res['MotChallenge2DBox']['trk'], expected_res['MotChallenge2DBox']['trk'])
+
+    # Modifying the returned gt (also per-timestep arrays in place) does not change the cached gt
+    dataset = trackeval.datasets.MotChallenge2DBox({'GT_FOLDER': mot_folders[0], 'TRACKERS_FOLDER': mot_folders[1],
+                                                    'PRINT_CONFIG': False})
+    expected_gt = dataset.get_raw_gt_data('MOT17-02')
+    dataset.gt_resident = True
+    raw_gt = dataset.get_raw_gt_data('MOT17-02')
+    raw_gt['gt_ids'][0][:] = -1
+    raw_gt['gt_dets'][1] = raw_gt['gt_dets'][1][:0]
+    raw_gt['gt_extras'][0]['zero_marked'][:] = 0
+    raw_gt = dataset.get_raw_gt_data('MOT17-02')
+    for t in range(expected_gt['num_timesteps']):
+        np.testing.assert_array_equal(raw_gt['gt_ids'][t], expected_gt['gt_ids'][t])
+        np.testing.assert_array_equal(raw_gt['gt_dets'][t], expected_gt['gt_dets'][t])
+        np.testing.assert_array_equal(raw_gt['gt_extras'][t]['zero_marked'], expected_gt['gt_extras'][t]['zero_marked'])
+
+
+def test_gt_not_preloaded_for_cached_sequences(mot_folders, monkeypatch):
+    metrics_list = [trackeval.metrics.CLEAR({'PRINT_CONFIG': False})]
+    cache_folder = os.path.join(mot_folders[1], 'cache')
+    _evaluate(mot_folders, metrics_list, RESULT_CACHE_FOLDER=cache_folder)
+
+    preloaded = []
+    preload_gt = trackeval.datasets.MotChallenge2DBox.preload_gt
+    monkeypatch.setattr(trackeval.datasets.MotChallenge2DBox, 'preload_gt',
+                        lambda self, seq_list: preloaded.append(seq_list) or preload_gt(self, seq_list))
+    _, messages = _evaluate(mot_folders, metrics_list, RESULT_CACHE_FOLDER=cache_folder, GT_RESIDENT=True,
+                            USE_PARALLEL=True, NUM_PARALLEL_CORES=2)
+    assert messages['MotChallenge2DBox']['trk'] == 'Success'
+    assert preloaded == [[]]
+
+
+@pytest.mark.parametrize('time_progress,display_less_progress', [(True, True), (True, False), (False, False)])
+def test_timing_summary_gating(mot_folders, monkeypatch, capsys, time_progress, display_less_progress):
+    # The evaluator sets the global timing flags, which are restored after the test
+    monkeypatch.setattr(trackeval._timing, 'DO_TIMING', False)
+    monkeypatch.setattr(trackeval._timing, 'DISPLAY_LESS_PROGRESS', False)
+    monkeypatch.setattr(trackeval._timing, 'timer_dict', {})
+    monkeypatch.setattr(trackeval._timing, 'stage_dict', {})
+    metrics_list = [trackeval.metrics.CLEAR({'PRINT_CONFIG': False})]
+    _evaluate(mot_folders, metrics_list, TIME_PROGRESS=time_progress, DISPLAY_LESS_PROGRESS=display_less_progress)
+    out = capsys.readouterr().out
+
+    # The summary (with the time per stage) is printed whenever timing is on, the time of each method call only
+    # without DISPLAY_LESS_PROGRESS
+    assert ('Timing analysis:' in out) == time_progress
+    assert ('Timing per stage' in out) == time_progress
+    assert ('CLEAR.eval_sequence' in out) == (time_progress and not display_less_progress)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import trackeval
+
+
+def _random_seq(rng, num_timesteps=20, num_objects=5):
+    """Ground-truth boxes of objects moving with a constant velocity, present in random intervals"""
+    starts = rng.randint(0, num_timesteps // 2, num_objects)
+    ends = starts + rng.randint(2, num_timesteps // 2, num_objects)
+    pos = rng.rand(num_objects, 2) * 500
+    vel = rng.randn(num_objects, 2) * 5
+    seq = {'ids': [], 'dets': [], 'classes': []}
+    for t in range(num_timesteps):
+        present = np.nonzero((starts <= t) & (t < ends))[0]
+        seq['ids'].append(present + 1)
+        seq['dets'].append(np.concatenate([pos[present] + vel[present] * t, np.full((len(present), 2), 50.)], axis=1))
+        seq['classes'].append(np.where(present % 2 == 0, 1, 2))
+    return seq
+
+
+def test_perfect_tracker():
+    rng = np.random.RandomState(0)
+    gt_data = {'seq%i' % i: _random_seq(rng) for i in range(3)}
+    # The tracker uses different ids, which does not change the results.
+    tracker_data = {seq: dict(seq_data, ids=[ids + 10 for ids in seq_data['ids']])
+                    for seq, seq_data in gt_data.items()}
+    res = trackeval.evaluate_in_memory(gt_data, tracker_data, dataset_config={'CLASSES': {'a': 1, 'b': 2}})
+
+    assert set(res.keys()) == {'seq0', 'seq1', 'seq2', 'COMBINED_SEQ'}
+    for cls in ['a', 'b', 'cls_comb_det_av']:
+        combined = res['COMBINED_SEQ'][cls]
+        assert combined['HOTA']['HOTA'] == pytest.approx(np.ones(19))
+        assert combined['CLEAR']['MOTA'] == pytest.approx(1.)
+        assert combined['Identity']['IDF1'] == pytest.approx(1.)
+        assert combined['Count']['GT_Dets'] == combined['Count']['Dets']
+
+
+def test_errors_and_misses():
+    gt_data = {'seq': {'ids': [np.array([1, 2]), np.array([1, 2]), np.array([1])],
+                       'dets': [np.array([[0, 0, 10, 10], [20, 20, 10, 10]]),
+                                np.array([[0, 0, 10, 10], [20, 20, 10, 10]]),
+                                np.array([[0, 0, 10, 10]])]}}
+    # Track 2 is missed in the second timestep, track 1 switches id in the last timestep and there is one false
+    # positive (without overlap) in the first timestep.
+    tracker_data = {'seq': {'ids': [np.array([5, 6, 7]), np.array([5]), np.array([8])],
+                            'dets': [np.array([[0, 0, 10, 10], [20, 20, 10, 10], [100, 100, 10, 10]]),
+                                     np.array([[0, 0, 10, 10]]),
+                                     np.array([[0, 0, 10, 10]])]}}
+    res = trackeval.evaluate_in_memory(gt_data, tracker_data)
+    clear = res['COMBINED_SEQ']['object']['CLEAR']
+    assert clear['CLR_TP'] == 4
+    assert clear['CLR_FN'] == 1
+    assert clear['CLR_FP'] == 1
+    assert clear['IDSW'] == 1
+    identity = res['COMBINED_SEQ']['object']['Identity']
+    assert identity['IDTP'] == 3
+    assert identity['IDFN'] == 2
+    assert identity['IDFP'] == 2
+
+
+def test_empty_tracker():
+    gt_data = {'seq': {'ids': [np.array([1]), np.array([], dtype=int)],
+                       'dets': [np.array([[0, 0, 10, 10]]), np.empty((0, 4))]}}
+    tracker_data = {'seq': {'ids': [np.array([], dtype=int)] * 2, 'dets': [np.empty((0, 4))] * 2}}
+    res = trackeval.evaluate_in_memory(gt_data, tracker_data)
+    assert res['seq']['object']['CLEAR']['CLR_FN'] == 1
+    assert res['seq']['object']['Count']['Dets'] == 0
+
+
+def test_mismatching_timesteps():
+    gt_data = {'seq': {'ids': [np.array([1])], 'dets': [np.array([[0, 0, 10, 10]])]}}
+    tracker_data = {'seq': {'ids': [np.array([1])] * 2, 'dets': [np.array([[0, 0, 10, 10]])] * 2}}
+    with pytest.raises(trackeval.utils.TrackEvalException):
+        trackeval.evaluate_in_memory(gt_data, tracker_data)
+
+
+def test_no_output_with_timing_enabled(monkeypatch, capsys):
+    # Timing enabled globally (e.g. by an Evaluator) is disabled while evaluating in memory, and restored afterwards
+    monkeypatch.setattr(trackeval._timing, 'DO_TIMING', True)
+    monkeypatch.setattr(trackeval._timing, 'DISPLAY_LESS_PROGRESS', False)
+    rng = np.random.RandomState(0)
+    gt_data = {'seq': _random_seq(rng)}
+    trackeval.evaluate_in_memory(gt_data, gt_data)
+    assert capsys.readouterr().out == ''
+    assert trackeval._timing.DO_TIMING
+    assert not trackeval._timing.DISPLAY_LESS_PROGRESS
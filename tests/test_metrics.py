@@ -1,5 +1,6 @@
 import numpy as np
 import pytest
+from scipy.optimize import linear_sum_assignment
 
 import trackeval
 
@@ -180,6 +181,79 @@ def _from_dense(num_timesteps, num_gt_ids, num_tracker_ids, gt_present, tracker_
     return data
 
 
+def random_sequence(seed, num_timesteps=60, num_gt_ids=120, num_tracker_ids=150):
+    """A random sequence in which each id is present in a random span of timesteps, with partly zero similarities"""
+    rng = np.random.RandomState(seed)
+    gt_spans = np.sort(rng.randint(0, num_timesteps + 1, (num_gt_ids, 2)), axis=1)
+    tracker_spans = np.sort(rng.randint(0, num_timesteps + 1, (num_tracker_ids, 2)), axis=1)
+    t = np.arange(num_timesteps)[:, np.newaxis]
+    gt_present = (gt_spans[:, 0] <= t) & (t < gt_spans[:, 1])
+    tracker_present = (tracker_spans[:, 0] <= t) & (t < tracker_spans[:, 1])
+    similarity = rng.rand(num_timesteps, num_gt_ids, num_tracker_ids)
+    similarity *= rng.rand(num_timesteps, num_gt_ids, num_tracker_ids) < 0.05
+    return _from_dense(num_timesteps, num_gt_ids, num_tracker_ids, gt_present, tracker_present, similarity)
+
+
+def original_hota(data):
+    """HOTA.eval_sequence as originally implemented, accumulating over the timesteps one by one"""
+    metric = trackeval.metrics.HOTA()
+    res = {}
+    for field in metric.float_array_fields + metric.integer_array_fields:
+        res[field] = np.zeros((len(metric.array_labels)), dtype=float)
+    for field in metric.float_fields:
+        res[field] = 0
+
+    potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
+    gt_id_count = np.zeros((data['num_gt_ids'], 1))
+    tracker_id_count = np.zeros((1, data['num_tracker_ids']))
+    for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
+        similarity = data['similarity_scores'][t]
+        sim_iou_denom = similarity.sum(0)[np.newaxis, :] + similarity.sum(1)[:, np.newaxis] - similarity
+        sim_iou = np.zeros_like(similarity)
+        sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
+        sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
+        potential_matches_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += sim_iou
+        gt_id_count[gt_ids_t] += 1
+        tracker_id_count[0, tracker_ids_t] += 1
+
+    global_alignment_score = potential_matches_count / (gt_id_count + tracker_id_count - potential_matches_count)
+    matches_counts = [np.zeros_like(potential_matches_count) for _ in metric.array_labels]
+    for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
+        if len(gt_ids_t) == 0:
+            for a, alpha in enumerate(metric.array_labels):
+                res['HOTA_FP'][a] += len(tracker_ids_t)
+            continue
+        if len(tracker_ids_t) == 0:
+            for a, alpha in enumerate(metric.array_labels):
+                res['HOTA_FN'][a] += len(gt_ids_t)
+            continue
+        similarity = data['similarity_scores'][t]
+        score_mat = global_alignment_score[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] * similarity
+        match_rows, match_cols = linear_sum_assignment(-score_mat)
+        for a, alpha in enumerate(metric.array_labels):
+            actually_matched_mask = similarity[match_rows, match_cols] >= alpha - np.finfo('float').eps
+            alpha_match_rows = match_rows[actually_matched_mask]
+            alpha_match_cols = match_cols[actually_matched_mask]
+            num_matches = len(alpha_match_rows)
+            res['HOTA_TP'][a] += num_matches
+            res['HOTA_FN'][a] += len(gt_ids_t) - num_matches
+            res['HOTA_FP'][a] += len(tracker_ids_t) - num_matches
+            if num_matches > 0:
+                res['LocA'][a] += sum(similarity[alpha_match_rows, alpha_match_cols])
+                matches_counts[a][gt_ids_t[alpha_match_rows], tracker_ids_t[alpha_match_cols]] += 1
+
+    for a, alpha in enumerate(metric.array_labels):
+        matches_count = matches_counts[a]
+        ass_a = matches_count / np.maximum(1, gt_id_count + tracker_id_count - matches_count)
+        res['AssA'][a] = np.sum(matches_count * ass_a) / np.maximum(1, res['HOTA_TP'][a])
+        ass_re = matches_count / np.maximum(1, gt_id_count)
+        res['AssRe'][a] = np.sum(matches_count * ass_re) / np.maximum(1, res['HOTA_TP'][a])
+        ass_pr = matches_count / np.maximum(1, tracker_id_count)
+        res['AssPr'][a] = np.sum(matches_count * ass_pr) / np.maximum(1, res['HOTA_TP'][a])
+    res['LocA'] = np.maximum(1e-10, res['LocA']) / np.maximum(1e-10, res['HOTA_TP'])
+    return metric._compute_final_fields(res)
+
+
 METRICS_BY_NAME = {
         'clear': trackeval.metrics.CLEAR(),
         'identity': trackeval.metrics.Identity(),
@@ -210,3 +284,159 @@ def test_metric(sequence_name, metric_name):
     result = metric.eval_sequence(data)
     for key, value in expected[metric_name].items():
         assert result[key] == pytest.approx(value), key
+
+
+@pytest.mark.parametrize('sequence_name', ['no_confusion', 'with_confusion', 'split_tracks'])
+def test_hota_sparse_matches_dense(sequence_name):
+    data, _ = SEQUENCE_BY_NAME[sequence_name]
+    dense_result = trackeval.metrics.HOTA({'SPARSE_THRESHOLD': None}).eval_sequence(data)
+    sparse_result = trackeval.metrics.HOTA({'SPARSE_THRESHOLD': 0}).eval_sequence(data)
+    for key, value in dense_result.items():
+        np.testing.assert_array_equal(sparse_result[key], value, err_msg=key)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_hota_matches_original_loop(seed):
+    # More than np.getbufsize() pairs of ids, such that the association sums over all pairs are taken blockwise.
+    data = random_sequence(seed)
+    original_result = original_hota(data)
+    dense_result = trackeval.metrics.HOTA({'SPARSE_THRESHOLD': None}).eval_sequence(data)
+    sparse_result = trackeval.metrics.HOTA({'SPARSE_THRESHOLD': 0}).eval_sequence(data)
+    for key, value in original_result.items():
+        np.testing.assert_array_equal(dense_result[key], value, err_msg=key)
+        np.testing.assert_array_equal(sparse_result[key], value, err_msg=key)
+
+
+@pytest.mark.parametrize('seed,num_gt_ids,num_tracker_ids', [(0, 120, 150), (1, 40, 3), (2, 300, 2), (3, 5, 40)])
+def test_hota_potential_matches_match_original_loop(seed, num_gt_ids, num_tracker_ids):
+    data = random_sequence(seed, num_gt_ids=num_gt_ids, num_tracker_ids=num_tracker_ids)
+    potential_matches_count = np.zeros((num_gt_ids, num_tracker_ids))
+    for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
+        similarity = data['similarity_scores'][t]
+        sim_iou_denom = similarity.sum(0)[np.newaxis, :] + similarity.sum(1)[:, np.newaxis] - similarity
+        sim_iou = np.zeros_like(similarity)
+        sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
+        sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
+        potential_matches_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += sim_iou
+
+    pair_ids, pair_values, _, _ = trackeval.metrics.HOTA._accumulate_potential_matches(data)
+    result = np.bincount(pair_ids, weights=pair_values, minlength=num_gt_ids * num_tracker_ids)
+    np.testing.assert_array_equal(result.reshape(num_gt_ids, num_tracker_ids), potential_matches_count)
+
+
+@pytest.mark.parametrize('size', [1, 7, 100, 8191, 8192, 8193, 3 * 8192, 50000])
+@pytest.mark.parametrize('block_sums_match_np_sum', [True, False])
+def test_hota_sparse_sums(size, block_sums_match_np_sum, monkeypatch):
+    rng = np.random.RandomState(size)
+    densities = np.array([[0.001], [0.1], [1.0]])
+    values = rng.rand(3, size) * 10 ** rng.uniform(-3, 3, (3, size)) * (rng.rand(3, size) < densities)
+    positions = np.flatnonzero(values.any(0))
+
+    # The blockwise sums are identical to np.sum for this numpy version (as checked on first use), and the dense
+    # fallback for other numpy versions gives the same sums.
+    trackeval.metrics.HOTA._sparse_sums(values[:, positions], positions, size)
+    assert trackeval.metrics.hota._block_sums_match_np_sum[np.getbufsize()]
+    monkeypatch.setitem(trackeval.metrics.hota._block_sums_match_np_sum, np.getbufsize(), block_sums_match_np_sum)
+    sums = trackeval.metrics.HOTA._sparse_sums(values[:, positions], positions, size)
+    for row in range(3):
+        assert sums[row] == np.sum(values[row])
+
+
+def test_hota_block_sums_with_other_buffer_size():
+    old_bufsize = np.setbufsize(1024)
+    try:
+        data = random_sequence(0)
+        original_result = original_hota(data)
+        result = trackeval.metrics.HOTA({'SPARSE_THRESHOLD': 0}).eval_sequence(data)
+        assert trackeval.metrics.hota._block_sums_match_np_sum[1024]
+    finally:
+        np.setbufsize(old_bufsize)
+    for key, value in original_result.items():
+        np.testing.assert_array_equal(result[key], value, err_msg=key)
+
+
+@pytest.mark.parametrize('sequence_name', ['no_confusion', 'with_confusion', 'split_tracks'])
+def test_identity_sparse_matches_dense(sequence_name):
+    data, expected = SEQUENCE_BY_NAME[sequence_name]
+    dense_result = trackeval.metrics.Identity({'SPARSE_THRESHOLD': None}).eval_sequence(data)
+    sparse_result = trackeval.metrics.Identity({'SPARSE_THRESHOLD': 0}).eval_sequence(data)
+    for key, value in expected['identity'].items():
+        assert sparse_result[key] == pytest.approx(value), key
+    for key, value in dense_result.items():
+        assert sparse_result[key] == value, key
+
+
+@pytest.mark.parametrize('sequence_name', ['no_confusion', 'with_confusion', 'split_tracks'])
+def test_clear_threshold_curves(sequence_name):
+    data, _ = SEQUENCE_BY_NAME[sequence_name]
+    thresholds = [0.3, 0.5, 0.9]
+    result = trackeval.metrics.CLEAR({'THRESHOLDS': thresholds}).eval_sequence(data)
+    for i, threshold in enumerate(thresholds):
+        threshold_result = trackeval.metrics.CLEAR({'THRESHOLD': threshold}).eval_sequence(data)
+        for field in ['MOTA', 'MOTP', 'IDSW', 'Frag', 'CLR_TP', 'CLR_FN', 'CLR_FP']:
+            assert result[field + '_curve'][i] == threshold_result[field], field
+
+
+@pytest.mark.parametrize('sequence_name', ['no_confusion', 'with_confusion', 'split_tracks'])
+def test_identity_threshold_curves(sequence_name):
+    data, _ = SEQUENCE_BY_NAME[sequence_name]
+    thresholds = [0.3, 0.5, 0.9]
+    result = trackeval.metrics.Identity({'THRESHOLDS': thresholds}).eval_sequence(data)
+    for i, threshold in enumerate(thresholds):
+        threshold_result = trackeval.metrics.Identity({'THRESHOLD': threshold}).eval_sequence(data)
+        for field in ['IDF1', 'IDR', 'IDP', 'IDTP', 'IDFN', 'IDFP']:
+            assert result[field + '_curve'][i] == threshold_result[field], field
+
+
+def test_j_and_f_boundary_f_for_pairs():
+    mask_utils = pytest.importorskip('pycocotools.mask')
+    pytest.importorskip('cv2')
+    pytest.importorskip('skimage')
+    rng = np.random.RandomState(0)
+    num_timesteps, num_ids = 3, 3
+    masks = []
+    for _ in range(num_timesteps):
+        time_masks = []
+        for _ in range(num_ids):
+            mask = np.zeros((40, 60), dtype=np.uint8, order='F')
+            y, x = rng.randint(0, 30), rng.randint(0, 50)
+            mask[y:y + rng.randint(1, 20), x:x + rng.randint(1, 20)] = 1
+            time_masks.append(mask_utils.encode(mask))
+        masks.append(time_masks)
+    empty_masks = [[mask_utils.encode(np.zeros((40, 60), dtype=np.uint8, order='F'))] for _ in range(num_timesteps)]
+
+    # F of each mask with itself is 1, and with an empty mask 0
+    pairs = list(np.ndindex(num_ids, num_ids))
+    f = trackeval.metrics.JAndF._compute_f(masks, masks, pairs, 0.008)
+    np.testing.assert_array_equal(f[[pairs.index((i, i)) for i in range(num_ids)]], 1)
+    np.testing.assert_array_equal(trackeval.metrics.JAndF._compute_f(empty_masks, masks, [(1, 0)], 0.008), 0)
+
+    # F values of each pair do not depend on the other pairs they are computed with (which share cached boundaries)
+    for pair_idx, pair in enumerate(pairs):
+        np.testing.assert_array_equal(trackeval.metrics.JAndF._compute_f(masks, masks, [pair], 0.008)[0], f[pair_idx])
+
+
+def test_j_and_f_cropped_boundaries_match_full_frame():
+    mask_utils = pytest.importorskip('pycocotools.mask')
+    cv2 = pytest.importorskip('cv2')
+    disk = pytest.importorskip('skimage.morphology').disk
+    rng = np.random.RandomState(0)
+    for _ in range(20):
+        masks = []
+        for _ in range(2):
+            mask = np.zeros((30, 40), dtype=np.uint8, order='F')
+            y, x = rng.randint(0, 30), rng.randint(0, 40)
+            mask[y:y + rng.randint(1, 30), x:x + rng.randint(1, 40)] = 1  # possibly touching the frame edges
+            masks.append(mask)
+        f = trackeval.metrics.JAndF._compute_f([[mask_utils.encode(masks[0])]], [[mask_utils.encode(masks[1])]],
+                                               [(0, 0)], 0.008)
+
+        # F computed on the full frame
+        structuring_element = disk(np.ceil(0.008 * np.linalg.norm(masks[0].shape))).astype(np.uint8)
+        gt_boundary, fg_boundary = [trackeval.metrics.JAndF._seg2bmap(mask) for mask in masks]
+        precision = np.sum(fg_boundary * cv2.dilate(gt_boundary.astype(np.uint8), structuring_element)) / \
+            np.sum(fg_boundary)
+        recall = np.sum(gt_boundary * cv2.dilate(fg_boundary.astype(np.uint8), structuring_element)) / \
+            np.sum(gt_boundary)
+        expected = 0 if precision + recall == 0 else 2 * precision * recall / (precision + recall)
+        assert f[0, 0] == expected
@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+SCRIPTS_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'scripts')
+
+
+@pytest.fixture
+def tao_folders(tmp_path):
+    """A small synthetic TAO split (one video with two tracks of one class) with one tracker"""
+    gt_folder = tmp_path / 'gt'
+    trackers_folder = tmp_path / 'trackers'
+    os.makedirs(gt_folder)
+    os.makedirs(trackers_folder / 'trk' / 'data')
+    images = [{'id': t, 'video_id': 0, 'frame_index': t} for t in range(5)]
+    anns = [{'id': 2 * t + k, 'image_id': t, 'video_id': 0, 'track_id': k, 'category_id': 1,
+             'bbox': [100.0 * k + 3 * t, 50.0, 40.0, 60.0]} for t in range(5) for k in range(2)]
+    gt = {'videos': [{'id': 0, 'name': 'vid/0', 'neg_category_ids': [], 'not_exhaustive_category_ids': []}],
+          'images': images, 'annotations': anns, 'categories': [{'id': 1, 'name': 'person'}],
+          'tracks': [{'id': k, 'category_id': 1, 'video_id': 0} for k in range(2)]}
+    (gt_folder / 'gt.json').write_text(json.dumps(gt))
+    tracker = [{'image_id': ann['image_id'], 'video_id': 0, 'track_id': ann['track_id'] + 10, 'category_id': 1,
+                'bbox': [ann['bbox'][0] + 2, ann['bbox'][1], 40.0, 60.0], 'score': 0.9} for ann in anns]
+    (trackers_folder / 'trk' / 'data' / 'res.json').write_text(json.dumps(tracker))
+    return str(gt_folder), str(trackers_folder)
+
+
+def _run_script(script, folders, tmp_path):
+    """Runs a script with the timing trace and json files given on the command line, and checks they are written"""
+    trace_file = os.path.join(str(tmp_path), 'trace.json')
+    json_file = os.path.join(str(tmp_path), 'timings.json')
+    args = [sys.executable, os.path.join(SCRIPTS_FOLDER, script), '--GT_FOLDER', folders[0],
+            '--TRACKERS_FOLDER', folders[1], '--USE_PARALLEL', 'False', '--PLOT_CURVES', 'False',
+            '--TIMING_TRACE_FILE', trace_file, '--TIMING_JSON_FILE', json_file]
+    result = subprocess.run(args, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    with open(trace_file) as f:
+        assert len(json.load(f)['traceEvents']) > 0
+    with open(json_file) as f:
+        assert len(json.load(f)['spans']) > 0
+
+
+def test_run_mot_challenge_timing_files(mot_folders, tmp_path):
+    _run_script('run_mot_challenge.py', mot_folders, tmp_path)
+
+
+def test_run_tao_timing_files(tao_folders, tmp_path):
+    _run_script('run_tao.py', tao_folders, tmp_path)
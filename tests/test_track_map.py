@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+
+import trackeval
+
+
+def _match_greedy_reference(array_labels, ious, gt_ig, gt_ids, dt_ids, gt_m, dt_m, dt_ig):
+    """The original (per-gt) greedy matching loop of TrackMAP.eval_sequence"""
+    for iou_thr_idx, iou_thr in enumerate(array_labels):
+        for dt_idx, _dt in enumerate(dt_ids):
+            iou = min([iou_thr, 1 - 1e-10])
+            m = -1
+            for gt_idx, _ in enumerate(gt_ids):
+                if gt_m[iou_thr_idx, gt_idx] > 0:
+                    continue
+                if m > -1 and gt_ig[m] == 0 and gt_ig[gt_idx] == 1:
+                    break
+                if ious[dt_idx, gt_idx] < iou - np.finfo('float').eps:
+                    continue
+                iou = ious[dt_idx, gt_idx]
+                m = gt_idx
+            if m == -1:
+                continue
+            dt_ig[iou_thr_idx, dt_idx] = gt_ig[m]
+            dt_m[iou_thr_idx, dt_idx] = gt_ids[m]
+            gt_m[iou_thr_idx, m] = _dt
+
+
+@pytest.mark.parametrize('first_id', [0, 1])
+def test_match_greedy_matches_reference(first_id):
+    metric = trackeval.metrics.TrackMAP({'PRINT_CONFIG': False})
+    num_thrs = len(metric.array_labels)
+    rng = np.random.RandomState(first_id)
+    for trial in range(200):
+        num_gt, num_dt = rng.randint(1, 20, 2)
+        ious = rng.rand(num_dt, num_gt) * (rng.rand(num_dt, num_gt) < 0.4)
+        if trial % 3 == 0:
+            # Ties, and IoUs within a few eps of a threshold
+            ious = np.round(ious, 1)
+            near_thr = rng.rand(num_dt, num_gt) < 0.3
+            ious[near_thr] = 0.5 + np.finfo('float').eps * rng.randint(-3, 4, near_thr.sum())
+        elif trial % 3 == 1:
+            # IoUs within a few eps of each other, such that later gts can replace a slightly better match
+            near_best = rng.rand(num_dt, num_gt) < 0.6
+            ious[near_best] = 0.7 + np.finfo('float').eps * rng.randint(-4, 2, near_best.sum())
+        gt_ig = np.sort(rng.rand(num_gt) < 0.3).astype(int)
+        gt_ids = list(rng.permutation(num_gt) + first_id)
+        dt_ids = list(rng.permutation(num_dt) + first_id)
+
+        results = []
+        for match_fn in [metric._match_greedy, lambda *args: _match_greedy_reference(metric.array_labels, *args)]:
+            gt_m = np.zeros((num_thrs, num_gt)) - 1
+            dt_m = np.zeros((num_thrs, num_dt)) - 1
+            dt_ig = np.zeros((num_thrs, num_dt))
+            match_fn(ious, gt_ig, gt_ids, dt_ids, gt_m, dt_m, dt_ig)
+            results.append((gt_m, dt_m, dt_ig))
+        for result, expected in zip(*results):
+            np.testing.assert_array_equal(result, expected)
+
+
+def _bb_track_iou_reference(dt_track, gt_track):
+    """Track IoU of one pair of tracks with xywh boxes, accumulated frame by frame"""
+    intersect, union = 0, 0
+    for image in set(gt_track.keys()) | set(dt_track.keys()):
+        d, g = dt_track.get(image, None), gt_track.get(image, None)
+        d_area = 0 if d is None else d[2] * d[3]
+        g_area = 0 if g is None else g[2] * g[3]
+        i = 0
+        if d is not None and g is not None:
+            i = max(min(d[0] + d[2], g[0] + g[2]) - max(d[0], g[0]), 0) * \
+                max(min(d[1] + d[3], g[1] + g[3]) - max(d[1], g[1]), 0)
+        intersect += i
+        union += d_area + g_area - i
+    return intersect / union if union > 0 else 0
+
+
+@pytest.mark.parametrize('boxformat', ['xywh', 'x0y0x1y1'])
+def test_bb_track_ious_match_reference(boxformat):
+    rng = np.random.RandomState(0)
+    for _ in range(50):
+        num_frames = rng.randint(1, 20)
+        dt, gt = [[{int(f): rng.rand(4) * 100 for f in rng.choice(num_frames, rng.randint(0, num_frames + 1),
+                                                                   replace=False)}
+                   for _ in range(num_tracks)] for num_tracks in rng.randint(1, 8, 2)]
+        expected = np.array([[_bb_track_iou_reference(d, g) for g in gt] for d in dt])
+        if boxformat == 'x0y0x1y1':
+            dt, gt = [[{f: np.concatenate((b[:2], b[:2] + b[2:])) for f, b in track.items()} for track in tracks]
+                      for tracks in [dt, gt]]
+        ious = trackeval.metrics.TrackMAP._compute_track_ious(dt, gt, iou_function='bbox', boxformat=boxformat)
+        np.testing.assert_allclose(ious, expected, rtol=0, atol=1e-12)
+
+
+def test_mask_track_ious_match_reference():
+    mask_utils = pytest.importorskip('pycocotools.mask')
+    rng = np.random.RandomState(0)
+
+    def random_mask():
+        mask = np.zeros((20, 30), dtype=np.uint8, order='F')
+        y, x = rng.randint(0, 20), rng.randint(0, 30)
+        mask[y:y + rng.randint(0, 20), x:x + rng.randint(0, 30)] = 1
+        return mask_utils.encode(mask) if rng.rand() < 0.7 else None
+
+    for _ in range(20):
+        num_frames = rng.randint(1, 8)
+        dt, gt = [[{f: random_mask() for f in range(num_frames)} for _ in range(num_tracks)]
+                  for num_tracks in rng.randint(1, 6, 2)]
+        expected = np.zeros([len(dt), len(gt)])
+        for i, j in np.ndindex(expected.shape):
+            intersect, union = 0., 0.
+            for f in range(num_frames):
+                masks = [m for m in [dt[i][f], gt[j][f]] if m]
+                if masks:
+                    intersect += mask_utils.area(mask_utils.merge(masks, True)) if len(masks) == 2 else 0
+                    union += mask_utils.area(mask_utils.merge(masks, False))
+            expected[i, j] = intersect / union if union > 0 else 0
+        ious = trackeval.metrics.TrackMAP._compute_track_ious(dt, gt, iou_function='mask')
+        np.testing.assert_array_equal(ious, expected)
+
+
+def test_combine_sequences_merges_by_score():
+    metric = trackeval.metrics.TrackMAP({'PRINT_CONFIG': False})
+    num_thrs = len(metric.array_labels)
+    rng = np.random.RandomState(0)
+    all_res = {}
+    for seq in range(5):
+        num_dt, num_gt = rng.randint(0, 10), rng.randint(1, 5)
+        dt_scores = -np.sort(-np.round(rng.rand(num_dt), 1))
+        all_res[seq] = {mask_idx: {'dt_matches': np.where(rng.rand(num_thrs, num_dt) < 0.5, 1., -1.),
+                                   'dt_ignore': rng.rand(num_thrs, num_dt) < 0.2, 'dt_scores': dt_scores,
+                                   'gt_ignore': (rng.rand(num_gt) < 0.3).astype(int)}
+                        for mask_idx in range(metric.num_ig_masks)}
+
+    # Combining all sequences equals combining a single sequence with all results (stably) sorted by score
+    single_res = {}
+    for mask_idx in range(metric.num_ig_masks):
+        mask_res = [res[mask_idx] for res in all_res.values()]
+        order = np.argsort(-np.concatenate([res['dt_scores'] for res in mask_res]), kind='mergesort')
+        single_res[mask_idx] = {field: np.concatenate([res[field] for res in mask_res], axis=-1)[..., order]
+                                for field in ['dt_matches', 'dt_ignore', 'dt_scores']}
+        single_res[mask_idx]['gt_ignore'] = np.concatenate([res['gt_ignore'] for res in mask_res])
+    res = metric.combine_sequences(all_res)
+    expected = metric.combine_sequences({'single': single_res})
+    for field in expected:
+        np.testing.assert_array_equal(res[field], expected[field])
+
+
+@pytest.mark.parametrize('max_det', [0, 2])
+def test_max_detections_list_matches_separate_runs(max_det):
+    max_dets_list = [1, 3, 0]
+    metric = trackeval.metrics.TrackMAP({'PRINT_CONFIG': False, 'MAX_DETECTIONS': max_det,
+                                         'MAX_DETECTIONS_LIST': max_dets_list})
+    num_thrs = len(metric.array_labels)
+    rng = np.random.RandomState(max_det)
+    all_res = {}
+    for seq in range(5):
+        num_dt, num_gt = rng.randint(0, 8), rng.randint(1, 5)
+        dt_scores = -np.sort(-np.round(rng.rand(num_dt), 1))
+        all_res[seq] = {mask_idx: {'dt_matches': np.where(rng.rand(num_thrs, num_dt) < 0.5, 1., -1.),
+                                   'dt_ignore': rng.rand(num_thrs, num_dt) < 0.2, 'dt_scores': dt_scores,
+                                   'gt_ignore': (rng.rand(num_gt) < 0.3).astype(int)}
+                        for mask_idx in range(metric.num_ig_masks)}
+    res = metric.combine_sequences(all_res)
+    assert set(res.keys()) == set(metric.fields) | {'precision', 'recall'}
+    for suffix, separate_max_det in zip(['', '_maxDet1', '_maxDet3', '_maxDet0'], [max_det] + max_dets_list):
+        separate_res = trackeval.metrics.TrackMAP({'PRINT_CONFIG': False, 'MAX_DETECTIONS': separate_max_det}
+                                                  ).combine_sequences(all_res)
+        for field in ['AP_' + lbl for lbl in metric.lbls] + ['AR_' + lbl for lbl in metric.lbls]:
+            np.testing.assert_array_equal(res[field + suffix], separate_res[field])
@@ -1,4 +1,4 @@
-from .eval import Evaluator
+from .eval import Evaluator, evaluate_in_memory
 from . import datasets
 from . import metrics
 from . import plotting
@@ -0,0 +1,123 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components, min_weight_full_bipartite_matching
+from .utils import TrackEvalException
+
+SOLVER = 'hungarian'  # Assignment solver backend used by max_score_assignment (one of SOLVERS)
+
+
+def max_score_assignment(score_mat, solver=None):
+    """ Finds the one-to-one assignment between rows and cols which maximises the total score (as
+    linear_sum_assignment(-score_mat) does) and returns the assigned (rows, cols) with a positive score, sorted by row.
+    Scores are expected to be non-negative. The assignment is solved with the given solver backend (if None, SOLVER):
+        'hungarian': linear_sum_assignment on the full dense matrix.
+        'components': the bipartite graph of positive scores is split into its connected components, which are solved
+            separately with linear_sum_assignment (components of a single row and col are assigned directly).
+        'sparse': min_weight_full_bipartite_matching on the sparse matrix of positive scores.
+    Except for 'hungarian', rows and cols without any positive score are dropped first, and if every remaining row and
+    col has a single positive score (a one-to-one overlap) these pairs are returned directly without solving.
+    """
+    solver = SOLVER if solver is None else solver
+    if solver not in SOLVERS:
+        raise TrackEvalException('Assignment solver %s is not implemented. Valid: %s' % (solver, ', '.join(SOLVERS)))
+    if solver == 'hungarian':
+        match_rows, match_cols = linear_sum_assignment(-score_mat)
+        is_positive = score_mat[match_rows, match_cols] > 0
+        return match_rows[is_positive], match_cols[is_positive]
+
+    is_edge = score_mat > 0
+    rows = np.flatnonzero(is_edge.any(1))
+    cols = np.flatnonzero(is_edge.any(0))
+    if len(rows) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    score_mat = score_mat[rows[:, np.newaxis], cols[np.newaxis, :]]
+    edge_rows, edge_cols = np.nonzero(is_edge[rows[:, np.newaxis], cols[np.newaxis, :]])
+
+    # If every remaining row and col has a single positive score, these pairs are the assignment.
+    if len(edge_rows) == len(rows) == len(cols):
+        return rows[edge_rows], cols[edge_cols]
+
+    match_rows, match_cols = SOLVERS[solver](score_mat, edge_rows, edge_cols)
+
+    # Only return positive scores (solvers may assign zero scores), sorted by row.
+    is_positive = score_mat[match_rows, match_cols] > 0
+    order = np.argsort(match_rows[is_positive])
+    return rows[match_rows[is_positive][order]], cols[match_cols[is_positive][order]]
+
+
+def max_score_assignment_sparse(rows, cols, scores):
+    """ Finds the one-to-one assignment between rows and cols which maximises the total score, for a sparse score
+    matrix given by the (row, col) indices and scores of its (unique) positive entries. Only the rows and cols of
+    these entries are considered, so the dense matrix is never built. Returns the indices of the assigned entries.
+    """
+    if len(scores) == 0:
+        return np.zeros(0, dtype=int)
+    unique_rows, edge_rows = np.unique(rows, return_inverse=True)
+    unique_cols, edge_cols = np.unique(cols, return_inverse=True)
+
+    # If every row and col has a single entry, these entries are the assignment.
+    if len(scores) == len(unique_rows) == len(unique_cols):
+        return np.arange(len(scores))
+
+    match_rows, match_cols = _sparse_matching(edge_rows, edge_cols, scores, len(unique_rows), len(unique_cols))
+    edge_keys = edge_rows * len(unique_cols) + edge_cols
+    edge_order = np.argsort(edge_keys)
+    return edge_order[np.searchsorted(edge_keys[edge_order], match_rows * len(unique_cols) + match_cols)]
+
+
+def _solve_components(score_mat, edge_rows, edge_cols):
+    """Solves the assignment separately for each connected component of the graph of edges (positive scores)"""
+    # Label the connected components of the bipartite graph (rows are nodes 0..R-1, cols are nodes R..R+C-1).
+    num_rows, num_cols = score_mat.shape
+    num_nodes = num_rows + num_cols
+    graph = coo_matrix((np.ones(len(edge_rows)), (edge_rows, num_rows + edge_cols)), shape=(num_nodes, num_nodes))
+    num_components, labels = connected_components(graph, directed=False)
+    if num_components == 1:
+        return linear_sum_assignment(-score_mat)
+    row_labels = labels[:num_rows]
+    col_labels = labels[num_rows:]
+
+    # Components with a single row and a single col are trivially assigned, all others are solved separately.
+    is_single = (np.bincount(row_labels, minlength=num_components) == 1) & \
+                (np.bincount(col_labels, minlength=num_components) == 1)
+    single_rows = np.flatnonzero(is_single[row_labels])
+    single_cols = np.flatnonzero(is_single[col_labels])
+    match_rows = [single_rows[np.argsort(row_labels[single_rows])]]
+    match_cols = [single_cols[np.argsort(col_labels[single_cols])]]
+    rows_by_component = np.split(np.argsort(row_labels, kind='stable'),
+                                 np.cumsum(np.bincount(row_labels, minlength=num_components))[:-1])
+    cols_by_component = np.split(np.argsort(col_labels, kind='stable'),
+                                 np.cumsum(np.bincount(col_labels, minlength=num_components))[:-1])
+    for component in np.flatnonzero(~is_single):
+        component_rows = rows_by_component[component]
+        component_cols = cols_by_component[component]
+        sub_rows, sub_cols = linear_sum_assignment(-score_mat[component_rows[:, np.newaxis],
+                                                              component_cols[np.newaxis, :]])
+        match_rows.append(component_rows[sub_rows])
+        match_cols.append(component_cols[sub_cols])
+    return np.concatenate(match_rows), np.concatenate(match_cols)
+
+
+def _solve_sparse(score_mat, edge_rows, edge_cols):
+    """Solves the assignment as a minimum weight full bipartite matching on the sparse graph of edges"""
+    return _sparse_matching(edge_rows, edge_cols, score_mat[edge_rows, edge_cols], *score_mat.shape)
+
+
+def _sparse_matching(edge_rows, edge_cols, edge_scores, num_rows, num_cols):
+    """ Finds the assignment maximising the total score of the given edges (positive scores) as a minimum weight full
+    bipartite matching. Each row also gets a dummy col (for staying unassigned), such that a full matching always
+    exists. The dummy cols have the smallest positive weight instead of zero, as zero weights are treated as missing
+    edges.
+    """
+    weights = np.concatenate((-edge_scores, np.full(num_rows, np.finfo('float').tiny)))
+    graph_rows = np.concatenate((edge_rows, np.arange(num_rows)))
+    graph_cols = np.concatenate((edge_cols, num_cols + np.arange(num_rows)))
+    graph = csr_matrix((weights, (graph_rows, graph_cols)), shape=(num_rows, num_cols + num_rows))
+    match_rows, match_cols = min_weight_full_bipartite_matching(graph)
+    is_real = match_cols < num_cols
+    return match_rows[is_real], match_cols[is_real].astype(int)
+
+
+# Available solver backends (apart from 'hungarian', which is solved on the full matrix without dropping anything).
+SOLVERS = {'hungarian': None, 'components': _solve_components, 'sparse': _solve_sparse}
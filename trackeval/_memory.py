@@ -0,0 +1,199 @@
+import os
+import sys
+import gc
+import pickle
+import shutil
+import tempfile
+import tracemalloc
+from collections.abc import Mapping
+
+DO_MEMORY = False
+memory_dict = {}
+
+# Stages reported (in this order, with a description) in the memory summary, further stages are reported afterwards.
+STAGE_DESCRIPTIONS = {'load': 'raw data', 'similarity': 'similarity matrices', 'preprocess': 'per-class data',
+                      'results': 'accumulated results'}
+
+# As the RSS rarely drops after memory is freed, after spilling the budget is only exceeded again once the RSS has grown
+# by this fraction of the budget (i.e. once memory has actually been allocated again).
+SPILL_HYSTERESIS = 0.1
+
+
+def start():
+    """Starts memory accounting (with tracemalloc) in this process"""
+    global DO_MEMORY
+    DO_MEMORY = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop():
+    """Stops memory accounting in this process"""
+    global DO_MEMORY
+    DO_MEMORY = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def stage_enter():
+    """Called when a timing stage is entered, returns the state needed by stage_exit"""
+    current, _ = tracemalloc.get_traced_memory()
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    return current
+
+
+def stage_exit(name, start_current):
+    """ Accounts the memory of a stage: the memory still allocated after the stage (net) is summed over all calls, the
+    peak of additional memory allocated during the stage is the maximum over all calls.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    record(name, current - start_current, peak - start_current)
+
+
+def record(name, net, peak):
+    """Records the net and peak memory (in bytes) of one call of a stage"""
+    if name not in memory_dict.keys():
+        memory_dict[name] = {'net': 0, 'peak': 0, 'calls': 0}
+    memory_dict[name]['net'] += net
+    memory_dict[name]['peak'] = max(memory_dict[name]['peak'], peak)
+    memory_dict[name]['calls'] += 1
+
+
+def get_memory():
+    """Returns the memory accounting of this process, e.g. to send it from a worker back to the parent process"""
+    return {name: dict(values) for name, values in memory_dict.items()}
+
+
+def reset_memory():
+    """Clears the memory accounting of this process"""
+    memory_dict.clear()
+
+
+def merge_memory(memory):
+    """Adds memory accounting returned by get_memory (e.g. in a worker process) to the accounting of this process"""
+    for name, values in memory.items():
+        if name not in memory_dict.keys():
+            memory_dict[name] = {'net': 0, 'peak': 0, 'calls': 0}
+        memory_dict[name]['net'] += values['net']
+        memory_dict[name]['peak'] = max(memory_dict[name]['peak'], values['peak'])
+        memory_dict[name]['calls'] += values['calls']
+
+
+def print_summary():
+    """Prints the memory accounting per stage and the peak resident set size"""
+    print("")
+    print("Memory analysis (net is summed over all calls, peak is the maximum of a single call):")
+    names = [s for s in STAGE_DESCRIPTIONS.keys() if s in memory_dict.keys()]
+    names += [s for s in memory_dict.keys() if s not in STAGE_DESCRIPTIONS.keys()]
+    for name in names:
+        values = memory_dict[name]
+        label = name + (' (' + STAGE_DESCRIPTIONS[name] + ')' if name in STAGE_DESCRIPTIONS.keys() else '')
+        print('%-50s net %10.1f MB   peak %10.1f MB' % (label, values['net'] / 2**20, values['peak'] / 2**20))
+    peak_rss = get_peak_rss_mb()
+    if peak_rss is not None:
+        print('%-50s %10.1f MB' % ('peak RSS (main process)', peak_rss))
+
+
+def get_rss_mb():
+    """Returns the current resident set size of this process in MB, or None if it cannot be determined"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        return None
+
+
+def get_peak_rss_mb():
+    """Returns the peak resident set size of this process in MB, or None if it cannot be determined"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in KB on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+class ResultSpiller:
+    """ Spills results to disk (as one pickle file per item) so that they no longer need to be held in memory. Used by
+    the Evaluator to keep evaluation under the configured MAX_RSS_MB.
+    """
+
+    def __init__(self, max_rss_mb, spill_folder=None):
+        self.max_rss_mb = float(max_rss_mb)
+        self.is_temporary = spill_folder is None
+        if self.is_temporary:
+            self.spill_folder = tempfile.mkdtemp(prefix='trackeval_spill_')
+        else:
+            self.spill_folder = spill_folder
+            os.makedirs(self.spill_folder, exist_ok=True)
+        self.counter = 0
+        self.rss_after_spill = 0.0
+
+    def over_budget(self, since_last_spill=True):
+        """ Whether the resident set size of this process is above the budget. If since_last_spill, the RSS must also
+        have grown by SPILL_HYSTERESIS of the budget since the last spill (see mark_spilled).
+        """
+        rss = get_rss_mb()
+        if rss is None:
+            return False
+        if since_last_spill:
+            return rss > max(self.max_rss_mb, self.rss_after_spill + SPILL_HYSTERESIS * self.max_rss_mb)
+        return rss > self.max_rss_mb
+
+    def mark_spilled(self):
+        """Remembers the RSS after spilling (and releasing memory), as reference for the next over_budget check"""
+        self.rss_after_spill = get_rss_mb() or 0.0
+
+    def cleanup(self):
+        """Removes the spill folder if it is a temporary folder"""
+        if self.is_temporary:
+            shutil.rmtree(self.spill_folder, ignore_errors=True)
+
+    def spill(self, value):
+        """Saves a value to disk and returns the file which it can be loaded from"""
+        self.counter += 1
+        spill_file = os.path.join(self.spill_folder, '%i.pkl' % self.counter)
+        with open(spill_file, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return spill_file
+
+    @staticmethod
+    def load(spill_file):
+        with open(spill_file, 'rb') as f:
+            return pickle.load(f)
+
+    def spill_results(self, res):
+        """Spills the results of a tracker (indexed by sequence) and returns them as a SpilledResults mapping"""
+        if isinstance(res, SpilledResults):
+            return res
+        return SpilledResults({seq: self.spill(seq_res) for seq, seq_res in res.items()})
+
+    @staticmethod
+    def release():
+        """Returns freed memory to the system as far as possible"""
+        gc.collect()
+
+
+class SpilledResults(Mapping):
+    """ Read-only mapping of results which were spilled to disk, such that res[seq] loads the result of one sequence
+    (or 'COMBINED_SEQ') from disk on each access.
+    """
+
+    def __init__(self, spill_files):
+        self.spill_files = spill_files
+
+    def __getitem__(self, key):
+        return ResultSpiller.load(self.spill_files[key])
+
+    def __iter__(self):
+        return iter(self.spill_files)
+
+    def __len__(self):
+        return len(self.spill_files)
@@ -0,0 +1,83 @@
+import os
+import pickle
+import hashlib
+
+CACHE_VERSION = 1
+
+# Dataset config values which do not influence the results of a single sequence.
+IGNORED_DATASET_CONFIG_KEYS = ['PRINT_CONFIG', 'OUTPUT_FOLDER', 'OUTPUT_SUB_FOLDER', 'TRACKERS_TO_EVAL',
+                               'TRACKER_DISPLAY_NAMES']
+
+
+class ResultCache:
+    """ Persistent on-disk cache of per-sequence results (as returned by eval_sequence).
+    Results are stored in one file per (tracker, sequence) and are keyed by a hash of the content of the input files
+    (gt and tracker), the dataset config, the metric configs and the classes evaluated, so that cached results are only
+    reused when none of these have changed.
+    """
+
+    def __init__(self, cache_folder):
+        self.cache_folder = cache_folder
+        self._file_hashes = {}
+
+    def get_key(self, dataset, tracker, seq, class_list, metrics_list):
+        """ Returns the cache key for a tracker on a sequence, or None if the dataset does not support caching (i.e.
+        does not know which files the data is read from).
+        """
+        input_files = dataset.get_seq_input_files(tracker, seq)
+        if input_files is None:
+            return None
+        dataset_config = {k: v for k, v in dataset.config.items() if k not in IGNORED_DATASET_CONFIG_KEYS}
+        metric_configs = [(metric.get_name(), self._config_repr(getattr(metric, 'config', None)))
+                          for metric in metrics_list]
+        key_parts = [str(CACHE_VERSION), dataset.get_name(), self._config_repr(dataset_config), repr(metric_configs),
+                     repr(list(class_list)), seq] + [self._hash_file(file) for file in input_files]
+        return hashlib.sha1('\n'.join(key_parts).encode('utf-8')).hexdigest()
+
+    def load(self, dataset, tracker, seq, key):
+        """Returns the cached result for the given key, or None if there is no cached result"""
+        if key is None:
+            return None
+        cache_file = self._get_cache_file(dataset, tracker, seq)
+        if not os.path.isfile(cache_file):
+            return None
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            return None
+        if cached['key'] != key:
+            return None
+        return cached['res']
+
+    def save(self, dataset, tracker, seq, key, seq_res):
+        """Saves a per-sequence result under the given key, replacing previous results for this tracker and sequence"""
+        if key is None:
+            return
+        cache_file = self._get_cache_file(dataset, tracker, seq)
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = cache_file + '.tmp%i' % os.getpid()
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({'key': key, 'res': seq_res}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+
+    def _get_cache_file(self, dataset, tracker, seq):
+        return os.path.join(self.cache_folder, dataset.get_name(), tracker, seq + '.pkl')
+
+    def _hash_file(self, file):
+        """Hash of the content of a file. Hashes are remembered as long as the file size and modification time agree"""
+        stat = os.stat(file)
+        memo_key = (file, stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._file_hashes.keys():
+            sha = hashlib.sha1()
+            with open(file, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+            self._file_hashes[memo_key] = sha.hexdigest()
+        return self._file_hashes[memo_key]
+
+    @staticmethod
+    def _config_repr(config):
+        if config is None:
+            return 'None'
+        return repr(sorted((k, repr(v)) for k, v in config.items() if k != 'PRINT_CONFIG'))
@@ -1,14 +1,33 @@
+import os
+import json
 from functools import wraps
 from time import perf_counter
+from time import time as wall_time
 import inspect
+from . import _memory
 
 DO_TIMING = False
 DISPLAY_LESS_PROGRESS = False
+PRINT_PROGRESS = True  # Disabled in parallel worker processes, whose timings are only accumulated
+TRACE = False  # Whether to record spans (with start and end times) as events for a Chrome trace
 timer_dict = {}
+stage_dict = {}
+trace_events = []
 counter = 0
 
+# Stages reported (in this order) in the timing summary, further stages (e.g. each metric) are reported afterwards.
+DEFAULT_STAGES = ['load', 'similarity', 'preprocess']
+FINAL_STAGES = ['combine', 'output']
+
 
 def time(f):
+    # Argument metadata is only extracted once per function (instead of on every call).
+    arg_names = inspect.getfullargspec(f)[0]
+    is_method = len(arg_names) > 0 and arg_names[0] == 'self'
+    is_test = len(arg_names) > 0 and arg_names[0] == 'test'
+    arg_titles = ['tracker', 'seq', 'cls']
+    arg_title_idxs = [i for i, a in enumerate(arg_names) if a in arg_titles]
+
     @wraps(f)
     def wrap(*args, **kw):
         if DO_TIMING:
@@ -19,39 +38,26 @@ def time(f):
             tt = te-ts
 
             # Get function name
-            arg_names = inspect.getfullargspec(f)[0]
-            if arg_names[0] == 'self' and DISPLAY_LESS_PROGRESS:
-                return result
-            elif arg_names[0] == 'self':
+            if is_method:
                 method_name = type(args[0]).__name__ + '.' + f.__name__
             else:
                 method_name = f.__name__
 
-            # Record accumulative time in each function for analysis
-            if method_name in timer_dict.keys():
-                timer_dict[method_name] += tt
-            else:
-                timer_dict[method_name] = tt
-
-            # If code is finished, display timing summary
-            if method_name == "Evaluator.evaluate":
-                print("")
-                print("Timing analysis:")
-                for key, value in timer_dict.items():
-                    print('%-70s %2.4f sec' % (key, value))
-            else:
+            if is_method and DISPLAY_LESS_PROGRESS:
+                return result
+
+            # Record accumulative time in each function for analysis (the summary is printed by Evaluator.evaluate)
+            _add_time(timer_dict, method_name, tt)
+
+            if PRINT_PROGRESS:
                 # Get function argument values for printing special arguments of interest
-                arg_titles = ['tracker', 'seq', 'cls']
-                arg_vals = []
-                for i, a in enumerate(arg_names):
-                    if a in arg_titles:
-                        arg_vals.append(args[i])
+                arg_vals = [args[i] for i in arg_title_idxs if i < len(args)]
                 arg_text = '(' + ', '.join(arg_vals) + ')'
 
                 # Display methods and functions with different indentation.
-                if arg_names[0] == 'self':
+                if is_method:
                     print('%-74s %2.4f sec' % (' '*4 + method_name + arg_text, tt))
-                elif arg_names[0] == 'test':
+                elif is_test:
                     pass
                 else:
                     global counter
@@ -60,6 +66,148 @@ def time(f):
 
             return result
         else:
-            # If config["TIME_PROGRESS"] is false, or config["USE_PARALLEL"] is true, run functions normally without timing.
+            # If config["TIME_PROGRESS"] is false, run functions normally without timing.
             return f(*args, **kw)
     return wrap
+
+
+class _Stage:
+    """ Context manager which accumulates the time spent inside it for one evaluation stage (if accumulate), and which
+    records it as a trace event if tracing is enabled.
+    """
+    __slots__ = ['name', 'args', 'accumulate', 'ts', 'wall_ts', 'mem']
+
+    def __init__(self, name, args, accumulate):
+        self.name = name
+        self.args = args
+        self.accumulate = accumulate
+        self.ts = None
+        self.wall_ts = None
+        self.mem = None
+
+    def __enter__(self):
+        if TRACE:
+            self.wall_ts = wall_time()
+        if self.accumulate and _memory.DO_MEMORY:
+            self.mem = _memory.stage_enter()
+        self.ts = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        tt = perf_counter() - self.ts
+        if self.accumulate and DO_TIMING:
+            _add_time(stage_dict, self.name, tt)
+        if self.mem is not None:
+            _memory.stage_exit(self.name, self.mem)
+        if TRACE:
+            pid = os.getpid()
+            trace_events.append({'name': self.name, 'cat': 'stage' if self.accumulate else 'span', 'ph': 'X',
+                                 'ts': self.wall_ts * 1e6, 'dur': tt * 1e6, 'pid': pid, 'tid': pid,
+                                 'args': self.args if self.args is not None else {}})
+        return False
+
+
+class _NoStage:
+    """Context manager which does nothing, used when timing is disabled"""
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name, args=None):
+    """ Returns a context manager timing an evaluation stage (e.g. 'load', 'similarity', 'preprocess', a metric name,
+    'combine' or 'output'). args (e.g. tracker, seq, cls) are only used for the trace event. The memory of the stage is
+    also accounted if memory profiling is enabled. If neither timing, tracing nor memory profiling is enabled this is a
+    shared no-op context manager.
+    """
+    if DO_TIMING or TRACE or _memory.DO_MEMORY:
+        return _Stage(name, args, True)
+    return _NO_STAGE
+
+
+def span(name, args=None):
+    """Returns a context manager which only records a trace event (e.g. a whole sequence), if tracing is enabled"""
+    if TRACE:
+        return _Stage(name, args, False)
+    return _NO_STAGE
+
+
+def _add_time(time_dict, key, tt):
+    if key in time_dict.keys():
+        time_dict[key] += tt
+    else:
+        time_dict[key] = tt
+
+
+def get_timings():
+    """Returns the accumulated timings of this process, e.g. to send them from a worker back to the parent process"""
+    return {'timer_dict': dict(timer_dict), 'stage_dict': dict(stage_dict), 'trace_events': list(trace_events)}
+
+
+def reset_timings():
+    """Clears the accumulated timings of this process"""
+    timer_dict.clear()
+    stage_dict.clear()
+    trace_events.clear()
+
+
+def merge_timings(timings):
+    """Adds timings returned by get_timings (e.g. in a worker process) to the timings of this process"""
+    for key, value in timings['timer_dict'].items():
+        _add_time(timer_dict, key, value)
+    for key, value in timings['stage_dict'].items():
+        _add_time(stage_dict, key, value)
+    trace_events.extend(timings['trace_events'])
+
+
+def write_chrome_trace(out_file):
+    """ Writes all recorded trace events in the Chrome trace-event JSON format, which can be opened in a trace viewer
+    (e.g. chrome://tracing or Perfetto). Each process (main process and workers) is shown as a separate track.
+    """
+    main_pid = os.getpid()
+    pids = sorted({event['pid'] for event in trace_events})
+    metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': pid,
+                 'args': {'name': 'main' if pid == main_pid else 'worker %i' % pid}} for pid in pids]
+    _write_json({'traceEvents': metadata + trace_events, 'displayTimeUnit': 'ms'}, out_file)
+
+
+def write_timings_json(out_file, extra=None):
+    """ Writes the accumulated time per function and per stage, and all recorded spans, as JSON. Any further
+    information (e.g. estimated and measured sequence costs) can be added with extra.
+    """
+    out = {'functions': timer_dict, 'stages': stage_dict,
+           'spans': [{'name': event['name'], 'pid': event['pid'], 'start': event['ts'] / 1e6,
+                      'end': (event['ts'] + event['dur']) / 1e6, **event['args']} for event in trace_events]}
+    if extra is not None:
+        out.update(extra)
+    _write_json(out, out_file)
+
+
+def _write_json(data, out_file):
+    if os.path.dirname(out_file):
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+    with open(out_file, 'w') as f:
+        json.dump(data, f)
+
+
+def print_summary():
+    """Prints the accumulated time of each timed function and of each evaluation stage"""
+    print("")
+    print("Timing analysis:")
+    for key, value in timer_dict.items():
+        print('%-70s %2.4f sec' % (key, value))
+    if len(stage_dict) > 0:
+        print("")
+        print("Timing per stage (summed over all processes):")
+        stages = [s for s in DEFAULT_STAGES if s in stage_dict.keys()]
+        stages += [s for s in stage_dict.keys() if s not in DEFAULT_STAGES + FINAL_STAGES]
+        stages += [s for s in FINAL_STAGES if s in stage_dict.keys()]
+        for key in stages:
+            print('%-70s %2.4f sec' % (key, stage_dict[key]))
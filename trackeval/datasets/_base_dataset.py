@@ -9,6 +9,8 @@ from abc import ABC, abstractmethod
 from .. import _timing
 from ..utils import TrackEvalException
 
+BYTES_PER_DET_ESTIMATE = 50  # Approximate size of one detection in a text file, used for estimating sequence costs
+
 
 class _BaseDataset(ABC):
     @abstractmethod
@@ -16,10 +18,14 @@ class _BaseDataset(ABC):
         self.tracker_list = None
         self.seq_list = None
         self.class_list = None
+        self.seq_lengths = {}
         self.output_fol = None
         self.output_sub_fol = None
         self.should_classes_combine = True
         self.use_super_categories = False
+        self.gt_resident = False
+        self._gt_cache = {}
+        self._gt_preproc_cache = {}
 
     # Functions to implement:
 
@@ -59,6 +65,26 @@ class _BaseDataset(ABC):
         """
         return tracker
 
+    def get_seq_input_files(self, tracker, seq):
+        """ Returns the list of files that the raw data (gt and tracker) for a tracker on a sequence is read from.
+        This is used to detect changed inputs when caching results on disk. By default None is returned, which means
+        that the files are unknown and results are never cached for this dataset.
+        """
+        return None
+
+    def estimate_seq_cost(self, tracker, seq):
+        """ Returns a cheap estimate of the relative cost of evaluating a tracker on a sequence. This is used to
+        schedule the most expensive sequences first when evaluating in parallel. By default the cost is the number of
+        timesteps plus the number of detections, estimated from the size of the input files (if these are known).
+        """
+        cost = 1.0
+        if seq in self.seq_lengths.keys() and self.seq_lengths[seq] is not None:
+            cost += self.seq_lengths[seq]
+        input_files = self.get_seq_input_files(tracker, seq)
+        if input_files is not None:
+            cost += sum(os.path.getsize(file) for file in input_files if os.path.isfile(file)) / BYTES_PER_DET_ESTIMATE
+        return cost
+
     def get_eval_info(self):
         """Return info about the dataset needed for the Evaluator"""
         return self.tracker_list, self.seq_list, self.class_list
@@ -89,18 +115,57 @@ class _BaseDataset(ABC):
         calculation of metrics such as class confusion matrices. Typically the impact of this on performance is low.
         """
         # Load raw data.
-        raw_gt_data = self._load_raw_file(tracker, seq, is_gt=True)
-        raw_tracker_data = self._load_raw_file(tracker, seq, is_gt=False)
-        raw_data = {**raw_tracker_data, **raw_gt_data}  # Merges dictionaries
+        with _timing.stage('load', {'tracker': tracker, 'seq': seq}):
+            raw_gt_data = self.get_raw_gt_data(seq)
+            raw_tracker_data = self._load_raw_file(tracker, seq, is_gt=False)
+            raw_data = {**raw_tracker_data, **raw_gt_data}  # Merges dictionaries
 
         # Calculate similarities for each timestep.
-        similarity_scores = []
-        for t, (gt_dets_t, tracker_dets_t) in enumerate(zip(raw_data['gt_dets'], raw_data['tracker_dets'])):
-            ious = self._calculate_similarities(gt_dets_t, tracker_dets_t)
-            similarity_scores.append(ious)
-        raw_data['similarity_scores'] = similarity_scores
+        with _timing.stage('similarity', {'tracker': tracker, 'seq': seq}):
+            similarity_scores = []
+            for t, (gt_dets_t, tracker_dets_t) in enumerate(zip(raw_data['gt_dets'], raw_data['tracker_dets'])):
+                ious = self._calculate_similarities(gt_dets_t, tracker_dets_t)
+                similarity_scores.append(ious)
+            raw_data['similarity_scores'] = similarity_scores
         return raw_data
 
+    def get_raw_gt_data(self, seq):
+        """ Loads the raw ground-truth data for a single sequence.
+        If self.gt_resident is True the parsed ground-truth is kept in memory and shared between all trackers, so that
+        each gt file is only read once per sequence. A deep copy is returned, so that preprocessing which modifies the
+        raw data (including per-timestep arrays in place) cannot corrupt the cached data.
+        """
+        if not self.gt_resident:
+            return self._load_raw_file(None, seq, is_gt=True)
+        if seq not in self._gt_cache.keys():
+            self._gt_cache[seq] = self._load_raw_file(None, seq, is_gt=True)
+        return deepcopy(self._gt_cache[seq])
+
+    def preload_gt(self, seq_list):
+        """Enables gt-resident mode and loads the ground-truth of all given sequences, e.g. before forking workers"""
+        self.gt_resident = True
+        for seq in seq_list:
+            if seq not in self._gt_cache.keys():
+                self._gt_cache[seq] = self._load_raw_file(None, seq, is_gt=True)
+
+    def clear_gt_cache(self):
+        """Releases all cached ground-truth and ground-truth preprocessing data"""
+        self._gt_cache = {}
+        self._gt_preproc_cache = {}
+
+    def _get_gt_preproc(self, raw_data, cls, preproc_fn):
+        """ Returns the result of a gt-only (tracker independent) preprocessing function preproc_fn(raw_data, cls).
+        In gt-resident mode this is computed once per (seq, cls) and reused for every tracker, so the result must not be
+        modified. This is used by MotChallenge2DBox, PersonPath22 and HeadTrackingChallenge; for all other datasets
+        gt-resident mode only caches the parsed gt (see get_raw_gt_data).
+        """
+        if not self.gt_resident:
+            return preproc_fn(raw_data, cls)
+        key = (raw_data['seq'], cls)
+        if key not in self._gt_preproc_cache.keys():
+            self._gt_preproc_cache[key] = preproc_fn(raw_data, cls)
+        return self._gt_preproc_cache[key]
+
     @staticmethod
     def _load_simple_text_file(file, time_col=0, id_col=None, remove_negative_ids=False, valid_filter=None,
                                crowd_ignore_filter=None, convert_filter=None, is_zipped=False, zip_file=None,
@@ -296,6 +361,45 @@ class _BaseDataset(ABC):
         sim = np.maximum(0, 1 - dist/zero_distance)
         return sim
 
+    @staticmethod
+    def _get_present_classes(classes, classes_to_tracks=None):
+        """ Builds the class-presence index of a gt or tracker file while it is loaded: the set of class ids which
+        occur in any timestep (classes is a list of 1D NDArrays for each timestep) or which have any track (if
+        classes_to_tracks is given).
+        """
+        present_classes = set(np.unique(np.concatenate(classes)).tolist()) if len(classes) > 0 else set()
+        if classes_to_tracks is not None:
+            present_classes.update(cls for cls, tracks in classes_to_tracks.items() if len(tracks) > 0)
+        return present_classes
+
+    @staticmethod
+    def _is_class_present(raw_data, cls_id):
+        """Whether a class occurs in the gt or tracker data of a sequence, according to the class-presence index"""
+        return cls_id in raw_data['gt_present_classes'] or cls_id in raw_data['tracker_present_classes']
+
+    @staticmethod
+    def _get_empty_seq_data(raw_data, empty_dets=None):
+        """ Returns the preprocessed data for a (sequence, class) pair without any gt or tracker detections, without
+        running any per-timestep preprocessing. The metrics then return their results for empty sequences straight away.
+        """
+        if empty_dets is None:
+            empty_dets = np.empty((0, 4))
+        num_timesteps = raw_data['num_timesteps']
+        empty_ids = np.empty(0, dtype=int)
+        data = {'gt_ids': [empty_ids] * num_timesteps,
+                'tracker_ids': [empty_ids] * num_timesteps,
+                'gt_dets': [empty_dets] * num_timesteps,
+                'tracker_dets': [empty_dets] * num_timesteps,
+                'tracker_confidences': [np.empty(0)] * num_timesteps,
+                'similarity_scores': [np.empty((0, 0))] * num_timesteps,
+                'num_tracker_dets': 0,
+                'num_gt_dets': 0,
+                'num_tracker_ids': 0,
+                'num_gt_ids': 0,
+                'num_timesteps': num_timesteps,
+                'seq': raw_data['seq']}
+        return data
+
     @staticmethod
     def _check_unique_ids(data, after_preproc=False):
         """Check the requirement that the tracker_ids and gt_ids are unique per timestep"""
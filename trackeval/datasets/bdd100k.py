@@ -2,11 +2,11 @@
 import os
 import json
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ..utils import TrackEvalException
 from ._base_dataset import _BaseDataset
 from .. import utils
 from .. import _timing
+from .._assignment import max_score_assignment
 
 
 class BDD100K(_BaseDataset):
@@ -241,7 +241,7 @@ class BDD100K(_BaseDataset):
             if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_cols = match_cols[actually_matched_mask]
                 unmatched_indices = np.delete(unmatched_indices, match_cols, axis=0)
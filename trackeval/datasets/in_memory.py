@@ -0,0 +1,182 @@
+import numpy as np
+from ._base_dataset import _BaseDataset
+from .. import utils
+from ..utils import TrackEvalException
+from .. import _timing
+
+
+class InMemory(_BaseDataset):
+    """ Dataset class for tracking data given as numpy arrays in memory (e.g. to validate a model during training),
+    without any folder checks or file I/O.
+
+    gt_data and tracker_data[tracker] are dicts indexed by sequence name. The data of a sequence is a dict of lists
+    (for each timestep) with the fields:
+        'ids': 1D NDArray of integer track ids (for each det).
+        'dets': 2D NDArray of boxes (for each det, in BOX_FORMAT) if IOU_TYPE is 'bbox', or list of pycocotools rle
+            encoded masks if IOU_TYPE is 'mask'.
+        'classes': (optional) 1D NDArray of integer class ids (for each det). If not given, all dets are of the first
+            class in CLASSES.
+        'confidences': (optional, only for trackers) 1D NDArray of confidences (for each det).
+    """
+
+    @staticmethod
+    def get_default_dataset_config():
+        """Default class config values"""
+        default_config = {
+            'CLASSES': {'object': 1},  # Classes to eval, as a dict from class name to class id
+            'IOU_TYPE': 'bbox',  # Valid: 'bbox', 'mask'
+            'BOX_FORMAT': 'xywh',  # Valid: 'xywh', 'x0y0x1y1'
+            'OUTPUT_FOLDER': None,  # Where to save eval results (only needed for outputting results with Evaluator)
+            'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
+            'PRINT_CONFIG': False,  # Whether to print current config
+        }
+        return default_config
+
+    def __init__(self, gt_data, tracker_data, config=None):
+        """Initialise dataset from gt_data (indexed by sequence) and tracker_data (indexed by tracker and sequence)"""
+        super().__init__()
+        # Fill non-given config values with defaults
+        self.config = utils.init_config(config, self.get_default_dataset_config(), self.get_name())
+        if self.config['IOU_TYPE'] not in ['bbox', 'mask']:
+            raise TrackEvalException('IOU_TYPE %s is not implemented' % self.config['IOU_TYPE'])
+        self.gt_data = gt_data
+        self.tracker_data = tracker_data
+        self.output_fol = self.config['OUTPUT_FOLDER']
+        self.output_sub_fol = self.config['OUTPUT_SUB_FOLDER']
+
+        self.seq_list = list(gt_data.keys())
+        self.seq_lengths = {seq: len(seq_data['ids']) for seq, seq_data in gt_data.items()}
+        self.class_name_to_class_id = dict(self.config['CLASSES'])
+        self.class_list = list(self.class_name_to_class_id.keys())
+        self.should_classes_combine = len(self.class_list) > 1
+        self.tracker_list = list(tracker_data.keys())
+        for tracker in self.tracker_list:
+            for seq in self.seq_list:
+                if seq not in tracker_data[tracker].keys():
+                    raise TrackEvalException('Tracker %s has no data for sequence %s' % (tracker, seq))
+                if len(tracker_data[tracker][seq]['ids']) != self.seq_lengths[seq]:
+                    raise TrackEvalException('Tracker %s has a different number of timesteps than the ground-truth '
+                                             'for sequence %s' % (tracker, seq))
+
+    def _load_raw_file(self, tracker, seq, is_gt):
+        """ Converts the in-memory data of a sequence (gt or tracker) to raw data.
+
+        If is_gt, this returns a dict which contains the fields:
+        [gt_ids, gt_classes] : list (for each timestep) of 1D NDArrays (for each det).
+        [gt_dets]: list (for each timestep) of lists of detections.
+
+        if not is_gt, this returns a dict which contains the fields:
+        [tracker_ids, tracker_classes, tracker_confidences] : list (for each timestep) of 1D NDArrays (for each det).
+        [tracker_dets]: list (for each timestep) of lists of detections.
+        """
+        seq_data = self.gt_data[seq] if is_gt else self.tracker_data[tracker][seq]
+        num_timesteps = self.seq_lengths[seq]
+        default_cls_id = next(iter(self.class_name_to_class_id.values()))
+
+        ids = [np.asarray(ids_t, dtype=int).reshape(-1) for ids_t in seq_data['ids']]
+        if self.config['IOU_TYPE'] == 'bbox':
+            dets = [np.asarray(dets_t, dtype=float).reshape(-1, 4) for dets_t in seq_data['dets']]
+        else:
+            dets = [list(dets_t) for dets_t in seq_data['dets']]
+        if 'classes' in seq_data.keys():
+            classes = [np.asarray(classes_t, dtype=int).reshape(-1) for classes_t in seq_data['classes']]
+        else:
+            classes = [np.full(len(ids_t), default_cls_id, dtype=int) for ids_t in ids]
+        if any(len(ids_t) != len(dets_t) or len(ids_t) != len(classes_t)
+               for ids_t, dets_t, classes_t in zip(ids, dets, classes)):
+            raise TrackEvalException('The number of ids, dets and classes differs in a timestep of sequence %s' % seq)
+
+        prefix = 'gt_' if is_gt else 'tracker_'
+        raw_data = {prefix + 'ids': ids, prefix + 'dets': dets, prefix + 'classes': classes}
+        if not is_gt:
+            if 'confidences' in seq_data.keys():
+                raw_data['tracker_confidences'] = [np.asarray(conf_t, dtype=float).reshape(-1)
+                                                   for conf_t in seq_data['confidences']]
+            else:
+                raw_data['tracker_confidences'] = [np.ones(len(ids_t)) for ids_t in ids]
+        raw_data['num_timesteps'] = num_timesteps
+        raw_data['seq'] = seq
+        return raw_data
+
+    @_timing.time
+    def get_preprocessed_seq_data(self, raw_data, cls):
+        """ Preprocess data for a single sequence for a single class ready for evaluation.
+        Inputs:
+             - raw_data is a dict containing the data for the sequence already read in by get_raw_seq_data().
+             - cls is the class to be evaluated.
+        Outputs:
+             - data is a dict containing all of the information that metrics need to perform evaluation.
+                It contains the following fields:
+                    [num_timesteps, num_gt_ids, num_tracker_ids, num_gt_dets, num_tracker_dets] : integers.
+                    [gt_ids, tracker_ids, tracker_confidences]: list (for each timestep) of 1D NDArrays (for each det).
+                    [gt_dets, tracker_dets]: list (for each timestep) of lists of detections.
+                    [similarity_scores]: list (for each timestep) of 2D NDArrays.
+        Notes:
+            In-memory data is already expected to be clean, so only the detections of the class to be evaluated are
+            extracted (no detections are removed). Afterwards gt and tracker ids are relabelled to be contiguous and
+            checked to be unique within each timestep.
+        """
+        cls_id = self.class_name_to_class_id[cls]
+        is_mask = self.config['IOU_TYPE'] == 'mask'
+
+        data_keys = ['gt_ids', 'tracker_ids', 'gt_dets', 'tracker_dets', 'tracker_confidences', 'similarity_scores']
+        data = {key: [None] * raw_data['num_timesteps'] for key in data_keys}
+        unique_gt_ids = []
+        unique_tracker_ids = []
+        num_gt_dets = 0
+        num_tracker_dets = 0
+        for t in range(raw_data['num_timesteps']):
+            gt_class_mask = raw_data['gt_classes'][t] == cls_id
+            tracker_class_mask = raw_data['tracker_classes'][t] == cls_id
+            data['gt_ids'][t] = raw_data['gt_ids'][t][gt_class_mask]
+            data['tracker_ids'][t] = raw_data['tracker_ids'][t][tracker_class_mask]
+            data['tracker_confidences'][t] = raw_data['tracker_confidences'][t][tracker_class_mask]
+            data['similarity_scores'][t] = raw_data['similarity_scores'][t][gt_class_mask, :][:, tracker_class_mask]
+            if is_mask:
+                data['gt_dets'][t] = [d for d, m in zip(raw_data['gt_dets'][t], gt_class_mask) if m]
+                data['tracker_dets'][t] = [d for d, m in zip(raw_data['tracker_dets'][t], tracker_class_mask) if m]
+            else:
+                data['gt_dets'][t] = raw_data['gt_dets'][t][gt_class_mask]
+                data['tracker_dets'][t] = raw_data['tracker_dets'][t][tracker_class_mask]
+
+            unique_gt_ids.append(data['gt_ids'][t])
+            unique_tracker_ids.append(data['tracker_ids'][t])
+            num_gt_dets += len(data['gt_ids'][t])
+            num_tracker_dets += len(data['tracker_ids'][t])
+
+        # Re-label IDs such that there are no empty IDs
+        unique_gt_ids = np.unique(np.concatenate(unique_gt_ids)) if num_gt_dets > 0 else []
+        unique_tracker_ids = np.unique(np.concatenate(unique_tracker_ids)) if num_tracker_dets > 0 else []
+        if len(unique_gt_ids) > 0:
+            gt_id_map = np.nan * np.ones((np.max(unique_gt_ids) + 1))
+            gt_id_map[unique_gt_ids] = np.arange(len(unique_gt_ids))
+            for t in range(raw_data['num_timesteps']):
+                if len(data['gt_ids'][t]) > 0:
+                    data['gt_ids'][t] = gt_id_map[data['gt_ids'][t]].astype(int)
+        if len(unique_tracker_ids) > 0:
+            tracker_id_map = np.nan * np.ones((np.max(unique_tracker_ids) + 1))
+            tracker_id_map[unique_tracker_ids] = np.arange(len(unique_tracker_ids))
+            for t in range(raw_data['num_timesteps']):
+                if len(data['tracker_ids'][t]) > 0:
+                    data['tracker_ids'][t] = tracker_id_map[data['tracker_ids'][t]].astype(int)
+
+        # Record overview statistics.
+        data['num_tracker_dets'] = num_tracker_dets
+        data['num_gt_dets'] = num_gt_dets
+        data['num_tracker_ids'] = len(unique_tracker_ids)
+        data['num_gt_ids'] = len(unique_gt_ids)
+        data['num_timesteps'] = raw_data['num_timesteps']
+        data['seq'] = raw_data['seq']
+
+        # Ensure again that ids are unique per timestep after preproc.
+        self._check_unique_ids(data, after_preproc=True)
+
+        return data
+
+    def _calculate_similarities(self, gt_dets_t, tracker_dets_t):
+        if self.config['IOU_TYPE'] == 'mask':
+            similarity_scores = self._calculate_mask_ious(gt_dets_t, tracker_dets_t, is_encoded=True, do_ioa=False)
+        else:
+            similarity_scores = self._calculate_box_ious(gt_dets_t, tracker_dets_t,
+                                                         box_format=self.config['BOX_FORMAT'])
+        return similarity_scores
@@ -2,11 +2,11 @@
 import os
 import csv
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from ..utils import TrackEvalException
 from .. import _timing
+from .._assignment import max_score_assignment
 
 
 class Kitti2DBox(_BaseDataset):
@@ -309,7 +309,7 @@ class Kitti2DBox(_BaseDataset):
             if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_rows = match_rows[actually_matched_mask]
                 match_cols = match_cols[actually_matched_mask]
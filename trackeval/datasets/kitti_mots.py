@@ -1,11 +1,11 @@
 import os
 import csv
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from .. import _timing
 from ..utils import TrackEvalException
+from .._assignment import max_score_assignment
 
 
 class KittiMOTS(_BaseDataset):
@@ -244,6 +244,9 @@ class KittiMOTS(_BaseDataset):
                 masks_merged = all_masks[0]
                 for mask in all_masks[1:]:
                     if mask_utils.area(mask_utils.merge([masks_merged, mask], intersect=True)) != 0.0:
+                        if is_gt:
+                            raise TrackEvalException(
+                                'GT has overlapping masks. Seq: ' + seq + ' Timestep: ' + str(t))
                         raise TrackEvalException(
                             'Tracker has overlapping masks. Tracker: ' + tracker + ' Seq: ' + seq + ' Timestep: ' + str(
                                 t))
@@ -326,8 +329,8 @@ class KittiMOTS(_BaseDataset):
             unmatched_indices = np.arange(tracker_ids.shape[0])
             if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                 matching_scores = similarity_scores.copy()
-                matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = -10000
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_cols = match_cols[actually_matched_mask]
 
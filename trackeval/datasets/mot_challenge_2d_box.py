@@ -2,10 +2,10 @@ import os
 import csv
 import configparser
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from .. import _timing
+from .._assignment import max_score_assignment
 from ..utils import TrackEvalException
 
 
@@ -128,9 +128,21 @@ class MotChallenge2DBox(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_input_files(self, tracker, seq):
+        if self.data_is_zipped:
+            input_files = [os.path.join(self.gt_fol, 'data.zip'),
+                           os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol + '.zip')]
+        else:
+            input_files = [self.config["GT_LOC_FORMAT"].format(gt_folder=self.gt_fol, seq=seq),
+                           os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, seq + '.txt')]
+        # The sequence list and lengths are read from the seqmap and seqinfo files
+        info_files = [self.seqmap_file, os.path.join(self.gt_fol, seq, 'seqinfo.ini')]
+        return input_files + [file for file in info_files if file is not None and os.path.isfile(file)]
+
     def _get_seq_info(self):
         seq_list = []
         seq_lengths = {}
+        self.seqmap_file = None
         if self.config["SEQ_INFO"]:
             seq_list = list(self.config["SEQ_INFO"].keys())
             seq_lengths = self.config["SEQ_INFO"]
@@ -156,6 +168,7 @@ class MotChallenge2DBox(_BaseDataset):
             if not os.path.isfile(seqmap_file):
                 print('no seqmap found: ' + seqmap_file)
                 raise TrackEvalException('no seqmap found: ' + os.path.basename(seqmap_file))
+            self.seqmap_file = seqmap_file
             with open(seqmap_file) as fp:
                 reader = csv.reader(fp)
                 for i, row in enumerate(reader):
@@ -326,7 +339,7 @@ class MotChallenge2DBox(_BaseDataset):
         if self.benchmark == 'MOT20':
             distractor_class_names.append('non_mot_vehicle')
         distractor_classes = [self.class_name_to_class_id[x] for x in distractor_class_names]
-        cls_id = self.class_name_to_class_id[cls]
+        gt_preproc = self._get_gt_preproc(raw_data, cls, self._preprocess_gt)
 
         data_keys = ['gt_ids', 'tracker_ids', 'gt_dets', 'tracker_dets', 'tracker_confidences', 'similarity_scores']
         data = {key: [None] * raw_data['num_timesteps'] for key in data_keys}
@@ -340,7 +353,6 @@ class MotChallenge2DBox(_BaseDataset):
             gt_ids = raw_data['gt_ids'][t]
             gt_dets = raw_data['gt_dets'][t]
             gt_classes = raw_data['gt_classes'][t]
-            gt_zero_marked = raw_data['gt_extras'][t]['zero_marked']
 
             tracker_ids = raw_data['tracker_ids'][t]
             tracker_dets = raw_data['tracker_dets'][t]
@@ -360,7 +372,7 @@ class MotChallenge2DBox(_BaseDataset):
             if self.do_preproc and self.benchmark != 'MOT15' and gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
 
                 # Check all classes are valid:
-                invalid_classes = np.setdiff1d(np.unique(gt_classes), self.valid_class_numbers)
+                invalid_classes = gt_preproc['invalid_classes'][t]
                 if len(invalid_classes) > 0:
                     print(' '.join([str(x) for x in invalid_classes]))
                     raise(TrackEvalException('Attempting to evaluate using invalid gt classes. '
@@ -372,7 +384,7 @@ class MotChallenge2DBox(_BaseDataset):
 
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_rows = match_rows[actually_matched_mask]
                 match_cols = match_cols[actually_matched_mask]
@@ -388,12 +400,7 @@ class MotChallenge2DBox(_BaseDataset):
 
             # Remove gt detections marked as to remove (zero marked), and also remove gt detections not in pedestrian
             # class (not applicable for MOT15)
-            if self.do_preproc and self.benchmark != 'MOT15':
-                gt_to_keep_mask = (np.not_equal(gt_zero_marked, 0)) & \
-                                  (np.equal(gt_classes, cls_id))
-            else:
-                # There are no classes for MOT15
-                gt_to_keep_mask = np.not_equal(gt_zero_marked, 0)
+            gt_to_keep_mask = gt_preproc['gt_to_keep_mask'][t]
             data['gt_ids'][t] = gt_ids[gt_to_keep_mask]
             data['gt_dets'][t] = gt_dets[gt_to_keep_mask, :]
             data['similarity_scores'][t] = similarity_scores[gt_to_keep_mask]
@@ -432,6 +439,26 @@ class MotChallenge2DBox(_BaseDataset):
 
         return data
 
+    def _preprocess_gt(self, raw_data, cls):
+        """ Tracker independent part of the preprocessing for a single sequence and class.
+        Returns a dict containing, for each timestep, the mask of gt dets kept for evaluation (gt_to_keep_mask) and the
+        gt classes which are not valid (invalid_classes).
+        """
+        cls_id = self.class_name_to_class_id[cls]
+        gt_preproc = {'gt_to_keep_mask': [None] * raw_data['num_timesteps'],
+                      'invalid_classes': [None] * raw_data['num_timesteps']}
+        for t in range(raw_data['num_timesteps']):
+            gt_classes = raw_data['gt_classes'][t]
+            gt_zero_marked = raw_data['gt_extras'][t]['zero_marked']
+            gt_preproc['invalid_classes'][t] = np.setdiff1d(np.unique(gt_classes), self.valid_class_numbers)
+            if self.do_preproc and self.benchmark != 'MOT15':
+                gt_preproc['gt_to_keep_mask'][t] = (np.not_equal(gt_zero_marked, 0)) & \
+                                                   (np.equal(gt_classes, cls_id))
+            else:
+                # There are no classes for MOT15
+                gt_preproc['gt_to_keep_mask'][t] = np.not_equal(gt_zero_marked, 0)
+        return gt_preproc
+
     def _calculate_similarities(self, gt_dets_t, tracker_dets_t):
         similarity_scores = self._calculate_box_ious(gt_dets_t, tracker_dets_t, box_format='xywh')
         return similarity_scores
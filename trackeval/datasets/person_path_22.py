@@ -2,10 +2,10 @@ import os
 import csv
 import configparser
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from .. import _timing
+from .._assignment import max_score_assignment
 from ..utils import TrackEvalException
 
 class PersonPath22(_BaseDataset):
@@ -335,7 +335,7 @@ class PersonPath22(_BaseDataset):
         if self.benchmark == 'MOT20':
             distractor_class_names.append('non_mot_vehicle')
         distractor_classes = [self.class_name_to_class_id[x] for x in distractor_class_names]
-        cls_id = self.class_name_to_class_id[cls]
+        gt_preproc = self._get_gt_preproc(raw_data, cls, self._preprocess_gt)
 
         data_keys = ['gt_ids', 'tracker_ids', 'gt_dets', 'tracker_dets', 'tracker_confidences', 'similarity_scores']
         data = {key: [None] * raw_data['num_timesteps'] for key in data_keys}
@@ -349,7 +349,6 @@ class PersonPath22(_BaseDataset):
             gt_ids = raw_data['gt_ids'][t]
             gt_dets = raw_data['gt_dets'][t]
             gt_classes = raw_data['gt_classes'][t]
-            gt_zero_marked = raw_data['gt_extras'][t]['zero_marked']
 
             tracker_ids = raw_data['tracker_ids'][t]
             tracker_dets = raw_data['tracker_dets'][t]
@@ -370,7 +369,7 @@ class PersonPath22(_BaseDataset):
             if self.do_preproc and self.benchmark != 'MOT15' and (gt_ids.shape[0] > 0 or len(crowd_ignore_regions) > 0) and tracker_ids.shape[0] > 0:
 
                 # Check all classes are valid:
-                invalid_classes = np.setdiff1d(np.unique(gt_classes), self.valid_class_numbers)
+                invalid_classes = gt_preproc['invalid_classes'][t]
                 if len(invalid_classes) > 0:
                     print(' '.join([str(x) for x in invalid_classes]))
                     raise(TrackEvalException('Attempting to evaluate using invalid gt classes. '
@@ -382,7 +381,7 @@ class PersonPath22(_BaseDataset):
 
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_rows = match_rows[actually_matched_mask]
                 match_cols = match_cols[actually_matched_mask]
@@ -403,12 +402,7 @@ class PersonPath22(_BaseDataset):
 
             # Remove gt detections marked as to remove (zero marked), and also remove gt detections not in pedestrian
             # class (not applicable for MOT15)
-            if self.do_preproc and self.benchmark != 'MOT15':
-                gt_to_keep_mask = (np.not_equal(gt_zero_marked, 0)) & \
-                                  (np.equal(gt_classes, cls_id))
-            else:
-                # There are no classes for MOT15
-                gt_to_keep_mask = np.not_equal(gt_zero_marked, 0)
+            gt_to_keep_mask = gt_preproc['gt_to_keep_mask'][t]
             data['gt_ids'][t] = gt_ids[gt_to_keep_mask]
             data['gt_dets'][t] = gt_dets[gt_to_keep_mask, :]
             data['similarity_scores'][t] = similarity_scores[gt_to_keep_mask]
@@ -447,6 +441,26 @@ class PersonPath22(_BaseDataset):
 
         return data
 
+    def _preprocess_gt(self, raw_data, cls):
+        """ Tracker independent part of the preprocessing for a single sequence and class.
+        Returns a dict containing, for each timestep, the mask of gt dets kept for evaluation (gt_to_keep_mask) and the
+        gt classes which are not valid (invalid_classes).
+        """
+        cls_id = self.class_name_to_class_id[cls]
+        gt_preproc = {'gt_to_keep_mask': [None] * raw_data['num_timesteps'],
+                      'invalid_classes': [None] * raw_data['num_timesteps']}
+        for t in range(raw_data['num_timesteps']):
+            gt_classes = raw_data['gt_classes'][t]
+            gt_zero_marked = raw_data['gt_extras'][t]['zero_marked']
+            gt_preproc['invalid_classes'][t] = np.setdiff1d(np.unique(gt_classes), self.valid_class_numbers)
+            if self.do_preproc and self.benchmark != 'MOT15':
+                gt_preproc['gt_to_keep_mask'][t] = (np.not_equal(gt_zero_marked, 0)) & \
+                                                   (np.equal(gt_classes, cls_id))
+            else:
+                # There are no classes for MOT15
+                gt_preproc['gt_to_keep_mask'][t] = np.not_equal(gt_zero_marked, 0)
+        return gt_preproc
+
     def _calculate_similarities(self, gt_dets_t, tracker_dets_t):
         similarity_scores = self._calculate_box_ious(gt_dets_t, tracker_dets_t, box_format='xywh')
         return similarity_scores
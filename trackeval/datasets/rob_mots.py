@@ -2,12 +2,12 @@
 import os
 import csv
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from ..utils import TrackEvalException
 from .. import _timing
 from ..datasets.rob_mots_classmap import cls_id_to_name
+from .._assignment import max_score_assignment
 
 
 class RobMOTS(_BaseDataset):
@@ -244,14 +244,19 @@ class RobMOTS(_BaseDataset):
                         raise TrackEvalException(err)
                     masks_merged = mask_utils.merge([masks_merged, mask], intersect=False)
 
+        # class-presence index, used to skip classes which occur neither in the gt nor in the tracker data
+        raw_data['present_classes'] = self._get_present_classes(raw_data['classes'])
+
         if is_gt:
             key_map = {'ids': 'gt_ids',
                        'classes': 'gt_classes',
-                       'dets': 'gt_dets'}
+                       'dets': 'gt_dets',
+                       'present_classes': 'gt_present_classes'}
         else:
             key_map = {'ids': 'tracker_ids',
                        'classes': 'tracker_classes',
-                       'dets': 'tracker_dets'}
+                       'dets': 'tracker_dets',
+                       'present_classes': 'tracker_present_classes'}
 
         for k, v in key_map.items():
             raw_data[v] = raw_data.pop(k)
@@ -325,13 +330,23 @@ class RobMOTS(_BaseDataset):
         # import to reduce minimum requirements
         from pycocotools import mask as mask_utils
 
-        # Check that input data has unique ids
-        self._check_unique_ids(raw_data)
+        # Check that input data has unique ids (only once per sequence, as this does not depend on the class)
+        if not raw_data.get('unique_ids_checked', False):
+            self._check_unique_ids(raw_data)
+            raw_data['unique_ids_checked'] = True
 
         cls_id = self.class_name_to_class_id[cls]
         ignore_class_id = cls_id+100
         seq = raw_data['seq']
 
+        # Skip all per-timestep preprocessing if the class occurs neither in the gt nor in the tracker data ('all' and
+        # waymo 'car' combine several classes and are always preprocessed)
+        is_combined_class = cls == 'all' or (self.sub_benchmark == 'waymo' and cls == 'car')
+        if not is_combined_class and not self._is_class_present(raw_data, cls_id):
+            data = self._get_empty_seq_data(raw_data, empty_dets=[])
+            data['frame_size'] = raw_data['frame_size']
+            return data
+
         data_keys = ['gt_ids', 'tracker_ids', 'gt_dets', 'tracker_dets', 'tracker_confidences', 'similarity_scores']
         data = {key: [None] * raw_data['num_timesteps'] for key in data_keys}
         unique_gt_ids = []
@@ -392,7 +407,7 @@ class RobMOTS(_BaseDataset):
                 if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                     matching_scores = similarity_scores.copy()
                     matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                    match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                    match_rows, match_cols = max_score_assignment(matching_scores)
                     actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                     # match_rows = match_rows[actually_matched_mask]
                     match_cols = match_cols[actually_matched_mask]
@@ -3,11 +3,11 @@ import numpy as np
 import json
 import itertools
 from collections import defaultdict
-from scipy.optimize import linear_sum_assignment
 from ..utils import TrackEvalException
 from ._base_dataset import _BaseDataset
 from .. import utils
 from .. import _timing
+from .._assignment import max_score_assignment
 
 
 class TAO(_BaseDataset):
@@ -139,6 +139,18 @@ class TAO(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_input_files(self, tracker, seq):
+        tracker_fol = os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol)
+        gt_files = [os.path.join(self.gt_fol, file) for file in os.listdir(self.gt_fol) if file.endswith('.json')]
+        tracker_files = [os.path.join(tracker_fol, file) for file in os.listdir(tracker_fol) if file.endswith('.json')]
+        return gt_files + tracker_files
+
+    def estimate_seq_cost(self, tracker, seq):
+        seq_id = self.seq_name_to_seq_id[seq]
+        num_dets = sum(len(img['annotations']) for img in self.videos_to_gt_images[seq_id])
+        num_dets += sum(len(img['annotations']) for img in self.tracker_data[tracker]['vids_to_images'][seq_id])
+        return 1.0 + self.seq_lengths[seq_id] + num_dets
+
     def _load_raw_file(self, tracker, seq, is_gt):
         """Load a file (gt or tracker) in the TAO format
 
@@ -234,16 +246,22 @@ class TAO(_BaseDataset):
                                                                      for track in tracks])
                                                       for cls, tracks in classes_to_tracks.items()}
 
+        # class-presence index, used to skip classes which occur neither in the gt nor in the tracker data
+        raw_data['present_classes'] = self._get_present_classes(
+            raw_data['gt_classes'] if is_gt else raw_data['tracker_classes'], classes_to_tracks)
+
         if is_gt:
             key_map = {'classes_to_tracks': 'classes_to_gt_tracks',
                        'classes_to_track_ids': 'classes_to_gt_track_ids',
                        'classes_to_track_lengths': 'classes_to_gt_track_lengths',
-                       'classes_to_track_areas': 'classes_to_gt_track_areas'}
+                       'classes_to_track_areas': 'classes_to_gt_track_areas',
+                       'present_classes': 'gt_present_classes'}
         else:
             key_map = {'classes_to_tracks': 'classes_to_dt_tracks',
                        'classes_to_track_ids': 'classes_to_dt_track_ids',
                        'classes_to_track_lengths': 'classes_to_dt_track_lengths',
-                       'classes_to_track_areas': 'classes_to_dt_track_areas'}
+                       'classes_to_track_areas': 'classes_to_dt_track_areas',
+                       'present_classes': 'tracker_present_classes'}
         for k, v in key_map.items():
             raw_data[v] = raw_data.pop(k)
 
@@ -292,6 +310,16 @@ class TAO(_BaseDataset):
         is_not_exhaustively_labeled = cls_id in raw_data['not_exhaustively_labeled_cls']
         is_neg_category = cls_id in raw_data['neg_cat_ids']
 
+        # Skip all per-timestep preprocessing if the class occurs neither in the gt nor in the tracker data
+        if not self._is_class_present(raw_data, cls_id):
+            data = self._get_empty_seq_data(raw_data)
+            for key in ['gt_tracks', 'gt_track_ids', 'gt_track_lengths', 'gt_track_areas', 'dt_tracks', 'dt_track_ids',
+                        'dt_track_lengths', 'dt_track_areas', 'dt_track_scores']:
+                data[key] = raw_data['classes_to_' + key][cls_id]
+            data['not_exhaustively_labeled'] = is_not_exhaustively_labeled
+            data['iou_type'] = 'bbox'
+            return data
+
         data_keys = ['gt_ids', 'tracker_ids', 'gt_dets', 'tracker_dets', 'tracker_confidences', 'similarity_scores']
         data = {key: [None] * raw_data['num_timesteps'] for key in data_keys}
         unique_gt_ids = []
@@ -318,7 +346,7 @@ class TAO(_BaseDataset):
             if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_cols = match_cols[actually_matched_mask]
                 unmatched_indices = np.delete(unmatched_indices, match_cols, axis=0)
@@ -1,12 +1,18 @@
+import sys
 import time
 import traceback
 from multiprocessing.pool import Pool
-from functools import partial
 import os
+import pickle
 from . import utils
 from .utils import TrackEvalException
 from . import _timing
-from .metrics import Count
+from . import _memory
+from . import _assignment
+from ._memory import ResultSpiller, SpilledResults
+from ._result_cache import ResultCache
+from .metrics import Count, HOTA, CLEAR, Identity
+from .datasets.in_memory import InMemory
 
 try:
     import tqdm
@@ -14,6 +20,9 @@ try:
 except ImportError as _:
     TQDM_IMPORTED = False
 
+# Datasets and metrics of the current evaluation in each parallel worker process, set by init_eval_worker.
+_worker_eval_args = None
+
 
 class Evaluator:
     """Evaluator class for evaluating different metrics for different datasets"""
@@ -34,6 +43,15 @@ class Evaluator:
             'PRINT_CONFIG': True,
             'TIME_PROGRESS': True,
             'DISPLAY_LESS_PROGRESS': True,
+            'GT_RESIDENT': False,  # If True, gt of each sequence is loaded once and shared between all trackers
+            'RESULT_CACHE_FOLDER': None,  # If not None, per-sequence results are cached on disk in this folder
+            'TIMING_TRACE_FILE': None,  # If not None, a Chrome trace (json) of the evaluation is saved to this file
+            'TIMING_JSON_FILE': None,  # If not None, timings per function, stage, span and sequence are saved as json
+            'MEMORY_PROFILE': False,  # If True, memory allocated in each stage is accounted (with tracemalloc)
+            'MAX_RSS_MB': None,  # If not None, results are spilled to disk whenever the RSS exceeds this budget (in MB)
+            # (RSS of the main process only, which holds the results; parallel workers hold one task chunk at a time)
+            'SPILL_FOLDER': None,  # Folder for results spilled under MAX_RSS_MB (if None, a temporary folder is used)
+            'ASSIGNMENT_SOLVER': 'hungarian',  # Solver for matching dets. Valid: 'hungarian', 'components', 'sparse'
 
             'OUTPUT_SUMMARY': True,
             'OUTPUT_EMPTY_CLASSES': True,  # If False, summary files are not output for classes with no detections
@@ -45,181 +63,525 @@ class Evaluator:
     def __init__(self, config=None):
         """Initialise the evaluator with a config file"""
         self.config = utils.init_config(config, self.get_default_eval_config(), 'Eval')
-        # Only run timing analysis if not run in parallel.
-        if self.config['TIME_PROGRESS'] and not self.config['USE_PARALLEL']:
+        # Estimated and measured (in seconds) cost of each evaluated (dataset, tracker, sequence) of the last evaluation
+        self.seq_costs = {}
+        # In parallel, timings are accumulated in each worker and merged back into the main process.
+        if self.config['TIME_PROGRESS']:
             _timing.DO_TIMING = True
             if self.config['DISPLAY_LESS_PROGRESS']:
                 _timing.DISPLAY_LESS_PROGRESS = True
+        if self.config['TIMING_TRACE_FILE'] is not None or self.config['TIMING_JSON_FILE'] is not None:
+            _timing.TRACE = True
 
     @_timing.time
     def evaluate(self, dataset_list, metrics_list, show_progressbar=False):
         """Evaluate a set of metrics on a set of datasets"""
+        _timing.trace_events.clear()
+        if self.config['ASSIGNMENT_SOLVER'] not in _assignment.SOLVERS:
+            raise TrackEvalException('Assignment solver %s is not implemented. Valid: %s'
+                                     % (self.config['ASSIGNMENT_SOLVER'], ', '.join(_assignment.SOLVERS)))
+        _assignment.SOLVER = self.config['ASSIGNMENT_SOLVER']
+        if self.config['MEMORY_PROFILE']:
+            _memory.reset_memory()
+            _memory.start()
+        # With a memory budget, results are spilled to disk (and returned as mappings which load them on access)
+        if self.config['MAX_RSS_MB'] is not None:
+            spiller = ResultSpiller(self.config['MAX_RSS_MB'], self.config['SPILL_FOLDER'])
+        else:
+            spiller = None
+        try:
+            output_res, output_msg = self._evaluate(dataset_list, metrics_list, spiller, show_progressbar)
+            # Results spilled to a temporary folder are loaded back, as the folder is removed
+            if spiller is not None and spiller.is_temporary:
+                for dataset_res in output_res.values():
+                    for tracker, res in dataset_res.items():
+                        if res is not None:
+                            dataset_res[tracker] = dict(res.items())
+            return output_res, output_msg
+        finally:
+            if spiller is not None:
+                spiller.cleanup()
+            self._write_timings()
+            # The timing summary (including the time per stage) is printed regardless of DISPLAY_LESS_PROGRESS, which
+            # only hides the timing of each method call.
+            if self.config['TIME_PROGRESS']:
+                _timing.print_summary()
+            if self.config['MEMORY_PROFILE']:
+                _memory.print_summary()
+                _memory.stop()
+
+    def _write_timings(self):
+        """Saves the recorded timings as a Chrome trace and/or as json, if configured"""
+        if self.config['TIMING_TRACE_FILE'] is not None:
+            _timing.write_chrome_trace(self.config['TIMING_TRACE_FILE'])
+        if self.config['TIMING_JSON_FILE'] is not None:
+            seq_costs = [{'dataset': dataset_name, 'tracker': tracker, 'seq': seq, **costs}
+                         for (dataset_name, tracker, seq), costs in self.seq_costs.items()]
+            _timing.write_timings_json(self.config['TIMING_JSON_FILE'], extra={'sequences': seq_costs})
+
+    def _evaluate(self, dataset_list, metrics_list, spiller, show_progressbar=False):
         config = self.config
         metrics_list = metrics_list + [Count()]  # Count metrics are always run
         metric_names = utils.validate_metrics_list(metrics_list)
         dataset_names = [dataset.get_name() for dataset in dataset_list]
         output_res = {}
         output_msg = {}
+        self.seq_costs = {}
+        if config['RESULT_CACHE_FOLDER'] is not None:
+            result_cache = ResultCache(config['RESULT_CACHE_FOLDER'])
+        else:
+            result_cache = None
 
+        eval_infos = []
         for dataset, dataset_name in zip(dataset_list, dataset_names):
             # Get dataset info about what to evaluate
             output_res[dataset_name] = {}
             output_msg[dataset_name] = {}
             tracker_list, seq_list, class_list = dataset.get_eval_info()
+            eval_infos.append((tracker_list, seq_list, class_list))
             print('\nEvaluating %i tracker(s) on %i sequence(s) for %i class(es) on %s dataset using the following '
                   'metrics: %s\n' % (len(tracker_list), len(seq_list), len(class_list), dataset_name,
                                      ', '.join(metric_names)))
 
+            # In gt-resident mode the gt is loaded once so that it is shared by all trackers (and worker processes)
+            if config['GT_RESIDENT']:
+                dataset.gt_resident = True
+
+        if config['USE_PARALLEL']:
+            # All (tracker, sequence) pairs over all datasets are evaluated in one flat work queue on a single pool.
+            # Each tracker is combined and output as soon as its last sequence has finished.
+            pending = {}
+            tasks = []
+            for dataset_idx, (dataset, dataset_name) in enumerate(zip(dataset_list, dataset_names)):
+                tracker_list, seq_list, class_list = eval_infos[dataset_idx]
+                for tracker in tracker_list:
+                    output_res[dataset_name][tracker] = None
+                    output_msg[dataset_name][tracker] = None
+                    res, seq_keys = self._load_cached_results(result_cache, dataset, tracker, seq_list, class_list,
+                                                              metrics_list)
+                    pending[dataset_idx, tracker] = {'res': res, 'spilled': {}, 'seq_keys': seq_keys,
+                                                     'cached': set(res.keys()), 'failed': False}
+                    tasks += [(dataset_idx, tracker, seq) for seq in sorted(seq_list) if seq not in res.keys()]
+
+            # The gt is preloaded before forking the workers, only for sequences which are not fully served from the
+            # result cache.
+            if config['GT_RESIDENT']:
+                for dataset_idx, dataset in enumerate(dataset_list):
+                    dataset.preload_gt(sorted(set(seq for d, _, seq in tasks if d == dataset_idx)))
+
+            # Schedule the most expensive tasks first (according to the datasets' cost estimates), in chunks of
+            # roughly equal estimated cost such that cheap sequences are batched and expensive ones are sent alone.
+            for dataset_idx, tracker, seq in tasks:
+                self.seq_costs[dataset_names[dataset_idx], tracker, seq] = {
+                    'estimated': dataset_list[dataset_idx].estimate_seq_cost(tracker, seq), 'measured': None}
+            tasks = sorted(tasks, key=lambda x: -self.seq_costs[dataset_names[x[0]], x[1], x[2]]['estimated'])
+            task_chunks = self._make_task_chunks(tasks, [self.seq_costs[dataset_names[d], tr, sq]['estimated']
+                                                         for d, tr, sq in tasks], config['NUM_PARALLEL_CORES'])
+
+            time_start = time.time()
+            # Trackers for which all results are already cached are finished straight away.
+            for (dataset_idx, tracker), tracker_state in pending.items():
+                if len(tracker_state['res']) == len(eval_infos[dataset_idx][1]):
+                    stop = self._finish_tracker(dataset_list[dataset_idx], tracker, tracker_state,
+                                                eval_infos[dataset_idx], metrics_list, metric_names, result_cache,
+                                                spiller, time_start, output_res, output_msg)
+                    if stop:
+                        return output_res, output_msg
+                    self._check_memory_budget(spiller, dataset_list, pending.values(), output_res)
+
+            if len(tasks) > 0:
+                # The datasets and metrics are sent to each worker only once (through the pool initializer, which is
+                # inherited without pickling when processes are forked), so per task only the task and its result are
+                # transferred between processes.
+                init_args = (dataset_list, [c for _, _, c in eval_infos], metrics_list, metric_names,
+                             _timing.DO_TIMING, _timing.DISPLAY_LESS_PROGRESS, _timing.TRACE, _memory.DO_MEMORY,
+                             _assignment.SOLVER)
+                with Pool(config['NUM_PARALLEL_CORES'], initializer=init_eval_worker, initargs=init_args) as pool:
+                    pbar = tqdm.tqdm(total=len(tasks)) if show_progressbar and TQDM_IMPORTED else None
+                    for chunk_res, timings, memory in pool.imap_unordered(eval_task_chunk, task_chunks):
+                        _timing.merge_timings(timings)
+                        _memory.merge_memory(memory)
+                        for task_res in chunk_res:
+                            dataset_idx, tracker, seq, seq_res, err, tb_text, seq_time = task_res
+                            self.seq_costs[dataset_names[dataset_idx], tracker, seq]['measured'] = seq_time
+                            if pbar is not None:
+                                pbar.update()
+                            tracker_state = pending[dataset_idx, tracker]
+                            if tracker_state['failed']:
+                                continue
+                            if err is not None:
+                                tracker_state['failed'] = True
+                                self._record_error(err, tb_text, dataset_names[dataset_idx], tracker, output_res,
+                                                   output_msg)
+                                if config['BREAK_ON_ERROR']:
+                                    raise err
+                                elif config['RETURN_ON_ERROR']:
+                                    return output_res, output_msg
+                                continue
+                            tracker_state['res'][seq] = seq_res
+                            num_done = len(tracker_state['res']) + len(tracker_state['spilled'])
+                            if num_done == len(eval_infos[dataset_idx][1]):
+                                stop = self._finish_tracker(dataset_list[dataset_idx], tracker, tracker_state,
+                                                            eval_infos[dataset_idx], metrics_list, metric_names,
+                                                            result_cache, spiller, time_start, output_res,
+                                                            output_msg)
+                                if stop:
+                                    return output_res, output_msg
+                        self._check_memory_budget(spiller, dataset_list, pending.values(), output_res)
+                    if pbar is not None:
+                        pbar.close()
+
+            for dataset in dataset_list:
+                if config['GT_RESIDENT']:
+                    dataset.clear_gt_cache()
+            return output_res, output_msg
+
+        for dataset_idx, (dataset, dataset_name) in enumerate(zip(dataset_list, dataset_names)):
+            tracker_list, seq_list, class_list = eval_infos[dataset_idx]
+
             # Evaluate each tracker
             for tracker in tracker_list:
+                # Evaluate each sequence in series.
+                # returns a nested dict (res), indexed like: res[seq][class][metric_name][sub_metric field]
+                # e.g. res[seq_0001][pedestrian][hota][DetA]
+                print('\nEvaluating %s\n' % tracker)
+                time_start = time.time()
                 # if not config['BREAK_ON_ERROR'] then go to next tracker without breaking
                 try:
-                    # Evaluate each sequence in parallel or in series.
-                    # returns a nested dict (res), indexed like: res[seq][class][metric_name][sub_metric field]
-                    # e.g. res[seq_0001][pedestrian][hota][DetA]
-                    print('\nEvaluating %s\n' % tracker)
-                    time_start = time.time()
-                    if config['USE_PARALLEL']:
-                        if show_progressbar and TQDM_IMPORTED:
-                            seq_list_sorted = sorted(seq_list)
-
-                            with Pool(config['NUM_PARALLEL_CORES']) as pool, tqdm.tqdm(total=len(seq_list)) as pbar:
-                                _eval_sequence = partial(eval_sequence, dataset=dataset, tracker=tracker,
-                                                         class_list=class_list, metrics_list=metrics_list,
-                                                         metric_names=metric_names)
-                                results = []
-                                for r in pool.imap(_eval_sequence, seq_list_sorted,
-                                                   chunksize=20):
-                                    results.append(r)
-                                    pbar.update()
-                                res = dict(zip(seq_list_sorted, results))
-
-                        else:
-                            with Pool(config['NUM_PARALLEL_CORES']) as pool:
-                                _eval_sequence = partial(eval_sequence, dataset=dataset, tracker=tracker,
-                                                         class_list=class_list, metrics_list=metrics_list,
-                                                         metric_names=metric_names)
-                                results = pool.map(_eval_sequence, seq_list)
-                                res = dict(zip(seq_list, results))
-                    else:
-                        res = {}
-                        if show_progressbar and TQDM_IMPORTED:
-                            seq_list_sorted = sorted(seq_list)
-                            for curr_seq in tqdm.tqdm(seq_list_sorted):
-                                res[curr_seq] = eval_sequence(curr_seq, dataset, tracker, class_list, metrics_list,
-                                                              metric_names)
-                        else:
-                            for curr_seq in sorted(seq_list):
-                                res[curr_seq] = eval_sequence(curr_seq, dataset, tracker, class_list, metrics_list,
-                                                              metric_names)
-
-                    # Combine results over all sequences and then over all classes
-
-                    # collecting combined cls keys (cls averaged, det averaged, super classes)
-                    combined_cls_keys = []
-                    res['COMBINED_SEQ'] = {}
-                    # combine sequences for each class
-                    for c_cls in class_list:
-                        res['COMBINED_SEQ'][c_cls] = {}
-                        for metric, metric_name in zip(metrics_list, metric_names):
-                            curr_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value in res.items() if
-                                        seq_key != 'COMBINED_SEQ'}
-                            res['COMBINED_SEQ'][c_cls][metric_name] = metric.combine_sequences(curr_res)
-                    # combine classes
-                    if dataset.should_classes_combine:
-                        combined_cls_keys += ['cls_comb_cls_av', 'cls_comb_det_av', 'all']
-                        res['COMBINED_SEQ']['cls_comb_cls_av'] = {}
-                        res['COMBINED_SEQ']['cls_comb_det_av'] = {}
-                        for metric, metric_name in zip(metrics_list, metric_names):
-                            cls_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
-                                       res['COMBINED_SEQ'].items() if cls_key not in combined_cls_keys}
-                            res['COMBINED_SEQ']['cls_comb_cls_av'][metric_name] = \
-                                metric.combine_classes_class_averaged(cls_res)
-                            res['COMBINED_SEQ']['cls_comb_det_av'][metric_name] = \
-                                metric.combine_classes_det_averaged(cls_res)
-                    # combine classes to super classes
-                    if dataset.use_super_categories:
-                        for cat, sub_cats in dataset.super_categories.items():
-                            combined_cls_keys.append(cat)
-                            res['COMBINED_SEQ'][cat] = {}
-                            for metric, metric_name in zip(metrics_list, metric_names):
-                                cat_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
-                                           res['COMBINED_SEQ'].items() if cls_key in sub_cats}
-                                res['COMBINED_SEQ'][cat][metric_name] = metric.combine_classes_det_averaged(cat_res)
-
-                    # Print and output results in various formats
-                    if config['TIME_PROGRESS']:
-                        print('\nAll sequences for %s finished in %.2f seconds' % (tracker, time.time() - time_start))
-                    output_fol = dataset.get_output_fol(tracker)
-                    tracker_display_name = dataset.get_display_name(tracker)
-                    for c_cls in res['COMBINED_SEQ'].keys():  # class_list + combined classes if calculated
-                        summaries = []
-                        details = []
-                        num_dets = res['COMBINED_SEQ'][c_cls]['Count']['Dets']
-                        if config['OUTPUT_EMPTY_CLASSES'] or num_dets > 0:
-                            for metric, metric_name in zip(metrics_list, metric_names):
-                                # for combined classes there is no per sequence evaluation
-                                if c_cls in combined_cls_keys:
-                                    table_res = {'COMBINED_SEQ': res['COMBINED_SEQ'][c_cls][metric_name]}
-                                else:
-                                    table_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value
-                                                 in res.items()}
-
-                                if config['PRINT_RESULTS'] and config['PRINT_ONLY_COMBINED']:
-                                    dont_print = dataset.should_classes_combine and c_cls not in combined_cls_keys
-                                    if not dont_print:
-                                        metric.print_table({'COMBINED_SEQ': table_res['COMBINED_SEQ']},
-                                                           tracker_display_name, c_cls)
-                                elif config['PRINT_RESULTS']:
-                                    metric.print_table(table_res, tracker_display_name, c_cls)
-                                if config['OUTPUT_SUMMARY']:
-                                    summaries.append(metric.summary_results(table_res))
-                                if config['OUTPUT_DETAILED']:
-                                    details.append(metric.detailed_results(table_res))
-                                if config['PLOT_CURVES']:
-                                    metric.plot_single_tracker_results(table_res, tracker_display_name, c_cls,
-                                                                       output_fol)
-                            if config['OUTPUT_SUMMARY']:
-                                utils.write_summary_results(summaries, c_cls, output_fol)
-                            if config['OUTPUT_DETAILED']:
-                                utils.write_detailed_results(details, c_cls, output_fol)
-
-                    # Output for returning from function
-                    output_res[dataset_name][tracker] = res
-                    output_msg[dataset_name][tracker] = 'Success'
-
+                    res, seq_keys = self._load_cached_results(result_cache, dataset, tracker, seq_list, class_list,
+                                                              metrics_list)
+                    tracker_state = {'res': res, 'spilled': {}, 'seq_keys': seq_keys, 'cached': set(res.keys()),
+                                     'failed': False}
+                    eval_seq_list = [seq for seq in sorted(seq_list) if seq not in res.keys()]
+                    if show_progressbar and TQDM_IMPORTED:
+                        eval_seq_list = tqdm.tqdm(eval_seq_list)
+                    for curr_seq in eval_seq_list:
+                        seq_time_start = time.perf_counter()
+                        tracker_state['res'][curr_seq] = eval_sequence(curr_seq, dataset, tracker, class_list,
+                                                                       metrics_list, metric_names)
+                        self.seq_costs[dataset_name, tracker, curr_seq] = {
+                            'estimated': dataset.estimate_seq_cost(tracker, curr_seq),
+                            'measured': time.perf_counter() - seq_time_start}
+                        self._check_memory_budget(spiller, dataset_list, [tracker_state], output_res)
                 except Exception as err:
-                    output_res[dataset_name][tracker] = None
-                    if type(err) == TrackEvalException:
-                        output_msg[dataset_name][tracker] = str(err)
-                    else:
-                        output_msg[dataset_name][tracker] = 'Unknown error occurred.'
-                    print('Tracker %s was unable to be evaluated.' % tracker)
-                    print(err)
-                    traceback.print_exc()
-                    if config['LOG_ON_ERROR'] is not None:
-                        with open(config['LOG_ON_ERROR'], 'a') as f:
-                            print(dataset_name, file=f)
-                            print(tracker, file=f)
-                            print(traceback.format_exc(), file=f)
-                            print('\n\n\n', file=f)
+                    self._record_error(err, traceback.format_exc(), dataset_name, tracker, output_res, output_msg)
                     if config['BREAK_ON_ERROR']:
                         raise err
                     elif config['RETURN_ON_ERROR']:
                         return output_res, output_msg
+                    continue
+
+                stop = self._finish_tracker(dataset, tracker, tracker_state, eval_infos[dataset_idx], metrics_list,
+                                            metric_names, result_cache, spiller, time_start, output_res, output_msg)
+                if stop:
+                    return output_res, output_msg
+                self._check_memory_budget(spiller, dataset_list, [], output_res)
+
+            if config['GT_RESIDENT']:
+                dataset.clear_gt_cache()
 
         return output_res, output_msg
 
+    @staticmethod
+    def _make_task_chunks(tasks, costs, num_cores, chunks_per_core=4):
+        """ Splits tasks (sorted by decreasing cost) into consecutive chunks for the worker pool.
+        Each chunk is filled up to a target cost of total_cost / (num_cores * chunks_per_core), so that expensive tasks
+        form chunks of their own while many cheap tasks are sent together, reducing inter-process communication.
+        """
+        target_cost = sum(costs) / max(1, num_cores * chunks_per_core)
+        chunks = []
+        curr_chunk = []
+        curr_cost = 0
+        for task, cost in zip(tasks, costs):
+            if len(curr_chunk) > 0 and curr_cost + cost > target_cost:
+                chunks.append(curr_chunk)
+                curr_chunk = []
+                curr_cost = 0
+            curr_chunk.append(task)
+            curr_cost += cost
+        if len(curr_chunk) > 0:
+            chunks.append(curr_chunk)
+        return chunks
+
+    @staticmethod
+    def _load_cached_results(result_cache, dataset, tracker, seq_list, class_list, metrics_list):
+        """ Loads the results of all sequences whose inputs have not changed from the result cache.
+        Returns the cached results (indexed by sequence) and the cache key of every sequence.
+        """
+        res = {}
+        seq_keys = {}
+        if result_cache is not None:
+            for curr_seq in seq_list:
+                seq_keys[curr_seq] = result_cache.get_key(dataset, tracker, curr_seq, class_list, metrics_list)
+                cached_res = result_cache.load(dataset, tracker, curr_seq, seq_keys[curr_seq])
+                if cached_res is not None:
+                    res[curr_seq] = cached_res
+            print('%i of %i sequence(s) for %s loaded from result cache' % (len(res), len(seq_list), tracker))
+        return res, seq_keys
+
+    def _finish_tracker(self, dataset, tracker, tracker_state, eval_info, metrics_list, metric_names, result_cache,
+                        spiller, time_start, output_res, output_msg):
+        """ Caches, combines and outputs the results of a tracker once all of its sequences are evaluated.
+        Returns True if evaluation should stop (on error with RETURN_ON_ERROR).
+        """
+        config = self.config
+        dataset_name = dataset.get_name()
+        _, seq_list, class_list = eval_info
+        # if not config['BREAK_ON_ERROR'] then go to next tracker without breaking
+        try:
+            # Save newly evaluated sequences to the result cache, and keep the usual (sorted) sequence order (the order
+            # affects the floating point summation when combining sequences). If some results were spilled, all are
+            # spilled, such that they are loaded one sequence at a time (instead of all at once) from here on.
+            if len(tracker_state['spilled']) > 0:
+                spill_files = {**tracker_state['spilled'], **{curr_seq: spiller.spill(seq_res) for curr_seq, seq_res
+                                                              in tracker_state['res'].items()}}
+                res = SpilledResults({seq: spill_files[seq] for seq in sorted(seq_list)})
+            else:
+                res = {seq: tracker_state['res'][seq] for seq in sorted(seq_list)}
+            tracker_state['res'] = None
+            tracker_state['spilled'] = {}
+            if result_cache is not None:
+                for curr_seq, key in tracker_state['seq_keys'].items():
+                    if curr_seq not in tracker_state['cached']:
+                        result_cache.save(dataset, tracker, curr_seq, key, res[curr_seq])
+
+            # Combine results over all sequences and then over all classes
+            with _timing.stage('combine', {'tracker': tracker}):
+                combined_res, combined_cls_keys = self._combine_results(res, dataset, class_list, metrics_list,
+                                                                        metric_names)
+            if isinstance(res, SpilledResults):
+                res = SpilledResults({**res.spill_files, 'COMBINED_SEQ': spiller.spill(combined_res)})
+            else:
+                res['COMBINED_SEQ'] = combined_res
+
+            # Print and output results in various formats
+            if config['TIME_PROGRESS']:
+                print('\nAll sequences for %s finished in %.2f seconds' % (tracker, time.time() - time_start))
+            with _timing.stage('output', {'tracker': tracker}):
+                self._output_results(res, combined_cls_keys, dataset, tracker, metrics_list, metric_names)
+
+            if _memory.DO_MEMORY:
+                res_size = len(pickle.dumps(res, protocol=pickle.HIGHEST_PROTOCOL))
+                _memory.record('results', res_size, res_size)
+
+            # Output for returning from function
+            output_res[dataset_name][tracker] = res
+            output_msg[dataset_name][tracker] = 'Success'
+
+        except Exception as err:
+            self._record_error(err, traceback.format_exc(), dataset_name, tracker, output_res, output_msg)
+            if config['BREAK_ON_ERROR']:
+                raise err
+            elif config['RETURN_ON_ERROR']:
+                return True
+        return False
+
+    @staticmethod
+    def _check_memory_budget(spiller, dataset_list, tracker_states, output_res):
+        """ If the memory budget (MAX_RSS_MB) is exceeded, spills the per-sequence results of trackers still being
+        evaluated and the results of finished trackers to disk (only those held in memory, i.e. not spilled before). If
+        the budget is still exceeded after this, the cached gt of all datasets is released as well.
+        """
+        if spiller is None or not spiller.over_budget():
+            return
+        for tracker_state in tracker_states:
+            if tracker_state['res'] is None or tracker_state['failed']:
+                continue
+            for curr_seq, seq_res in tracker_state['res'].items():
+                tracker_state['spilled'][curr_seq] = spiller.spill(seq_res)
+            tracker_state['res'] = {}
+        for dataset_res in output_res.values():
+            for tracker, res in dataset_res.items():
+                if res is not None:
+                    dataset_res[tracker] = spiller.spill_results(res)
+        spiller.release()
+        if spiller.over_budget(since_last_spill=False):
+            for dataset in dataset_list:
+                dataset.clear_gt_cache()
+            spiller.release()
+        spiller.mark_spilled()
+
+    @staticmethod
+    def _combine_results(res, dataset, class_list, metrics_list, metric_names):
+        """ Combines the results (res) of a tracker over all sequences and then over all classes. Returns the combined
+        results (to be stored as res['COMBINED_SEQ']) and the keys of the combined classes (cls averaged, det averaged, super classes).
+        The results of each class are collected from all sequences at once, such that spilled results (SpilledResults)
+        are loaded one sequence at a time.
+        """
+        # collecting combined cls keys (cls averaged, det averaged, super classes)
+        combined_cls_keys = []
+        combined_res = {}
+        # combine sequences for each class
+        for c_cls in class_list:
+            combined_res[c_cls] = {}
+            cls_res = {seq_key: seq_value[c_cls] for seq_key, seq_value in res.items() if seq_key != 'COMBINED_SEQ'}
+            for metric, metric_name in zip(metrics_list, metric_names):
+                curr_res = {seq_key: seq_value[metric_name] for seq_key, seq_value in cls_res.items()}
+                combined_res[c_cls][metric_name] = metric.combine_sequences(curr_res)
+        # combine classes
+        if dataset.should_classes_combine:
+            combined_cls_keys += ['cls_comb_cls_av', 'cls_comb_det_av', 'all']
+            combined_res['cls_comb_cls_av'] = {}
+            combined_res['cls_comb_det_av'] = {}
+            for metric, metric_name in zip(metrics_list, metric_names):
+                cls_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
+                           combined_res.items() if cls_key not in combined_cls_keys}
+                combined_res['cls_comb_cls_av'][metric_name] = \
+                    metric.combine_classes_class_averaged(cls_res)
+                combined_res['cls_comb_det_av'][metric_name] = \
+                    metric.combine_classes_det_averaged(cls_res)
+        # combine classes to super classes
+        if dataset.use_super_categories:
+            for cat, sub_cats in dataset.super_categories.items():
+                combined_cls_keys.append(cat)
+                combined_res[cat] = {}
+                for metric, metric_name in zip(metrics_list, metric_names):
+                    cat_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
+                               combined_res.items() if cls_key in sub_cats}
+                    combined_res[cat][metric_name] = metric.combine_classes_det_averaged(cat_res)
+        return combined_res, combined_cls_keys
+
+    def _output_results(self, res, combined_cls_keys, dataset, tracker, metrics_list, metric_names):
+        """Print and output the results of a tracker in various formats"""
+        config = self.config
+        output_fol = dataset.get_output_fol(tracker)
+        tracker_display_name = dataset.get_display_name(tracker)
+        combined_res = res['COMBINED_SEQ']
+        for c_cls in combined_res.keys():  # class_list + combined classes if calculated
+            summaries = []
+            details = []
+            num_dets = combined_res[c_cls]['Count']['Dets']
+            if config['OUTPUT_EMPTY_CLASSES'] or num_dets > 0:
+                # for combined classes there is no per sequence evaluation. The results of each class are collected
+                # once, such that spilled sequences are loaded once per class.
+                if c_cls in combined_cls_keys:
+                    cls_res = {'COMBINED_SEQ': combined_res[c_cls]}
+                else:
+                    cls_res = {seq_key: seq_value[c_cls] for seq_key, seq_value in res.items()}
+                for metric, metric_name in zip(metrics_list, metric_names):
+                    table_res = {seq_key: seq_value[metric_name] for seq_key, seq_value in cls_res.items()}
+
+                    if config['PRINT_RESULTS'] and config['PRINT_ONLY_COMBINED']:
+                        dont_print = dataset.should_classes_combine and c_cls not in combined_cls_keys
+                        if not dont_print:
+                            metric.print_table({'COMBINED_SEQ': table_res['COMBINED_SEQ']},
+                                               tracker_display_name, c_cls)
+                    elif config['PRINT_RESULTS']:
+                        metric.print_table(table_res, tracker_display_name, c_cls)
+                    if config['OUTPUT_SUMMARY']:
+                        summaries.append(metric.summary_results(table_res))
+                    if config['OUTPUT_DETAILED']:
+                        details.append(metric.detailed_results(table_res))
+                    if config['PLOT_CURVES']:
+                        metric.plot_single_tracker_results(table_res, tracker_display_name, c_cls,
+                                                           output_fol)
+                if config['OUTPUT_SUMMARY']:
+                    utils.write_summary_results(summaries, c_cls, output_fol)
+                if config['OUTPUT_DETAILED']:
+                    utils.write_detailed_results(details, c_cls, output_fol)
+
+    def _record_error(self, err, tb_text, dataset_name, tracker, output_res, output_msg):
+        """Records, prints and logs an error that occurred while evaluating a tracker"""
+        config = self.config
+        output_res[dataset_name][tracker] = None
+        if type(err) == TrackEvalException:
+            output_msg[dataset_name][tracker] = str(err)
+        else:
+            output_msg[dataset_name][tracker] = 'Unknown error occurred.'
+        print('Tracker %s was unable to be evaluated.' % tracker)
+        print(err)
+        print(tb_text, file=sys.stderr)
+        if config['LOG_ON_ERROR'] is not None:
+            with open(config['LOG_ON_ERROR'], 'a') as f:
+                print(dataset_name, file=f)
+                print(tracker, file=f)
+                print(tb_text, file=f)
+                print('\n\n\n', file=f)
+
+
+def evaluate_in_memory(gt_data, tracker_data, metrics_list=None, dataset_config=None):
+    """ Evaluates a tracker on data given as numpy arrays in memory, without printing, folder checks or file I/O, such
+    that it is cheap enough to be called many times (e.g. after every epoch of a training loop).
+    gt_data and tracker_data are dicts indexed by sequence name, see datasets.InMemory for the data of a sequence.
+    By default the HOTA, CLEAR and Identity metrics are evaluated (Count metrics are always evaluated).
+    Returns a nested dict of results indexed like res[seq][class][metric_name][field], including the results combined
+    over all sequences as res['COMBINED_SEQ'] (which also contains the combined classes if there are several).
+    """
+    if metrics_list is None:
+        metrics_list = [HOTA({'PRINT_CONFIG': False}), CLEAR({'PRINT_CONFIG': False}),
+                        Identity({'PRINT_CONFIG': False})]
+    metrics_list = metrics_list + [Count({'PRINT_CONFIG': False})]
+    metric_names = utils.validate_metrics_list(metrics_list)
+    dataset = InMemory(gt_data, {'tracker': tracker_data}, dataset_config)
+
+    # Timing may have been enabled globally by an Evaluator, so it is disabled here (and restored afterwards).
+    do_timing, display_less_progress = _timing.DO_TIMING, _timing.DISPLAY_LESS_PROGRESS
+    _timing.DO_TIMING, _timing.DISPLAY_LESS_PROGRESS = False, True
+    try:
+        res = {}
+        for seq in sorted(dataset.seq_list):
+            res[seq] = eval_sequence(seq, dataset, 'tracker', dataset.class_list, metrics_list, metric_names)
+        res['COMBINED_SEQ'], _ = Evaluator._combine_results(res, dataset, dataset.class_list, metrics_list,
+                                                            metric_names)
+    finally:
+        _timing.DO_TIMING, _timing.DISPLAY_LESS_PROGRESS = do_timing, display_less_progress
+    return res
+
 
 @_timing.time
 def eval_sequence(seq, dataset, tracker, class_list, metrics_list, metric_names):
     """Function for evaluating a single sequence"""
 
-    raw_data = dataset.get_raw_seq_data(tracker, seq)
-    seq_res = {}
-    for cls in class_list:
-        seq_res[cls] = {}
-        data = dataset.get_preprocessed_seq_data(raw_data, cls)
-        for metric, met_name in zip(metrics_list, metric_names):
-            seq_res[cls][met_name] = metric.eval_sequence(data)
+    with _timing.span('eval_sequence', {'tracker': tracker, 'seq': seq}):
+        raw_data = dataset.get_raw_seq_data(tracker, seq)
+        seq_res = {}
+        for cls in class_list:
+            seq_res[cls] = {}
+            with _timing.stage('preprocess', {'tracker': tracker, 'seq': seq, 'cls': cls}):
+                data = dataset.get_preprocessed_seq_data(raw_data, cls)
+            for metric, met_name in zip(metrics_list, metric_names):
+                with _timing.stage(met_name, {'tracker': tracker, 'seq': seq, 'cls': cls, 'metric': met_name}):
+                    seq_res[cls][met_name] = metric.eval_sequence(data)
     return seq_res
+
+
+def init_eval_worker(dataset_list, class_lists, metrics_list, metric_names, do_timing, display_less_progress,
+                     trace, do_memory, assignment_solver):
+    """ Pool initializer which stores the datasets and metrics once per worker process. Timing (and memory accounting)
+    is set up such that timings are accumulated silently, to be merged back into the main process after each chunk.
+    The assignment solver of the main process is used for all matching in the worker.
+    """
+    global _worker_eval_args
+    _worker_eval_args = (dataset_list, class_lists, metrics_list, metric_names)
+    _timing.DO_TIMING = do_timing
+    _timing.DISPLAY_LESS_PROGRESS = display_less_progress
+    _timing.TRACE = trace
+    _timing.PRINT_PROGRESS = False
+    _timing.reset_timings()
+    _assignment.SOLVER = assignment_solver
+    _memory.reset_memory()
+    if do_memory:
+        _memory.start()
+
+
+def eval_task_chunk(task_chunk):
+    """ Evaluates a chunk of (dataset, tracker, sequence) tasks of the parallel work queue in a worker process.
+    Errors are caught and returned together with their traceback so that they can be attributed to the tracker. The
+    time taken for each task is returned so that it can be compared against the estimated cost.
+    """
+    dataset_list, class_lists, metrics_list, metric_names = _worker_eval_args
+    chunk_res = []
+    for dataset_idx, tracker, seq in task_chunk:
+        seq_time_start = time.perf_counter()
+        try:
+            seq_res = eval_sequence(seq, dataset_list[dataset_idx], tracker, class_lists[dataset_idx], metrics_list,
+                                    metric_names)
+            chunk_res.append((dataset_idx, tracker, seq, seq_res, None, None, time.perf_counter() - seq_time_start))
+        except Exception as err:
+            chunk_res.append((dataset_idx, tracker, seq, None, err, traceback.format_exc(),
+                              time.perf_counter() - seq_time_start))
+    timings = _timing.get_timings()
+    _timing.reset_timings()
+    memory = _memory.get_memory()
+    _memory.reset_memory()
+    return chunk_res, timings, memory
@@ -1,9 +1,10 @@
 
+import os
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ._base_metric import _BaseMetric
 from .. import _timing
 from .. import utils
+from .._assignment import max_score_assignment
 
 class CLEAR(_BaseMetric):
     """Class which implements the CLEAR metrics"""
@@ -13,6 +14,8 @@ class CLEAR(_BaseMetric):
         """Default class config values"""
         default_config = {
             'THRESHOLD': 0.5,  # Similarity score threshold required for a TP match. Default 0.5.
+            'THRESHOLDS': None,  # If not None, a list of thresholds over which the metrics are additionally calculated
+            # as curves (the '_curve' fields), sharing the loaded data and similarities of the sequence.
             'PRINT_CONFIG': True,  # Whether to print the config information on init. Default: False.
         }
         return default_config
@@ -33,13 +36,30 @@ class CLEAR(_BaseMetric):
         self.config = utils.init_config(config, self.get_default_config(), self.get_name())
         self.threshold = float(self.config['THRESHOLD'])
 
+        # Curves of the fields over multiple thresholds
+        if self.config['THRESHOLDS'] is not None:
+            self.plottable = True
+            self.array_labels = np.array(self.config['THRESHOLDS'], dtype=float)
+            self.integer_array_fields = ['CLR_TP_curve', 'CLR_FN_curve', 'CLR_FP_curve', 'IDSW_curve', 'Frag_curve']
+            self.float_array_fields = ['MOTA_curve', 'MOTP_curve', 'MOTP_sum_curve']
+            self.fields += self.float_array_fields + self.integer_array_fields
+            self.summed_fields += self.integer_array_fields + ['MOTP_sum_curve']
 
     @_timing.time
     def eval_sequence(self, data):
-        """Calculates CLEAR metrics for one sequence"""
+        """Calculates CLEAR metrics for one sequence (and their curves over all thresholds, if configured)"""
+        res = self._eval_sequence_at_threshold(data, self.threshold)
+        if len(self.array_labels) > 0:
+            threshold_res = [self._eval_sequence_at_threshold(data, threshold) for threshold in self.array_labels]
+            for field in self.float_array_fields + self.integer_array_fields:
+                res[field] = np.array([r[field[:-len('_curve')]] for r in threshold_res], dtype=float)
+        return res
+
+    def _eval_sequence_at_threshold(self, data, threshold):
+        """Calculates CLEAR metrics for one sequence, for a single similarity threshold"""
         # Initialise results
         res = {}
-        for field in self.fields:
+        for field in self.float_fields + self.integer_fields:
             res[field] = 0
 
         # Return result quickly if tracker or gt sequence is empty
@@ -79,10 +99,10 @@ class CLEAR(_BaseMetric):
             similarity = data['similarity_scores'][t]
             score_mat = (tracker_ids_t[np.newaxis, :] == prev_timestep_tracker_id[gt_ids_t[:, np.newaxis]])
             score_mat = 1000 * score_mat + similarity
-            score_mat[similarity < self.threshold - np.finfo('float').eps] = 0
+            score_mat[similarity < threshold - np.finfo('float').eps] = 0
 
             # Hungarian algorithm to find best matches
-            match_rows, match_cols = linear_sum_assignment(-score_mat)
+            match_rows, match_cols = max_score_assignment(score_mat)
             actually_matched_mask = score_mat[match_rows, match_cols] > 0 + np.finfo('float').eps
             match_rows = match_rows[actually_matched_mask]
             match_cols = match_cols[actually_matched_mask]
@@ -149,13 +169,13 @@ class CLEAR(_BaseMetric):
         If 'ignore_empty_classes' is True, then it only sums over classes with at least one gt or predicted detection.
         """
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             if ignore_empty_classes:
                 res[field] = self._combine_sum(
                     {k: v for k, v in all_res.items() if v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0}, field)
             else:
                 res[field] = self._combine_sum({k: v for k, v in all_res.items()}, field)
-        for field in self.float_fields:
+        for field in self.float_fields + self.float_array_fields:
             if ignore_empty_classes:
                 res[field] = np.mean(
                     [v[field] for v in all_res.values() if v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0], axis=0)
@@ -183,4 +203,38 @@ class CLEAR(_BaseMetric):
         res['FP_per_frame'] = res['CLR_FP'] / np.maximum(1.0, res['CLR_Frames'])
         safe_log_idsw = np.log10(res['IDSW']) if res['IDSW'] > 0 else res['IDSW']
         res['MOTAL'] = (res['CLR_TP'] - res['CLR_FP'] - safe_log_idsw) / np.maximum(1.0, res['CLR_TP'] + res['CLR_FN'])
+
+        if 'CLR_TP_curve' in res.keys():
+            res['MOTA_curve'] = (res['CLR_TP_curve'] - res['CLR_FP_curve'] - res['IDSW_curve']) / np.maximum(
+                1.0, res['CLR_TP_curve'] + res['CLR_FN_curve'])
+            res['MOTP_curve'] = res['MOTP_sum_curve'] / np.maximum(1.0, res['CLR_TP_curve'])
         return res
+
+    def plot_single_tracker_results(self, table_res, tracker, cls, output_folder):
+        """Create plot of the curves over all thresholds (only if THRESHOLDS are configured)"""
+        if not self.plottable:
+            return
+
+        # Only loaded when run to reduce minimum requirements
+        from matplotlib import pyplot as plt
+
+        res = table_res['COMBINED_SEQ']
+        fig, (score_ax, count_ax) = plt.subplots(1, 2, figsize=(12, 5))
+        for name, style in zip(['MOTA_curve', 'MOTP_curve'], ['r', 'b']):
+            score_ax.plot(self.array_labels, res[name], style)
+        score_ax.set_xlabel('threshold')
+        score_ax.set_ylabel('score')
+        score_ax.set_ylim(min(0, np.min(res['MOTA_curve'])), 1)
+        score_ax.legend([name[:-len('_curve')] + ' (' + str(np.round(np.mean(res[name]), 2)) + ')'
+                         for name in ['MOTA_curve', 'MOTP_curve']], loc='lower left')
+        for name, style in zip(['IDSW_curve', 'Frag_curve'], ['g', 'm']):
+            count_ax.plot(self.array_labels, res[name], style)
+        count_ax.set_xlabel('threshold')
+        count_ax.set_ylabel('count')
+        count_ax.legend(['IDSW', 'Frag'], loc='upper right')
+        fig.suptitle(tracker + ' - ' + cls)
+        out_file = os.path.join(output_folder, cls + '_clear_plot.pdf')
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        fig.savefig(out_file)
+        fig.savefig(out_file.replace('.pdf', '.png'))
+        plt.close(fig)
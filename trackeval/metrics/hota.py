@@ -1,9 +1,13 @@
 
 import os
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ._base_metric import _BaseMetric
 from .. import _timing
+from .._assignment import max_score_assignment
+from .. import utils
+
+# Whether the blockwise sums of HOTA._block_sums are identical to np.sum, for each numpy buffer size
+_block_sums_match_np_sum = {}
 
 
 class HOTA(_BaseMetric):
@@ -11,6 +15,16 @@ class HOTA(_BaseMetric):
     See: https://link.springer.com/article/10.1007/s11263-020-01375-2
     """
 
+    @staticmethod
+    def get_default_config():
+        """Default class config values"""
+        default_config = {
+            'SPARSE_THRESHOLD': 10000000,  # Number of (gt_id, tracker_id) pairs above which the potential matches are
+            # accumulated sparsely (only for overlapping pairs) instead of in a dense array. None for always dense.
+            'PRINT_CONFIG': True,  # Whether to print the config information on init. Default: False.
+        }
+        return default_config
+
     def __init__(self, config=None):
         super().__init__()
         self.plottable = True
@@ -21,6 +35,10 @@ class HOTA(_BaseMetric):
         self.fields = self.float_array_fields + self.integer_array_fields + self.float_fields
         self.summary_fields = self.float_array_fields + self.float_fields
 
+        # Configuration options:
+        self.config = utils.init_config(config, self.get_default_config(), self.get_name())
+        self.sparse_threshold = self.config['SPARSE_THRESHOLD']
+
     @_timing.time
     def eval_sequence(self, data):
         """Calculates the HOTA metrics for one sequence"""
@@ -44,78 +62,217 @@ class HOTA(_BaseMetric):
             res['LocA(0)'] = 1.0
             return res
 
-        # Variables counting global association
-        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        gt_id_count = np.zeros((data['num_gt_ids'], 1))
-        tracker_id_count = np.zeros((1, data['num_tracker_ids']))
-
-        # First loop through each timestep and accumulate global track information.
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Count the potential matches between ids in each timestep
-            # These are normalised, weighted by the match similarity.
-            similarity = data['similarity_scores'][t]
-            sim_iou_denom = similarity.sum(0)[np.newaxis, :] + similarity.sum(1)[:, np.newaxis] - similarity
-            sim_iou = np.zeros_like(similarity)
-            sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
-            sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
-            potential_matches_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += sim_iou
-
-            # Calculate the total number of dets for each gt_id and tracker_id.
-            gt_id_count[gt_ids_t] += 1
-            tracker_id_count[0, tracker_ids_t] += 1
+        # Accumulate global track information over all timesteps.
+        num_gt_ids, num_tracker_ids = data['num_gt_ids'], data['num_tracker_ids']
+        pair_ids, pair_values, gt_id_count, tracker_id_count = self._accumulate_potential_matches(data)
 
-        # Calculate overall jaccard alignment score (before unique matching) between IDs
-        global_alignment_score = potential_matches_count / (gt_id_count + tracker_id_count - potential_matches_count)
-        matches_counts = [np.zeros_like(potential_matches_count) for _ in self.array_labels]
+        # Calculate overall jaccard alignment score (before unique matching) between IDs. For many IDs this is only
+        # stored for the (sorted) pairs of IDs which overlap at least once, as all other pairs have a score of zero.
+        use_sparse = self.sparse_threshold is not None and num_gt_ids * num_tracker_ids > self.sparse_threshold
+        if use_sparse:
+            pair_ids, pair_inverse = np.unique(pair_ids, return_inverse=True)
+            potential_matches_count = np.bincount(pair_inverse, weights=pair_values, minlength=len(pair_ids))
+            pair_gt_id_count = gt_id_count[pair_ids // num_tracker_ids, 0]
+            pair_tracker_id_count = tracker_id_count[0, pair_ids % num_tracker_ids]
+            global_alignment_score = potential_matches_count / (pair_gt_id_count + pair_tracker_id_count
+                                                                - potential_matches_count)
+        else:
+            potential_matches_count = np.bincount(pair_ids, weights=pair_values,
+                                                  minlength=num_gt_ids * num_tracker_ids)
+            potential_matches_count = potential_matches_count.reshape(num_gt_ids, num_tracker_ids)
+            global_alignment_score = potential_matches_count / (gt_id_count + tracker_id_count
+                                                                - potential_matches_count)
 
-        # Calculate scores for each timestep
+        # Find the best matches in each timestep. These do not depend on alpha, so only the matched ids and their
+        # similarities are collected here, and the statistics for all alphas are calculated at once afterwards.
+        match_timesteps = [np.zeros(0, dtype=int)]
+        match_gt_ids = [np.zeros(0, dtype=int)]
+        match_tracker_ids = [np.zeros(0, dtype=int)]
+        match_sims = [np.zeros(0)]
         for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
             # Deal with the case that there are no gt_det/tracker_det in a timestep.
-            if len(gt_ids_t) == 0:
-                for a, alpha in enumerate(self.array_labels):
-                    res['HOTA_FP'][a] += len(tracker_ids_t)
-                continue
-            if len(tracker_ids_t) == 0:
-                for a, alpha in enumerate(self.array_labels):
-                    res['HOTA_FN'][a] += len(gt_ids_t)
+            if len(gt_ids_t) == 0 or len(tracker_ids_t) == 0:
                 continue
 
             # Get matching scores between pairs of dets for optimizing HOTA
             similarity = data['similarity_scores'][t]
-            score_mat = global_alignment_score[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] * similarity
+            if use_sparse:
+                score_mat = self._lookup_pairs(global_alignment_score, pair_ids,
+                                               gt_ids_t[:, np.newaxis] * num_tracker_ids + tracker_ids_t[np.newaxis, :])
+            else:
+                score_mat = global_alignment_score[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]]
+            score_mat = score_mat * similarity
 
             # Hungarian algorithm to find best matches
-            match_rows, match_cols = linear_sum_assignment(-score_mat)
-
-            # Calculate and accumulate basic statistics
-            for a, alpha in enumerate(self.array_labels):
-                actually_matched_mask = similarity[match_rows, match_cols] >= alpha - np.finfo('float').eps
-                alpha_match_rows = match_rows[actually_matched_mask]
-                alpha_match_cols = match_cols[actually_matched_mask]
-                num_matches = len(alpha_match_rows)
-                res['HOTA_TP'][a] += num_matches
-                res['HOTA_FN'][a] += len(gt_ids_t) - num_matches
-                res['HOTA_FP'][a] += len(tracker_ids_t) - num_matches
-                if num_matches > 0:
-                    res['LocA'][a] += sum(similarity[alpha_match_rows, alpha_match_cols])
-                    matches_counts[a][gt_ids_t[alpha_match_rows], tracker_ids_t[alpha_match_cols]] += 1
-
-        # Calculate association scores (AssA, AssRe, AssPr) for the alpha value.
-        # First calculate scores per gt_id/tracker_id combo and then average over the number of detections.
-        for a, alpha in enumerate(self.array_labels):
-            matches_count = matches_counts[a]
-            ass_a = matches_count / np.maximum(1, gt_id_count + tracker_id_count - matches_count)
-            res['AssA'][a] = np.sum(matches_count * ass_a) / np.maximum(1, res['HOTA_TP'][a])
-            ass_re = matches_count / np.maximum(1, gt_id_count)
-            res['AssRe'][a] = np.sum(matches_count * ass_re) / np.maximum(1, res['HOTA_TP'][a])
-            ass_pr = matches_count / np.maximum(1, tracker_id_count)
-            res['AssPr'][a] = np.sum(matches_count * ass_pr) / np.maximum(1, res['HOTA_TP'][a])
+            match_rows, match_cols = max_score_assignment(score_mat)
+            match_timesteps.append(np.full(len(match_rows), t))
+            match_gt_ids.append(gt_ids_t[match_rows])
+            match_tracker_ids.append(tracker_ids_t[match_cols])
+            match_sims.append(similarity[match_rows, match_cols])
+        match_timesteps = np.concatenate(match_timesteps)
+        match_gt_ids = np.concatenate(match_gt_ids)
+        match_tracker_ids = np.concatenate(match_tracker_ids)
+        match_sims = np.concatenate(match_sims)
+
+        # Calculate and accumulate basic statistics for all alphas at once. The level of a match is the number of
+        # alphas for which it counts as a match (similarity >= alpha), so that cumulative histograms over the levels
+        # (summed from the highest level down) give the number of matches for each alpha.
+        num_alphas = len(self.array_labels)
+        match_levels = np.searchsorted(self.array_labels - np.finfo('float').eps, match_sims, side='right')
+        tp_per_level = np.bincount(match_levels, minlength=num_alphas + 1)
+        res['HOTA_TP'] = np.cumsum(tp_per_level[::-1])[::-1][1:].astype(float)
+        res['HOTA_FN'] = data['num_gt_dets'] - res['HOTA_TP']
+        res['HOTA_FP'] = data['num_tracker_dets'] - res['HOTA_TP']
+
+        # The similarities of the matches are summed per timestep first and then over the timesteps (in order), for
+        # all alphas with a single bincount over (alpha, timestep) bins.
+        num_timesteps = len(data['gt_ids'])
+        is_match = match_levels[np.newaxis, :] > np.arange(num_alphas)[:, np.newaxis]
+        alpha_timesteps = np.arange(num_alphas)[:, np.newaxis] * num_timesteps + match_timesteps[np.newaxis, :]
+        alpha_sims = np.broadcast_to(match_sims, is_match.shape)
+        loc_per_timestep = np.bincount(alpha_timesteps[is_match], weights=alpha_sims[is_match],
+                                       minlength=num_alphas * num_timesteps).reshape(num_alphas, num_timesteps)
+        res['LocA'] = np.cumsum(loc_per_timestep, axis=1)[:, -1]
+
+        # Count the matches between each matched pair of gt_id and tracker_id for all alphas with a single scatter
+        # over the levels. Only the (sorted) pairs which are matched at least once are counted, as the association
+        # scores of all other pairs are zero.
+        matched_pair_ids, matched_pair_inverse = np.unique(match_gt_ids * num_tracker_ids + match_tracker_ids,
+                                                           return_inverse=True)
+        matches_per_level = np.bincount(matched_pair_inverse * (num_alphas + 1) + match_levels,
+                                        minlength=len(matched_pair_ids) * (num_alphas + 1))
+        matches_per_level = matches_per_level.reshape(len(matched_pair_ids), num_alphas + 1)
+        matches_counts = np.cumsum(matches_per_level[:, ::-1], axis=1)[:, ::-1][:, 1:].T
+        matched_gt_id_count = gt_id_count[matched_pair_ids // num_tracker_ids, 0]
+        matched_tracker_id_count = tracker_id_count[0, matched_pair_ids % num_tracker_ids]
+
+        # Calculate association scores (AssA, AssRe, AssPr) for all alphas (rows) at once.
+        # First calculate scores per gt_id/tracker_id combo and then average over the number of detections. The sums
+        # over all combos are taken as np.sum of the dense (num_gt_ids x num_tracker_ids) arrays, but only the matched
+        # combos are visited (see _sparse_sums).
+        ass_a = matches_counts / np.maximum(1, matched_gt_id_count + matched_tracker_id_count - matches_counts)
+        ass_re = matches_counts / np.maximum(1, matched_gt_id_count)
+        ass_pr = matches_counts / np.maximum(1, matched_tracker_id_count)
+        ass_sums = self._sparse_sums(np.concatenate([matches_counts * ass for ass in (ass_a, ass_re, ass_pr)]),
+                                     matched_pair_ids, num_gt_ids * num_tracker_ids).reshape(3, num_alphas)
+        res['AssA'] = ass_sums[0] / np.maximum(1, res['HOTA_TP'])
+        res['AssRe'] = ass_sums[1] / np.maximum(1, res['HOTA_TP'])
+        res['AssPr'] = ass_sums[2] / np.maximum(1, res['HOTA_TP'])
 
         # Calculate final scores
         res['LocA'] = np.maximum(1e-10, res['LocA']) / np.maximum(1e-10, res['HOTA_TP'])
         res = self._compute_final_fields(res)
         return res
 
+    @staticmethod
+    def _accumulate_potential_matches(data):
+        """ Counts the potential matches between each gt_id and tracker_id over the whole sequence, where the match of
+        two dets in a timestep is weighted by their similarity normalised by the similarities of both dets to all other
+        dets in the timestep. Also counts the number of dets of each gt_id and tracker_id.
+        Timesteps are processed in groups with the same number of tracker dets, such that the similarities of a whole
+        group are normalised at once.
+        Returns all non-zero normalised similarities in timestep order as flat (gt_id, tracker_id) pair ids
+        (gt_id * num_tracker_ids + tracker_id) and values, so that accumulating them in this order is identical to
+        accumulating timestep by timestep.
+        """
+        num_gt_dets_t = np.array([len(ids) for ids in data['gt_ids']], dtype=int)
+        num_tracker_dets_t = np.array([len(ids) for ids in data['tracker_ids']], dtype=int)
+        all_gt_ids = np.concatenate(data['gt_ids']).astype(int)
+        all_tracker_ids = np.concatenate(data['tracker_ids']).astype(int)
+        gt_id_count = np.bincount(all_gt_ids, minlength=data['num_gt_ids']).astype(float)[:, np.newaxis]
+        tracker_id_count = np.bincount(all_tracker_ids, minlength=data['num_tracker_ids']).astype(float)[np.newaxis, :]
+
+        # Offsets of each timestep into all gt dets, all tracker dets and all flattened similarity scores.
+        gt_offsets = np.cumsum(num_gt_dets_t) - num_gt_dets_t
+        tracker_offsets = np.cumsum(num_tracker_dets_t) - num_tracker_dets_t
+        sim_offsets = np.cumsum(num_gt_dets_t * num_tracker_dets_t) - num_gt_dets_t * num_tracker_dets_t
+
+        positions = [np.zeros(0, dtype=int)]
+        pair_ids = [np.zeros(0, dtype=int)]
+        values = [np.zeros(0)]
+        non_empty = (num_gt_dets_t > 0) & (num_tracker_dets_t > 0)
+        for n in np.unique(num_tracker_dets_t[non_empty]):
+            timesteps = np.nonzero(non_empty & (num_tracker_dets_t == n))[0]
+            similarity = np.concatenate([data['similarity_scores'][t] for t in timesteps], axis=0)
+            row_t_idx = np.repeat(np.arange(len(timesteps)), num_gt_dets_t[timesteps])
+            row_t = timesteps[row_t_idx]
+            row_gt_det = np.arange(len(row_t)) - np.repeat(np.cumsum(num_gt_dets_t[timesteps])
+                                                           - num_gt_dets_t[timesteps], num_gt_dets_t[timesteps])
+            row_gt_det += gt_offsets[row_t]
+            tracker_dets = tracker_offsets[row_t][:, np.newaxis] + np.arange(n)[np.newaxis, :]
+
+            # Sum the similarities of each gt det (row) and each tracker det (column) within its timestep. These are
+            # summed timestep by timestep, as the order in which numpy sums depends on the shape of the array.
+            row_sums = np.concatenate([data['similarity_scores'][t].sum(1) for t in timesteps])
+            col_sums = np.concatenate([data['similarity_scores'][t].sum(0) for t in timesteps]).reshape(-1, n)
+            sim_iou_denom = col_sums[row_t_idx] + row_sums[:, np.newaxis] - similarity
+
+            # Only non-zero normalised similarities need to be accumulated.
+            rows, cols = np.nonzero((similarity != 0) & (sim_iou_denom > 0 + np.finfo('float').eps))
+            values.append(similarity[rows, cols] / sim_iou_denom[rows, cols])
+            pair_ids.append(all_gt_ids[row_gt_det[rows]] * data['num_tracker_ids']
+                            + all_tracker_ids[tracker_dets[rows, cols]])
+            positions.append(sim_offsets[row_t[rows]] + (row_gt_det[rows] - gt_offsets[row_t[rows]]) * n + cols)
+
+        # Sort into timestep order (the order of the flattened similarity scores).
+        order = np.argsort(np.concatenate(positions))
+        return np.concatenate(pair_ids)[order], np.concatenate(values)[order], gt_id_count, tracker_id_count
+
+    @staticmethod
+    def _sparse_sums(values, positions, size):
+        """ Returns np.sum of each row of a (len(values) x size) array which is zero apart from the given values at the
+        (sorted) positions. If the blockwise sums (see _block_sums) are identical to np.sum for this numpy version,
+        which is checked once per buffer size, only the blocks which contain values are built. Otherwise the dense rows
+        are built and summed with np.sum one at a time.
+        """
+        block_size = np.getbufsize()
+        if block_size not in _block_sums_match_np_sum:
+            rng = np.random.RandomState(0)
+            dense = rng.rand(8, 5 * block_size + 1001)
+            dense[0, rng.rand(dense.shape[1]) < 0.9] = 0
+            sums = HOTA._block_sums(dense, np.arange(dense.shape[1]), dense.shape[1], block_size)
+            _block_sums_match_np_sum[block_size] = all(sums[row] == np.sum(dense[row]) for row in range(len(dense)))
+        if _block_sums_match_np_sum[block_size]:
+            return HOTA._block_sums(values, positions, size, block_size)
+        dense_row = np.zeros(size)
+        sums = np.zeros(len(values))
+        for row, row_values in enumerate(values):
+            dense_row[positions] = row_values
+            sums[row] = np.sum(dense_row)
+        return sums
+
+    @staticmethod
+    def _block_sums(values, positions, size, block_size):
+        """ Sums each row of a (len(values) x size) array which is zero apart from the values at the (sorted) positions
+        in blocks of block_size (pairwise within each block, by numpy), adding up the block sums in order. This is how
+        numpy (1.9 up to at least 2.x) sums contiguous arrays with its buffer size as block_size. As zeros do not change
+        any partial sum, only the blocks which contain values are built (a bounded number at a time).
+        """
+        last_block = (size - 1) // block_size
+        last_block_size = size - last_block * block_size
+        blocks, block_positions = np.divmod(positions, block_size)
+        unique_blocks, block_inverse = np.unique(blocks, return_inverse=True)
+        block_sums = np.zeros((len(values), len(unique_blocks) + 1))  # Starting from zero, as numpy does
+        chunk_size = max(1, 128 // len(values))
+        for start in range(0, len(unique_blocks), chunk_size):
+            end = min(start + chunk_size, len(unique_blocks))
+            in_chunk = (block_inverse >= start) & (block_inverse < end)
+            dense_blocks = np.zeros((len(values), end - start, block_size))
+            dense_blocks[:, block_inverse[in_chunk] - start, block_positions[in_chunk]] = values[:, in_chunk]
+            block_sums[:, start + 1:end + 1] = dense_blocks.sum(2)
+            # The last block of the array may be shorter, which changes its pairwise summation.
+            if unique_blocks[end - 1] == last_block:
+                block_sums[:, end] = dense_blocks[:, -1, :last_block_size].sum(1)
+        return np.cumsum(block_sums, axis=1)[:, -1]
+
+    @staticmethod
+    def _lookup_pairs(pair_values, pair_ids, query_ids):
+        """Looks up the values of query_ids in the sorted pair_ids, giving zero for pairs which are not present"""
+        if len(pair_ids) == 0:
+            return np.zeros(query_ids.shape)
+        idx = np.minimum(np.searchsorted(pair_ids, query_ids), len(pair_ids) - 1)
+        return np.where(pair_ids[idx] == query_ids, pair_values[idx], 0)
+
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences"""
         res = {}
@@ -1,8 +1,10 @@
+import os
 import numpy as np
 from scipy.optimize import linear_sum_assignment
 from ._base_metric import _BaseMetric
 from .. import _timing
 from .. import utils
+from .._assignment import max_score_assignment_sparse
 
 
 class Identity(_BaseMetric):
@@ -13,6 +15,10 @@ class Identity(_BaseMetric):
         """Default class config values"""
         default_config = {
             'THRESHOLD': 0.5,  # Similarity score threshold required for a IDTP match. Default 0.5.
+            'THRESHOLDS': None,  # If not None, a list of thresholds over which the metrics are additionally calculated
+            # as curves (the '_curve' fields), from a single pass over the similarities of the sequence.
+            'SPARSE_THRESHOLD': 1000000,  # Number of (gt_id, tracker_id) pairs above which the ID assignment is solved
+            # only over the pairs which potentially match (instead of over a dense padded cost matrix). None for never.
             'PRINT_CONFIG': True,  # Whether to print the config information on init. Default: False.
         }
         return default_config
@@ -27,80 +33,128 @@ class Identity(_BaseMetric):
         # Configuration options:
         self.config = utils.init_config(config, self.get_default_config(), self.get_name())
         self.threshold = float(self.config['THRESHOLD'])
+        self.sparse_threshold = self.config['SPARSE_THRESHOLD']
+
+        # Curves of the fields over multiple thresholds
+        if self.config['THRESHOLDS'] is not None:
+            self.plottable = True
+            self.array_labels = np.array(self.config['THRESHOLDS'], dtype=float)
+            self.integer_array_fields = ['IDTP_curve', 'IDFN_curve', 'IDFP_curve']
+            self.float_array_fields = ['IDF1_curve', 'IDR_curve', 'IDP_curve']
+            self.fields = self.fields + self.float_array_fields + self.integer_array_fields
 
     @_timing.time
     def eval_sequence(self, data):
-        """Calculates ID metrics for one sequence"""
+        """Calculates ID metrics for one sequence (and their curves over all thresholds, if configured)"""
         # Initialise results
         res = {}
-        for field in self.fields:
+        for field in self.float_fields + self.integer_fields:
             res[field] = 0
+        for field in self.float_array_fields + self.integer_array_fields:
+            res[field] = np.zeros(len(self.array_labels))
 
         # Return result quickly if tracker or gt sequence is empty
         if data['num_tracker_dets'] == 0:
             res['IDFN'] = data['num_gt_dets']
+            if len(self.array_labels) > 0:
+                res['IDFN_curve'][:] = data['num_gt_dets']
             return res
         if data['num_gt_dets'] == 0:
             res['IDFP'] = data['num_tracker_dets']
+            if len(self.array_labels) > 0:
+                res['IDFP_curve'][:] = data['num_tracker_dets']
             return res
 
-        # Variables counting global association
-        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        gt_id_count = np.zeros(data['num_gt_ids'])
-        tracker_id_count = np.zeros(data['num_tracker_ids'])
+        # Count the potential matches between ids over all timesteps for all thresholds at once. The level of a pair of
+        # dets is the number of thresholds for which it is a potential match (similarity >= threshold), so that the
+        # counts of each (gt_id, tracker_id) pair for each threshold are given by its cumulative histogram over the
+        # levels (summed from the highest level down).
+        num_gt_ids = data['num_gt_ids']
+        num_tracker_ids = data['num_tracker_ids']
+        thresholds = np.unique(np.append(self.array_labels, self.threshold))
+        match_pair_ids = [np.zeros(0, dtype=int)]
+        match_levels = [np.zeros(0, dtype=int)]
+        for gt_ids_t, tracker_ids_t, similarity in zip(data['gt_ids'], data['tracker_ids'], data['similarity_scores']):
+            match_idx_gt, match_idx_tracker = np.nonzero(np.greater_equal(similarity, thresholds[0]))
+            match_pair_ids.append(gt_ids_t[match_idx_gt] * num_tracker_ids + tracker_ids_t[match_idx_tracker])
+            match_levels.append(np.searchsorted(thresholds, similarity[match_idx_gt, match_idx_tracker], side='right'))
+        pair_ids, pair_inverse = np.unique(np.concatenate(match_pair_ids).astype(int), return_inverse=True)
+        pair_counts_per_level = np.bincount(pair_inverse * (len(thresholds) + 1) + np.concatenate(match_levels),
+                                            minlength=len(pair_ids) * (len(thresholds) + 1))
+        pair_counts_per_level = pair_counts_per_level.reshape(len(pair_ids), len(thresholds) + 1)
+        pair_counts = np.cumsum(pair_counts_per_level[:, ::-1], axis=1)[:, ::-1][:, 1:]
+
+        # Calculate the total number of dets for each gt_id and tracker_id.
+        gt_id_count = np.bincount(np.concatenate(data['gt_ids']).astype(int), minlength=num_gt_ids).astype(float)
+        tracker_id_count = np.bincount(np.concatenate(data['tracker_ids']).astype(int),
+                                       minlength=num_tracker_ids).astype(float)
+
+        # Solve one assignment for each threshold.
+        id_counts = {}
+        for k, threshold in enumerate(thresholds):
+            is_potential_match = pair_counts[:, k] > 0
+            id_counts[threshold] = self._assign_ids(pair_ids[is_potential_match], pair_counts[is_potential_match, k],
+                                                    gt_id_count, tracker_id_count, num_gt_ids, num_tracker_ids)
+        res['IDTP'], res['IDFN'], res['IDFP'] = id_counts[self.threshold]
+        for field_idx, field in enumerate(self.integer_array_fields):
+            res[field] = np.array([id_counts[threshold][field_idx] for threshold in self.array_labels], dtype=float)
 
-        # First loop through each timestep and accumulate global track information.
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Count the potential matches between ids in each timestep
-            matches_mask = np.greater_equal(data['similarity_scores'][t], self.threshold)
-            match_idx_gt, match_idx_tracker = np.nonzero(matches_mask)
-            potential_matches_count[gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker]] += 1
+        # Calculate final ID scores
+        res = self._compute_final_fields(res)
+        return res
 
-            # Calculate the total number of dets for each gt_id and tracker_id.
-            gt_id_count[gt_ids_t] += 1
-            tracker_id_count[tracker_ids_t] += 1
+    def _assign_ids(self, pair_ids, potential_matches_count, gt_id_count, tracker_id_count, num_gt_ids,
+                    num_tracker_ids):
+        """ Finds the optimal assignment between gt_ids and tracker_ids (minimising IDFN + IDFP), given the number of
+        potential matches of each (gt_id, tracker_id) pair which potentially matches at least once (as flat pair ids,
+        gt_id * num_tracker_ids + tracker_id). Returns the IDTP, IDFN and IDFP of this assignment.
+        """
+        if self.sparse_threshold is not None and num_gt_ids * num_tracker_ids > self.sparse_threshold:
+            # Minimising IDFN + IDFP is equivalent to maximising the summed potential matches of the assigned pairs
+            # (the IDTP), so the assignment is only solved over the pairs which potentially match.
+            matched = max_score_assignment_sparse(pair_ids // num_tracker_ids, pair_ids % num_tracker_ids,
+                                                  potential_matches_count.astype(float))
+            idtp = potential_matches_count[matched].sum().astype(int)
+            idfn = (gt_id_count.sum() - idtp).astype(int)
+            idfp = (tracker_id_count.sum() - idtp).astype(int)
+            return idtp, idfn, idfp
+
+        potential_matches_count_mat = np.zeros(num_gt_ids * num_tracker_ids)
+        potential_matches_count_mat[pair_ids] = potential_matches_count
+        potential_matches_count_mat = potential_matches_count_mat.reshape(num_gt_ids, num_tracker_ids)
 
         # Calculate optimal assignment cost matrix for ID metrics
-        num_gt_ids = data['num_gt_ids']
-        num_tracker_ids = data['num_tracker_ids']
         fp_mat = np.zeros((num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
         fn_mat = np.zeros((num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
         fp_mat[num_gt_ids:, :num_tracker_ids] = 1e10
         fn_mat[:num_gt_ids, num_tracker_ids:] = 1e10
-        for gt_id in range(num_gt_ids):
-            fn_mat[gt_id, :num_tracker_ids] = gt_id_count[gt_id]
-            fn_mat[gt_id, num_tracker_ids + gt_id] = gt_id_count[gt_id]
-        for tracker_id in range(num_tracker_ids):
-            fp_mat[:num_gt_ids, tracker_id] = tracker_id_count[tracker_id]
-            fp_mat[tracker_id + num_gt_ids, tracker_id] = tracker_id_count[tracker_id]
-        fn_mat[:num_gt_ids, :num_tracker_ids] -= potential_matches_count
-        fp_mat[:num_gt_ids, :num_tracker_ids] -= potential_matches_count
+        fn_mat[:num_gt_ids, :num_tracker_ids] = gt_id_count[:, np.newaxis] - potential_matches_count_mat
+        fn_mat[np.arange(num_gt_ids), num_tracker_ids + np.arange(num_gt_ids)] = gt_id_count
+        fp_mat[:num_gt_ids, :num_tracker_ids] = tracker_id_count[np.newaxis, :] - potential_matches_count_mat
+        fp_mat[num_gt_ids + np.arange(num_tracker_ids), np.arange(num_tracker_ids)] = tracker_id_count
 
         # Hungarian algorithm
         match_rows, match_cols = linear_sum_assignment(fn_mat + fp_mat)
 
         # Accumulate basic statistics
-        res['IDFN'] = fn_mat[match_rows, match_cols].sum().astype(np.int)
-        res['IDFP'] = fp_mat[match_rows, match_cols].sum().astype(np.int)
-        res['IDTP'] = (gt_id_count.sum() - res['IDFN']).astype(np.int)
-
-        # Calculate final ID scores
-        res = self._compute_final_fields(res)
-        return res
+        idfn = fn_mat[match_rows, match_cols].sum().astype(int)
+        idfp = fp_mat[match_rows, match_cols].sum().astype(int)
+        idtp = (gt_id_count.sum() - idfn).astype(int)
+        return idtp, idfn, idfp
 
     def combine_classes_class_averaged(self, all_res, ignore_empty_classes=False):
         """Combines metrics across all classes by averaging over the class values.
         If 'ignore_empty_classes' is True, then it only sums over classes with at least one gt or predicted detection.
         """
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             if ignore_empty_classes:
                 res[field] = self._combine_sum({k: v for k, v in all_res.items()
                                                 if v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps},
                                                field)
             else:
                 res[field] = self._combine_sum({k: v for k, v in all_res.items()}, field)
-        for field in self.float_fields:
+        for field in self.float_fields + self.float_array_fields:
             if ignore_empty_classes:
                 res[field] = np.mean([v[field] for v in all_res.values()
                                       if v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps], axis=0)
@@ -111,7 +165,7 @@ class Identity(_BaseMetric):
     def combine_classes_det_averaged(self, all_res):
         """Combines metrics across all classes by averaging over the detection values"""
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             res[field] = self._combine_sum(all_res, field)
         res = self._compute_final_fields(res)
         return res
@@ -119,7 +173,7 @@ class Identity(_BaseMetric):
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences"""
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             res[field] = self._combine_sum(all_res, field)
         res = self._compute_final_fields(res)
         return res
@@ -132,4 +186,36 @@ class Identity(_BaseMetric):
         res['IDR'] = res['IDTP'] / np.maximum(1.0, res['IDTP'] + res['IDFN'])
         res['IDP'] = res['IDTP'] / np.maximum(1.0, res['IDTP'] + res['IDFP'])
         res['IDF1'] = res['IDTP'] / np.maximum(1.0, res['IDTP'] + 0.5 * res['IDFP'] + 0.5 * res['IDFN'])
+
+        if 'IDTP_curve' in res.keys():
+            res['IDR_curve'] = res['IDTP_curve'] / np.maximum(1.0, res['IDTP_curve'] + res['IDFN_curve'])
+            res['IDP_curve'] = res['IDTP_curve'] / np.maximum(1.0, res['IDTP_curve'] + res['IDFP_curve'])
+            res['IDF1_curve'] = res['IDTP_curve'] / np.maximum(
+                1.0, res['IDTP_curve'] + 0.5 * res['IDFP_curve'] + 0.5 * res['IDFN_curve'])
         return res
+
+    def plot_single_tracker_results(self, table_res, tracker, cls, output_folder):
+        """Create plot of the curves over all thresholds (only if THRESHOLDS are configured)"""
+        if not self.plottable:
+            return
+
+        # Only loaded when run to reduce minimum requirements
+        from matplotlib import pyplot as plt
+
+        res = table_res['COMBINED_SEQ']
+        curve_fields = ['IDF1_curve', 'IDR_curve', 'IDP_curve']
+        for name, style in zip(curve_fields, ['r', 'b', 'g']):
+            plt.plot(self.array_labels, res[name], style)
+        plt.xlabel('threshold')
+        plt.ylabel('score')
+        plt.title(tracker + ' - ' + cls)
+        plt.axis([np.min(self.array_labels), np.max(self.array_labels), 0, 1])
+        legend = []
+        for name in curve_fields:
+            legend += [name[:-len('_curve')] + ' (' + str(np.round(np.mean(res[name]), 2)) + ')']
+        plt.legend(legend, loc='lower left')
+        out_file = os.path.join(output_folder, cls + '_identity_plot.pdf')
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        plt.savefig(out_file)
+        plt.savefig(out_file.replace('.pdf', '.png'))
+        plt.clf()
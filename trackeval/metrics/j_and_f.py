@@ -70,10 +70,8 @@ class JAndF(_BaseMetric):
 
         # perform matching
         if self.optim_type == 'J&F':
-            f = np.zeros_like(j)
-            for k in range(num_tracker_ids):
-                for i in range(num_gt_ids):
-                    f[k, i, :] = self._compute_f(gt_dets, tracker_dets, k, i, bound_th)
+            pairs = list(np.ndindex(num_tracker_ids, num_gt_ids))
+            f = self._compute_f(gt_dets, tracker_dets, pairs, bound_th).reshape(j.shape)
             optim_metrics = (np.mean(j, axis=2) + np.mean(f, axis=2)) / 2
             row_ind, col_ind = linear_sum_assignment(- optim_metrics)
             j_m = j[row_ind, col_ind, :]
@@ -82,9 +80,7 @@ class JAndF(_BaseMetric):
             optim_metrics = np.mean(j, axis=2)
             row_ind, col_ind = linear_sum_assignment(- optim_metrics)
             j_m = j[row_ind, col_ind, :]
-            f_m = np.zeros_like(j_m)
-            for i, (tr_ind, gt_ind) in enumerate(zip(row_ind, col_ind)):
-                f_m[i] = self._compute_f(gt_dets, tracker_dets, tr_ind, gt_ind, bound_th)
+            f_m = self._compute_f(gt_dets, tracker_dets, list(zip(row_ind, col_ind)), bound_th)
         else:
             raise TrackEvalException('Unsupported optimization type %s for J&F metric.' % self.optim_type)
 
@@ -204,70 +200,109 @@ class JAndF(_BaseMetric):
         return bmap
 
     @staticmethod
-    def _compute_f(gt_data, tracker_data, tracker_data_id, gt_id, bound_th):
+    def _compute_boundaries(mask, structuring_element):
         """
-        Perform F computation for a given gt and a given tracker ID. Adapted from
+        Decodes a mask and computes its boundary map and dilated boundary map inside the mask's bounding box, padded by
+        the dilation radius plus one pixel (as boundary pixels are offset by 1/2 pixel towards the origin). Outside of
+        this region both maps are zero. Adapted from https://github.com/davisvideochallenge/davis2017-evaluation
+        :param mask: the encoded mask
+        :param structuring_element: the structuring element for the dilation of the boundary map
+        :return: the boundary map and dilated boundary map of the region, the (row, col) offset of the region and the
+                    number of boundary pixels
+        """
+
+        # Only loaded when run to reduce minimum requirements
+        from pycocotools import mask as mask_utils
+        import cv2
+
+        x, y, w, h = mask_utils.toBbox(mask)
+        if w == 0 or h == 0:
+            return None, None, None, 0
+        pad = structuring_element.shape[0] // 2 + 1
+        y0, x0 = max(int(y) - pad, 0), max(int(x) - pad, 0)
+        y1, x1 = min(int(y + h) + pad, mask['size'][0]), min(int(x + w) + pad, mask['size'][1])
+        curr_mask = mask_utils.decode(mask)[y0:y1, x0:x1]
+
+        # Get the pixel boundaries of the mask
+        boundary = JAndF._seg2bmap(curr_mask)
+
+        # dil = binary_dilation(boundary, disk(bound_pix))
+        dil = cv2.dilate(boundary.astype(np.uint8), structuring_element)
+
+        return boundary, dil, (y0, x0), np.sum(boundary)
+
+    @staticmethod
+    def _compute_f(gt_data, tracker_data, pairs, bound_th):
+        """
+        Perform F computation for the given pairs of tracker and gt IDs. Adapted from
         https://github.com/davisvideochallenge/davis2017-evaluation
+        Each timestep's boundary maps are cached by ID, so each mask is decoded and its boundary map and dilated
+        boundary map are computed only once, however many pairs it is part of. Boundary maps are only computed
+        inside the masks' bounding boxes (see _compute_boundaries), and matches are counted where these overlap.
         :param gt_data: the encoded gt masks
         :param tracker_data: the encoded tracker masks
-        :param tracker_data_id: the tracker ID
-        :param gt_id: the ground truth ID
+        :param pairs: the (tracker ID, gt ID) pairs
         :param bound_th: boundary threshold parameter
-        :return: the F value for the given tracker and gt ID
+        :return: the F values for the given pairs (format: numpy array of shape (len(pairs), num_timesteps))
         """
 
         # Only loaded when run to reduce minimum requirements
-        from pycocotools import mask as mask_utils
         from skimage.morphology import disk
-        import cv2
 
-        f = np.zeros(len(gt_data))
+        f = np.zeros((len(pairs), len(gt_data)))
+        if len(pairs) == 0 or len(gt_data) == 0:
+            return f
+
+        # All masks of a sequence have the same (frame) size, so the structuring element is computed once
+        frame_shape = tracker_data[0][pairs[0][0]]['size']
+        bound_pix = bound_th if bound_th >= 1 - np.finfo('float').eps else \
+            np.ceil(bound_th * np.linalg.norm(frame_shape))
+        structuring_element = disk(bound_pix).astype(np.uint8)
 
         for t, (gt_masks, tracker_masks) in enumerate(zip(gt_data, tracker_data)):
-            curr_tracker_mask = mask_utils.decode(tracker_masks[tracker_data_id])
-            curr_gt_mask = mask_utils.decode(gt_masks[gt_id])
-            
-            bound_pix = bound_th if bound_th >= 1 - np.finfo('float').eps else \
-                np.ceil(bound_th * np.linalg.norm(curr_tracker_mask.shape))
-
-            # Get the pixel boundaries of both masks
-            fg_boundary = JAndF._seg2bmap(curr_tracker_mask)
-            gt_boundary = JAndF._seg2bmap(curr_gt_mask)
-
-            # fg_dil = binary_dilation(fg_boundary, disk(bound_pix))
-            fg_dil = cv2.dilate(fg_boundary.astype(np.uint8), disk(bound_pix).astype(np.uint8))
-            # gt_dil = binary_dilation(gt_boundary, disk(bound_pix))
-            gt_dil = cv2.dilate(gt_boundary.astype(np.uint8), disk(bound_pix).astype(np.uint8))
-
-            # Get the intersection
-            gt_match = gt_boundary * fg_dil
-            fg_match = fg_boundary * gt_dil
-
-            # Area of the intersection
-            n_fg = np.sum(fg_boundary)
-            n_gt = np.sum(gt_boundary)
-
-            # % Compute precision and recall
-            if n_fg == 0 and n_gt > 0:
-                precision = 1
-                recall = 0
-            elif n_fg > 0 and n_gt == 0:
-                precision = 0
-                recall = 1
-            elif n_fg == 0 and n_gt == 0:
-                precision = 1
-                recall = 1
-            else:
-                precision = np.sum(fg_match) / float(n_fg)
-                recall = np.sum(gt_match) / float(n_gt)
-
-            # Compute F measure
-            if precision + recall == 0:
-                f_val = 0
-            else:
-                f_val = 2 * precision * recall / (precision + recall)
-
-            f[t] = f_val
+            gt_boundaries = {}
+            tracker_boundaries = {}
+            for pair_idx, (tracker_data_id, gt_id) in enumerate(pairs):
+                if tracker_data_id not in tracker_boundaries:
+                    tracker_boundaries[tracker_data_id] = JAndF._compute_boundaries(tracker_masks[tracker_data_id],
+                                                                                    structuring_element)
+                if gt_id not in gt_boundaries:
+                    gt_boundaries[gt_id] = JAndF._compute_boundaries(gt_masks[gt_id], structuring_element)
+                fg_boundary, fg_dil, fg_offset, n_fg = tracker_boundaries[tracker_data_id]
+                gt_boundary, gt_dil, gt_offset, n_gt = gt_boundaries[gt_id]
+
+                # % Compute precision and recall
+                if n_fg == 0 and n_gt > 0:
+                    precision = 1
+                    recall = 0
+                elif n_fg > 0 and n_gt == 0:
+                    precision = 0
+                    recall = 1
+                elif n_fg == 0 and n_gt == 0:
+                    precision = 1
+                    recall = 1
+                else:
+                    # Get the intersection (inside the overlap of both regions, which may be empty)
+                    y0, x0 = max(fg_offset[0], gt_offset[0]), max(fg_offset[1], gt_offset[1])
+                    y1 = max(y0, min(fg_offset[0] + fg_boundary.shape[0], gt_offset[0] + gt_boundary.shape[0]))
+                    x1 = max(x0, min(fg_offset[1] + fg_boundary.shape[1], gt_offset[1] + gt_boundary.shape[1]))
+                    fg_region = (slice(y0 - fg_offset[0], y1 - fg_offset[0]),
+                                 slice(x0 - fg_offset[1], x1 - fg_offset[1]))
+                    gt_region = (slice(y0 - gt_offset[0], y1 - gt_offset[0]),
+                                 slice(x0 - gt_offset[1], x1 - gt_offset[1]))
+                    gt_match = gt_boundary[gt_region] * fg_dil[fg_region]
+                    fg_match = fg_boundary[fg_region] * gt_dil[gt_region]
+
+                    precision = np.sum(fg_match) / float(n_fg)
+                    recall = np.sum(gt_match) / float(n_gt)
+
+                # Compute F measure
+                if precision + recall == 0:
+                    f_val = 0
+                else:
+                    f_val = 2 * precision * recall / (precision + recall)
+
+                f[pair_idx, t] = f_val
 
         return f
 
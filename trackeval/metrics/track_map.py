@@ -1,7 +1,6 @@
 import numpy as np
 from ._base_metric import _BaseMetric
 from .. import _timing
-from functools import partial
 from .. import utils
 from ..utils import TrackEvalException
 
@@ -26,6 +25,8 @@ class TrackMAP(_BaseMetric):
             'RECALL_THRESHOLDS': np.linspace(0.0, 1.00, int(np.round((1.00 - 0.0) / 0.01) + 1), endpoint=True),
             # recall thresholds at which precision is evaluated
             'MAX_DETECTIONS': 0,  # limit the maximum number of considered tracks per sequence (0 for unlimited)
+            'MAX_DETECTIONS_LIST': None,  # If not None, a list of additional MAX_DETECTIONS values (e.g. [10, 50, 300])
+            # for which AP and AR are also calculated in the same evaluation (as AP_<lbl>_maxDet<n>, AR_<lbl>_maxDet<n>)
             'PRINT_CONFIG': True
         }
         return default_config
@@ -54,9 +55,20 @@ class TrackMAP(_BaseMetric):
         self.rec_thrs = self.config['RECALL_THRESHOLDS']
 
         self.maxDet = self.config['MAX_DETECTIONS']
-        self.float_array_fields = ['AP_' + lbl for lbl in self.lbls] + ['AR_' + lbl for lbl in self.lbls]
+        # All maxDet values are evaluated from the same matches, as the per-sequence dt results are sorted by score
+        self.max_dets = [self.maxDet]
+        self.max_det_suffixes = ['']
+        if self.config['MAX_DETECTIONS_LIST'] is not None:
+            self.max_dets += [int(max_det) for max_det in self.config['MAX_DETECTIONS_LIST']]
+            self.max_det_suffixes += ['_maxDet' + str(max_det) for max_det in self.max_dets[1:]]
+        for max_det in self.max_dets:
+            if max_det < 0:
+                raise TrackEvalException("Number of maximum detections must be >= 0, but is set to %i" % max_det)
+
+        self.float_array_fields = [field + lbl + suffix for suffix in self.max_det_suffixes for field in ['AP_', 'AR_']
+                                   for lbl in self.lbls]
+        self.summary_fields = self.float_array_fields[:2 * len(self.lbls)]
         self.fields = self.float_array_fields
-        self.summary_fields = self.float_array_fields
 
     @_timing.time
     def eval_sequence(self, data):
@@ -93,6 +105,11 @@ class TrackMAP(_BaseMetric):
         ious = self._compute_track_ious(data['dt_tracks'], data['gt_tracks'], iou_function=data['iou_type'],
                                         boxformat=boxformat)
 
+        # The dt results are stored sorted by score (stable, so already sorted dt tracks keep their order), such that
+        # the results of all sequences can be merged by score in combine_sequences.
+        dt_scores = np.asarray(data['dt_track_scores'])
+        dt_order = np.argsort(-dt_scores, kind="mergesort")
+
         for mask_idx in range(self.num_ig_masks):
             gt_ig_mask = gt_ig_masks[mask_idx]
 
@@ -113,39 +130,8 @@ class TrackMAP(_BaseMetric):
             gt_ig = np.array([gt_ig_mask[idx] for idx in gt_idx])
             dt_ig = np.zeros((num_thrs, num_dt))
 
-            for iou_thr_idx, iou_thr in enumerate(self.array_labels):
-                if len(ious_sorted) == 0:
-                    break
-
-                for dt_idx, _dt in enumerate(dt_ids):
-                    iou = min([iou_thr, 1 - 1e-10])
-                    # information about best match so far (m=-1 -> unmatched)
-                    # store the gt_idx which matched for _dt
-                    m = -1
-                    for gt_idx, _ in enumerate(gt_ids):
-                        # if this gt already matched continue
-                        if gt_m[iou_thr_idx, gt_idx] > 0:
-                            continue
-                        # if _dt matched to reg gt, and on ignore gt, stop
-                        if m > -1 and gt_ig[m] == 0 and gt_ig[gt_idx] == 1:
-                            break
-                        # continue to next gt unless better match made
-                        if ious_sorted[dt_idx, gt_idx] < iou - np.finfo('float').eps:
-                            continue
-                        # if match successful and best so far, store appropriately
-                        iou = ious_sorted[dt_idx, gt_idx]
-                        m = gt_idx
-
-                    # No match found for _dt, go to next _dt
-                    if m == -1:
-                        continue
-
-                    # if gt to ignore for some reason update dt_ig.
-                    # Should not be used in evaluation.
-                    dt_ig[iou_thr_idx, dt_idx] = gt_ig[m]
-                    # _dt match found, update gt_m, and dt_m with "id"
-                    dt_m[iou_thr_idx, dt_idx] = gt_ids[m]
-                    gt_m[iou_thr_idx, m] = _dt
+            if len(ious_sorted) > 0:
+                self._match_greedy(ious_sorted, gt_ig, gt_ids, dt_ids, gt_m, dt_m, dt_ig)
 
             dt_ig_mask = dt_ig_masks[mask_idx]
 
@@ -156,17 +142,89 @@ class TrackMAP(_BaseMetric):
             dt_ig = np.logical_or(dt_ig, np.logical_and(dt_m == -1, dt_ig_mask))
             # store results for given video and category
             res[mask_idx] = {
-                "dt_ids": dt_ids,
+                "dt_ids": [dt_ids[i] for i in dt_order],
                 "gt_ids": gt_ids,
-                "dt_matches": dt_m,
+                "dt_matches": dt_m[:, dt_order],
                 "gt_matches": gt_m,
-                "dt_scores": data['dt_track_scores'],
+                "dt_scores": dt_scores[dt_order],
                 "gt_ignore": gt_ig,
-                "dt_ignore": dt_ig,
+                "dt_ignore": dt_ig[:, dt_order],
             }
 
         return res
 
+    def _match_greedy(self, ious, gt_ig, gt_ids, dt_ids, gt_m, dt_m, dt_ig):
+        """ Greedily matches each dt (in order) to the best not yet matched gt for each IoU threshold (COCO-style),
+        where gts are sorted to have ignored gts last, and a dt matched to a regular gt is never matched to an ignored
+        gt. The matched gt (dt) ids are stored in gt_m (dt_m), and whether a dt is matched to an ignored gt in dt_ig.
+
+        The dts are matched one after the other, but the gt of each dt is selected for all thresholds at once: first
+        among the regular gts and, for thresholds without a regular match, among the ignored gts. Gts with an IoU below
+        the lowest threshold minus (num_gt + 1) * eps can never be selected (see _select_gts), so only the remaining
+        candidate gts of each dt are considered.
+        """
+        eps = np.finfo('float').eps
+        num_gt = len(gt_ids)
+        iou_thrs = np.minimum(self.array_labels, 1 - 1e-10)
+        cand_dt, cand_gt = np.nonzero(ious >= np.min(iou_thrs) - (num_gt + 1) * eps)
+        cand_splits = np.searchsorted(cand_dt, np.arange(1, len(dt_ids)))
+        gt_ig = np.asarray(gt_ig)
+        gt_ids = np.asarray(gt_ids)
+        all_thrs = np.arange(len(iou_thrs))
+
+        # A gt counts as matched once matched to a dt with an id > 0 (as in the original implementation).
+        gt_matched = np.zeros((len(iou_thrs), num_gt), dtype=bool)
+        for dt_idx, cand_gts in enumerate(np.split(cand_gt, cand_splits)):
+            if len(cand_gts) == 0:
+                continue
+            cand_ig = gt_ig[cand_gts] == 1
+            if not cand_ig.any():
+                m = self._select_gts(ious[dt_idx, cand_gts], ~gt_matched[:, cand_gts], iou_thrs)
+                m[m > -1] = cand_gts[m[m > -1]]
+            else:
+                m = np.full(len(iou_thrs), -1)
+                for stage_gts in [cand_gts[~cand_ig], cand_gts[cand_ig]]:
+                    thrs = all_thrs[m == -1]
+                    if len(stage_gts) == 0 or len(thrs) == 0:
+                        continue
+                    selected = self._select_gts(ious[dt_idx, stage_gts],
+                                                ~gt_matched[thrs[:, np.newaxis], stage_gts[np.newaxis, :]],
+                                                iou_thrs[thrs])
+                    m[thrs[selected > -1]] = stage_gts[selected[selected > -1]]
+
+            # For each threshold with a match, update gt_m, dt_m (with "id") and dt_ig (if the gt is to be ignored)
+            thrs = all_thrs[m > -1]
+            dt_ig[thrs, dt_idx] = gt_ig[m[thrs]]
+            dt_m[thrs, dt_idx] = gt_ids[m[thrs]]
+            gt_m[thrs, m[thrs]] = dt_ids[dt_idx]
+            gt_matched[thrs, m[thrs]] = dt_ids[dt_idx] > 0
+
+    @staticmethod
+    def _select_gts(gt_ious, is_eligible, iou_thrs):
+        """ Selects the gt which a dt is matched to for each threshold (rows of is_eligible), among the eligible gts (in
+        order) with the given IoUs, or -1 if there is none. As in the original scan over the gts, each gt with an IoU of
+        at least the current best IoU (initially the threshold) minus eps becomes the new best match.
+        This selects the gt with the highest IoU, and among equal IoUs the last one (found with argmax on the reversed
+        IoUs). Only if a later gt has an IoU within eps below the highest IoU it replaces that gt (and may be replaced by
+        further gts in turn), so the original scan is used for these (rare) thresholds.
+        """
+        eps = np.finfo('float').eps
+        num_gt = len(gt_ious)
+        if num_gt == 1:
+            return np.where(is_eligible[:, 0] & (gt_ious[0] >= iou_thrs - eps), 0, -1)
+        ious = np.where(is_eligible, gt_ious, -np.inf)
+        best_ious = np.max(ious, axis=1)
+        last_best = num_gt - 1 - np.argmax(ious[:, ::-1] == best_ious[:, np.newaxis], axis=1)
+        selected = np.where(best_ious >= iou_thrs - eps, last_best, -1)
+        is_near_best = (ious >= best_ious[:, np.newaxis] - eps) & (np.arange(num_gt) > last_best[:, np.newaxis])
+        for thr_idx in np.flatnonzero(is_near_best.any(1) & (selected > -1)):
+            iou = iou_thrs[thr_idx]
+            for gt_idx in np.flatnonzero(is_eligible[thr_idx]):
+                if gt_ious[gt_idx] >= iou - eps:
+                    iou = gt_ious[gt_idx]
+                    selected[thr_idx] = gt_idx
+        return selected
+
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences. Computes precision and recall values based on track matches.
         Adapted from https://github.com/TAO-Dataset/
@@ -176,103 +234,105 @@ class TrackMAP(_BaseMetric):
 
         # -1 for absent categories
         precision = -np.ones(
-            (num_thrs, num_recalls, self.num_ig_masks)
+            (len(self.max_dets), num_thrs, num_recalls, self.num_ig_masks)
         )
-        recall = -np.ones((num_thrs, self.num_ig_masks))
+        recall = -np.ones((len(self.max_dets), num_thrs, self.num_ig_masks))
+
+        # Results are None for all ignore masks of sequences without any gt and dt tracks
+        seq_results = [res for res in all_res.values() if res[0] is not None]
+
+        # The dt results of each sequence are sorted by score, so all sequences are merged by score with a stable sort
+        # (timsort, which merges the pre-sorted runs), once for all ignore masks and maxDet values. Each sequence's dt
+        # results are then written directly to their merged positions, together with their rank in the sequence.
+        # Only the tracks needed for the largest maxDet (0 for unlimited) are merged.
+        merge_max_det = None if 0 in self.max_dets else max(self.max_dets)
+        seq_scores = [res[0]["dt_scores"][0:merge_max_det] for res in seq_results]
+        num_dt = sum(len(scores) for scores in seq_scores)
+        merged_pos = np.empty(num_dt, dtype=int)
+        if num_dt > 0:
+            merged_pos[np.argsort(-np.concatenate(seq_scores), kind="mergesort")] = np.arange(num_dt)
+        seq_merged_pos = np.split(merged_pos, np.cumsum([len(scores) for scores in seq_scores])[:-1])
+        merged_seq_rank = np.empty(num_dt, dtype=int)
+        for pos in seq_merged_pos:
+            merged_seq_rank[pos] = np.arange(len(pos))
 
         for ig_idx in range(self.num_ig_masks):
-            ig_idx_results = [res[ig_idx] for res in all_res.values() if res[ig_idx] is not None]
-
-            # Remove elements which are None
-            if len(ig_idx_results) == 0:
+            if len(seq_results) == 0:
                 continue
 
-            # Append all scores: shape (N,)
-            # limit considered tracks for each sequence if maxDet > 0
-            if self.maxDet == 0:
-                dt_scores = np.concatenate([res["dt_scores"] for res in ig_idx_results], axis=0)
-
-                dt_idx = np.argsort(-dt_scores, kind="mergesort")
-
-                dt_m = np.concatenate([e["dt_matches"] for e in ig_idx_results],
-                                      axis=1)[:, dt_idx]
-                dt_ig = np.concatenate([e["dt_ignore"] for e in ig_idx_results],
-                                       axis=1)[:, dt_idx]
-            elif self.maxDet > 0:
-                dt_scores = np.concatenate([res["dt_scores"][0:self.maxDet] for res in ig_idx_results], axis=0)
-
-                dt_idx = np.argsort(-dt_scores, kind="mergesort")
-
-                dt_m = np.concatenate([e["dt_matches"][:, 0:self.maxDet] for e in ig_idx_results],
-                                      axis=1)[:, dt_idx]
-                dt_ig = np.concatenate([e["dt_ignore"][:, 0:self.maxDet] for e in ig_idx_results],
-                                       axis=1)[:, dt_idx]
-            else:
-                raise Exception("Number of maximum detections must be >= 0, but is set to %i" % self.maxDet)
-
-            gt_ig = np.concatenate([res["gt_ignore"] for res in ig_idx_results])
+            gt_ig = np.concatenate([res[ig_idx]["gt_ignore"] for res in seq_results])
             # num gt anns to consider
             num_gt = np.count_nonzero(gt_ig == 0)
 
             if num_gt == 0:
                 continue
 
-            tps = np.logical_and(dt_m != -1, np.logical_not(dt_ig))
-            fps = np.logical_and(dt_m == -1, np.logical_not(dt_ig))
-
-            tp_sum = np.cumsum(tps, axis=1).astype(dtype=np.float)
-            fp_sum = np.cumsum(fps, axis=1).astype(dtype=np.float)
+            dt_m = np.empty((num_thrs, num_dt))
+            dt_ig = np.empty((num_thrs, num_dt), dtype=bool)
+            for res, pos in zip(seq_results, seq_merged_pos):
+                dt_m[:, pos] = res[ig_idx]["dt_matches"][:, 0:merge_max_det]
+                dt_ig[:, pos] = res[ig_idx]["dt_ignore"][:, 0:merge_max_det]
 
-            for iou_thr_idx, (tp, fp) in enumerate(zip(tp_sum, fp_sum)):
-                tp = np.array(tp)
-                fp = np.array(fp)
-                num_tp = len(tp)
-                rc = tp / num_gt
-                if num_tp:
-                    recall[iou_thr_idx, ig_idx] = rc[-1]
+            # limit considered tracks for each sequence if maxDet > 0
+            for max_det_idx, max_det in enumerate(self.max_dets):
+                if max_det == merge_max_det or max_det == 0:
+                    max_det_dt_m, max_det_dt_ig = dt_m, dt_ig
                 else:
-                    recall[iou_thr_idx, ig_idx] = 0
+                    is_considered = merged_seq_rank < max_det
+                    max_det_dt_m, max_det_dt_ig = dt_m[:, is_considered], dt_ig[:, is_considered]
+                precision[max_det_idx, :, :, ig_idx], recall[max_det_idx, :, ig_idx] = \
+                    self._compute_precision_recall(max_det_dt_m, max_det_dt_ig, num_gt)
 
-                # np.spacing(1) ~= eps
-                pr = tp / (fp + tp + np.spacing(1))
-                pr = pr.tolist()
+        res = {'precision': precision[0], 'recall': recall[0]}
 
-                # Ensure precision values are monotonically decreasing
-                for i in range(num_tp - 1, 0, -1):
-                    if pr[i] > pr[i - 1]:
-                        pr[i - 1] = pr[i]
+        # compute the precision and recall averages for the respective alpha thresholds, ignore masks and maxDet values
+        for max_det_idx, suffix in enumerate(self.max_det_suffixes):
+            for lbl in self.lbls:
+                res['AP_' + lbl + suffix] = np.zeros((len(self.array_labels)), dtype=np.float)
+                res['AR_' + lbl + suffix] = np.zeros((len(self.array_labels)), dtype=np.float)
 
-                # find indices at the predefined recall values
-                rec_thrs_insert_idx = np.searchsorted(rc, self.rec_thrs, side="left")
+            for a_id, alpha in enumerate(self.array_labels):
+                for lbl_idx, lbl in enumerate(self.lbls):
+                    p = precision[max_det_idx, a_id, :, lbl_idx]
+                    if len(p[p > -1]) == 0:
+                        mean_p = -1
+                    else:
+                        mean_p = np.mean(p[p > -1])
+                    res['AP_' + lbl + suffix][a_id] = mean_p
+                    res['AR_' + lbl + suffix][a_id] = recall[max_det_idx, a_id, lbl_idx]
 
-                pr_at_recall = [0.0] * num_recalls
+        return res
 
-                try:
-                    for _idx, pr_idx in enumerate(rec_thrs_insert_idx):
-                        pr_at_recall[_idx] = pr[pr_idx]
-                except IndexError:
-                    pass
+    def _compute_precision_recall(self, dt_m, dt_ig, num_gt):
+        """ Computes the precision at each recall threshold and the final recall for each IoU threshold, from the dt
+        matches and dt ignores of all sequences (merged by score) and the number of (non-ignored) gt tracks
+        """
+        num_thrs = len(self.array_labels)
+        num_recalls = len(self.rec_thrs)
+        num_dt = dt_m.shape[1]
 
-                precision[iou_thr_idx, :, ig_idx] = (np.array(pr_at_recall))
+        tps = np.logical_and(dt_m != -1, np.logical_not(dt_ig))
+        fps = np.logical_and(dt_m == -1, np.logical_not(dt_ig))
 
-        res = {'precision': precision, 'recall': recall}
+        tp_sum = np.cumsum(tps, axis=1).astype(dtype=np.float)
+        fp_sum = np.cumsum(fps, axis=1).astype(dtype=np.float)
 
-        # compute the precision and recall averages for the respective alpha thresholds and ignore masks
-        for lbl in self.lbls:
-            res['AP_' + lbl] = np.zeros((len(self.array_labels)), dtype=np.float)
-            res['AR_' + lbl] = np.zeros((len(self.array_labels)), dtype=np.float)
+        rc = tp_sum / num_gt
+        recall = rc[:, -1] if num_dt else np.zeros(num_thrs)
 
-        for a_id, alpha in enumerate(self.array_labels):
-            for lbl_idx, lbl in enumerate(self.lbls):
-                p = precision[a_id, :, lbl_idx]
-                if len(p[p > -1]) == 0:
-                    mean_p = -1
-                else:
-                    mean_p = np.mean(p[p > -1])
-                res['AP_' + lbl][a_id] = mean_p
-                res['AR_' + lbl][a_id] = recall[a_id, lbl_idx]
+        # np.spacing(1) ~= eps
+        pr = tp_sum / (fp_sum + tp_sum + np.spacing(1))
 
-        return res
+        # Ensure precision values are monotonically decreasing
+        pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+
+        precision = np.zeros((num_thrs, num_recalls))
+        for iou_thr_idx in range(num_thrs):
+            # find indices at the predefined recall values (precision is 0 for recalls which are not reached)
+            rec_thrs_insert_idx = np.searchsorted(rc[iou_thr_idx], self.rec_thrs, side="left")
+            is_reached = rec_thrs_insert_idx < num_dt
+            precision[iou_thr_idx, is_reached] = pr[iou_thr_idx, rec_thrs_insert_idx[is_reached]]
+        return precision, recall
 
     def combine_classes_class_averaged(self, all_res, ignore_empty_classes=True):
         """Combines metrics across all classes by averaging over the class values
@@ -347,88 +407,111 @@ class TrackMAP(_BaseMetric):
         return track_ig_masks
 
     @staticmethod
-    def _compute_bb_track_iou(dt_track, gt_track, boxformat='xywh'):
+    def _compute_bb_track_ious(dt, gt, boxformat='xywh'):
         """
-        Calculates the track IoU for one detected track and one ground truth track for bounding boxes
-        :param dt_track: the detected track (format: dictionary with frame index as keys and
-                            numpy arrays as values)
-        :param gt_track: the ground truth track (format: dictionary with frame index as keys and
-                        numpy array as values)
+        Calculates the track IoUs between all detected tracks and all ground truth tracks for bounding boxes. The
+        tracks are converted to dense arrays of boxes per frame (NaN for frames where a track is absent), such that the
+        intersections and unions of all track pairs are computed by broadcasting over all frames at once.
+        :param dt: the detected tracks (format: list of dictionaries with frame index as keys and numpy arrays as
+                    values)
+        :param gt: the ground truth tracks (format: list of dictionaries with frame index as keys and numpy arrays as
+                    values)
         :param boxformat: the format of the boxes
-        :return: the track IoU
+        :return: the track IoUs (format: numpy array of shape (len(dt), len(gt)))
         """
-        intersect = 0
-        union = 0
-        image_ids = set(gt_track.keys()) | set(dt_track.keys())
-        for image in image_ids:
-            g = gt_track.get(image, None)
-            d = dt_track.get(image, None)
+        if boxformat not in ['xywh', 'x0y0x1y1']:
+            raise TrackEvalException('BoxFormat not implemented')
+        ious = np.zeros([len(dt), len(gt)])
+        if len(dt) == 0 or len(gt) == 0:
+            return ious
+
+        frame_idx = {}
+        for track in dt + gt:
+            for image in track.keys():
+                frame_idx.setdefault(image, len(frame_idx))
+
+        def _to_corners_and_areas(tracks):
+            boxes = np.full((len(tracks), len(frame_idx), 4), np.nan)
+            for i, track in enumerate(tracks):
+                if track:
+                    boxes[i, [frame_idx[image] for image in track.keys()]] = list(track.values())
             if boxformat == 'xywh':
-                if d is not None and g is not None:
-                    dx, dy, dw, dh = d
-                    gx, gy, gw, gh = g
-                    w = max(min(dx + dw, gx + gw) - max(dx, gx), 0)
-                    h = max(min(dy + dh, gy + gh) - max(dy, gy), 0)
-                    i = w * h
-                    u = dw * dh + gw * gh - i
-                    intersect += i
-                    union += u
-                elif d is None and g is not None:
-                    union += g[2] * g[3]
-                elif d is not None and g is None:
-                    union += d[2] * d[3]
-            elif boxformat == 'x0y0x1y1':
-                if d is not None and g is not None:
-                    dx0, dy0, dx1, dy1 = d
-                    gx0, gy0, gx1, gy1 = g
-                    w = max(min(dx1, gx1) - max(dx0, gx0), 0)
-                    h = max(min(dy1, gy1) - max(dy0, gy0), 0)
-                    i = w * h
-                    u = (dx1 - dx0) * (dy1 - dy0) + (gx1 - gx0) * (gy1 - gy0) - i
-                    intersect += i
-                    union += u
-                elif d is None and g is not None:
-                    union += (g[2] - g[0]) * (g[3] - g[1])
-                elif d is not None and g is None:
-                    union += (d[2] - d[0]) * (d[3] - d[1])
+                areas = boxes[:, :, 2] * boxes[:, :, 3]
+                boxes[:, :, 2:] += boxes[:, :, :2]
             else:
-                raise TrackEvalException('BoxFormat not implemented')
-        if intersect > union:
-            raise TrackEvalException("Intersection value > union value. Are the box values corrupted?")
-        return intersect / union if union > 0 else 0
+                areas = (boxes[:, :, 2] - boxes[:, :, 0]) * (boxes[:, :, 3] - boxes[:, :, 1])
+            return boxes, np.nan_to_num(areas, nan=0)
+
+        dt_boxes, dt_areas = _to_corners_and_areas(dt)
+        gt_boxes, gt_areas = _to_corners_and_areas(gt)
+
+        # Process the detected tracks in chunks to bound the size of the (dt, gt, frame) arrays.
+        chunk_size = max(1, 10000000 // (len(gt) * max(1, len(frame_idx))))
+        for start in range(0, len(dt), chunk_size):
+            d = dt_boxes[start:start + chunk_size, np.newaxis]
+            g = gt_boxes[np.newaxis]
+            # np.fmax returns 0 (instead of NaN) for frames where either track is absent.
+            w = np.fmax(np.minimum(d[..., 2], g[..., 2]) - np.maximum(d[..., 0], g[..., 0]), 0)
+            h = np.fmax(np.minimum(d[..., 3], g[..., 3]) - np.maximum(d[..., 1], g[..., 1]), 0)
+            intersection = w * h
+            union = dt_areas[start:start + chunk_size, np.newaxis] + gt_areas[np.newaxis] - intersection
+            intersection = intersection.sum(axis=2)
+            union = union.sum(axis=2)
+            if np.any(intersection > union):
+                raise TrackEvalException("Intersection value > union value. Are the box values corrupted?")
+            ious[start:start + chunk_size] = np.divide(intersection, union, out=np.zeros_like(union),
+                                                       where=union > 0)
+        return ious
 
     @staticmethod
-    def _compute_mask_track_iou(dt_track, gt_track):
+    def _compute_mask_track_ious(dt, gt):
         """
-        Calculates the track IoU for one detected track and one ground truth track for segmentation masks
-        :param dt_track: the detected track (format: dictionary with frame index as keys and
-                            pycocotools rle encoded masks as values)
-        :param gt_track: the ground truth track (format: dictionary with frame index as keys and
-                            pycocotools rle encoded masks as values)
-        :return: the track IoU
+        Calculates the track IoUs between all detected tracks and all ground truth tracks for segmentation masks. For
+        each frame, the areas and pairwise IoUs of all masks present are computed at once, and the intersections
+        (recovered from the IoUs and areas) are accumulated into a matrix over all track pairs.
+        :param dt: the detected tracks (format: list of dictionaries with frame index as keys and pycocotools rle
+                    encoded masks as values)
+        :param gt: the ground truth tracks (format: list of dictionaries with frame index as keys and pycocotools rle
+                    encoded masks as values)
+        :return: the track IoUs (format: numpy array of shape (len(dt), len(gt)))
         """
         # only loaded when needed to reduce minimum requirements
         from pycocotools import mask as mask_utils
 
-        intersect = .0
-        union = .0
-        image_ids = set(gt_track.keys()) | set(dt_track.keys())
-        for image in image_ids:
-            g = gt_track.get(image, None)
-            d = dt_track.get(image, None)
-            if d and g:
-                intersect += mask_utils.area(mask_utils.merge([d, g], True))
-                union += mask_utils.area(mask_utils.merge([d, g], False))
-            elif not d and g:
-                union += mask_utils.area(g)
-            elif d and not g:
-                union += mask_utils.area(d)
-        if union < 0.0 - np.finfo('float').eps:
+        def _masks_by_frame(tracks):
+            frames = {}
+            for track_idx, track in enumerate(tracks):
+                for image, mask in track.items():
+                    if mask:
+                        frames.setdefault(image, ([], []))
+                        frames[image][0].append(track_idx)
+                        frames[image][1].append(mask)
+            return {image: (np.array(track_ids), masks, mask_utils.area(masks).astype(float))
+                    for image, (track_ids, masks) in frames.items()}
+
+        dt_frames = _masks_by_frame(dt)
+        gt_frames = _masks_by_frame(gt)
+        dt_areas = np.zeros(len(dt))
+        gt_areas = np.zeros(len(gt))
+        for frames, areas in [(dt_frames, dt_areas), (gt_frames, gt_areas)]:
+            for track_ids, _, frame_areas in frames.values():
+                areas[track_ids] += frame_areas
+
+        intersect = np.zeros([len(dt), len(gt)])
+        for image in dt_frames.keys() & gt_frames.keys():
+            dt_ids, dt_masks, dt_frame_areas = dt_frames[image]
+            gt_ids, gt_masks, gt_frame_areas = gt_frames[image]
+            ious = np.array(mask_utils.iou(dt_masks, gt_masks, [0] * len(gt_masks)))
+            # Intersections are whole pixel counts, so rounding recovers them exactly from iou = i / (a + b - i).
+            area_sums = dt_frame_areas[:, np.newaxis] + gt_frame_areas[np.newaxis, :]
+            intersect[dt_ids[:, np.newaxis], gt_ids[np.newaxis, :]] += np.round(ious * area_sums / (1 + ious))
+        union = dt_areas[:, np.newaxis] + gt_areas[np.newaxis, :] - intersect
+
+        if np.any(union < 0.0 - np.finfo('float').eps):
             raise TrackEvalException("Union value < 0. Are the segmentaions corrupted?")
-        if intersect > union:
+        if np.any(intersect > union):
             raise TrackEvalException("Intersection value > union value. Are the segmentations corrupted?")
-        iou = intersect / union if union > 0.0 + np.finfo('float').eps else 0.0
-        return iou
+        return np.divide(intersect, union, out=np.zeros_like(union), where=union > 0.0 + np.finfo('float').eps)
 
     @staticmethod
     def _compute_track_ious(dt, gt, iou_function='bbox', boxformat='xywh'):
@@ -440,17 +523,12 @@ class TrackMAP(_BaseMetric):
             return []
 
         if iou_function == 'bbox':
-            track_iou_function = partial(TrackMAP._compute_bb_track_iou, boxformat=boxformat)
+            return TrackMAP._compute_bb_track_ious(dt, gt, boxformat=boxformat)
         elif iou_function == 'mask':
-            track_iou_function = partial(TrackMAP._compute_mask_track_iou)
+            return TrackMAP._compute_mask_track_ious(dt, gt)
         else:
             raise Exception('IoU function not implemented')
 
-        ious = np.zeros([len(dt), len(gt)])
-        for i, j in np.ndindex(ious.shape):
-            ious[i, j] = track_iou_function(dt[i], gt[j])
-        return ious
-
     @staticmethod
     def _row_print(*argv):
         """Prints results in an evenly spaced rows, with more space in first row"""
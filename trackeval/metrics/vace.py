@@ -2,6 +2,7 @@ import numpy as np
 from scipy.optimize import linear_sum_assignment
 from ._base_metric import _BaseMetric
 from .. import _timing
+from .._assignment import max_score_assignment
 
 
 class VACE(_BaseMetric):
@@ -83,7 +84,7 @@ class VACE(_BaseMetric):
                 continue
             # n_g > 0 and n_d > 0
             spatial_overlap = data['similarity_scores'][t]
-            match_rows, match_cols = linear_sum_assignment(-spatial_overlap)
+            match_rows, match_cols = max_score_assignment(spatial_overlap)
             overlap_ratio = spatial_overlap[match_rows, match_cols].sum()
             fda += overlap_ratio / (0.5 * (n_g + n_d))
         res['FDA'] = fda